@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import array
+import struct
+import importlib.util
+
+# Closed months of activities, next to the database
+ARCHIVE_DIRNAME = "timetracker_archive"
+
+# Fixed-width columns of a segment, one file each
+COLUMNS = [
+    ("id", "<i8"),
+    ("start_ts", "<i8"),
+    ("end_ts", "<i8"),
+    ("duration", "<i4"),
+    ("project_id", "<i4"),
+    ("type_id", "<i4"),
+    ("app_id", "<i4"),
+    ("domain_id", "<i4"),
+    ("title_id", "<i4"),
+]
+
+# String tables of a segment; the *_id columns index into these lists
+STRING_TABLES = {"type_id": "types", "app_id": "apps", "domain_id": "domains", "title_id": "titles"}
+
+class ActivityArchive:
+    """Append-only columnar store for activities of closed months.
+
+    Each archiving run writes a segment directory named <YYYY-MM>.<n> holding
+    one flat little-endian array per column, a strings.json with the type,
+    app, domain and title strings the id columns index, and a meta.json. Segments
+    are written under a temporary name and renamed into place, so a segment
+    is either complete or absent. Reading maps the columns with numpy.memmap;
+    numpy is only needed once an archive is actually written or read.
+
+    Segments are never rewritten. Deleting or merging projects is recorded in
+    projects.json and applied when segments are read.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIRNAME):
+        self.directory = directory
+        self._segments = {}  # Name -> (columns, strings), opened on first use
+
+    @staticmethod
+    def available():
+        """True if numpy, which reads and writes the columns, is installed"""
+        return importlib.util.find_spec("numpy") is not None
+
+    def segments(self):
+        """Names of the complete segments, oldest month first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name for name in os.listdir(self.directory)
+                 if not name.endswith(".tmp") and os.path.exists(os.path.join(self.directory, name, "meta.json"))]
+        return sorted(names, key=lambda name: (name.split(".")[0], int(name.split(".")[1])))
+
+    def meta(self, name):
+        with open(os.path.join(self.directory, name, "meta.json"), encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+
+    def first_start_ts(self, name):
+        """Start of the earliest activity in a segment (rows are written in start order)"""
+        with open(os.path.join(self.directory, name, "start_ts"), "rb") as column:
+            data = column.read(8)
+        return struct.unpack("<q", data)[0] if len(data) == 8 else None
+
+    def last_end_ts(self, name):
+        """End of the latest activity in a segment; ends are not sorted, so the column is read whole"""
+        ends = array.array("q")
+        with open(os.path.join(self.directory, name, "end_ts"), "rb") as column:
+            ends.frombytes(column.read())
+        if sys.byteorder == "big":
+            ends.byteswap()
+        return max(ends) if ends else None
+
+    def write_segment(self, month, start_ts, end_ts, columns, strings, min_id, max_id):
+        """Write arrays (keyed like COLUMNS) and string tables as a new segment of month.
+
+        start_ts and end_ts bound the month; min_id and max_id are the range of
+        activity ids the segment was taken from.
+        """
+        import shutil
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        number = 1 + max([int(name.split(".")[1]) for name in self.segments() if name.split(".")[0] == month],
+                         default=0)
+        name = f"{month}.{number}"
+        final_path = os.path.join(self.directory, name)
+        temp_path = final_path + ".tmp"
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)  # Left behind by an interrupted run
+        os.makedirs(temp_path)
+
+        rows = len(columns["id"])
+        for column, dtype in COLUMNS:
+            np.asarray(columns[column], dtype=dtype).tofile(os.path.join(temp_path, column))
+
+        with open(os.path.join(temp_path, "strings.json"), "w", encoding="utf-8") as strings_file:
+            json.dump(strings, strings_file)
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as meta_file:
+            json.dump({"month": month, "start_ts": start_ts, "end_ts": end_ts, "rows": rows,
+                       "min_id": min_id, "max_id": max_id, "columns": dict(COLUMNS)}, meta_file)
+
+        os.rename(temp_path, final_path)
+        return name
+
+    def scan(self, start_ts=None, end_ts=None, project_ids=None):
+        """Yield (columns, strings) per segment, columns filtered to rows starting in [start_ts, end_ts).
+
+        project_ids are matched after applying projects.json, and the
+        project_id column returned holds the current project ids.
+        """
+        for segments in self.scan_months(start_ts, end_ts, project_ids):
+            yield from segments
+
+    def scan_months(self, start_ts=None, end_ts=None, project_ids=None):
+        """Like scan(), but yield a list of the (columns, strings) of each month, oldest first.
+
+        A month archived more than once has a segment per run, each sorted by
+        start but overlapping the others.
+        """
+        segments = self.segments()
+        if not segments:
+            return  # Nothing archived yet, so numpy isn't needed
+
+        import numpy as np
+
+        project_map = self.project_map()
+        month, selected = None, []
+        for name in segments:
+            meta = self.meta(name)
+            if not meta["rows"]:
+                continue
+
+            month_start, month_end = meta["start_ts"], meta["end_ts"]
+            if (start_ts is not None and month_end <= start_ts) or (end_ts is not None and month_start >= end_ts):
+                continue
+
+            columns, strings = self._open(name, meta)
+            mask = np.ones(meta["rows"], dtype=bool)
+            if start_ts is not None:
+                mask &= columns["start_ts"] >= start_ts
+            if end_ts is not None:
+                mask &= columns["start_ts"] < end_ts
+
+            project_column = columns["project_id"]
+            if project_map:
+                project_column = project_column.copy()
+                for old_id, new_id in project_map.items():
+                    project_column[columns["project_id"] == old_id] = -1 if new_id is None else new_id
+                mask &= project_column >= 0
+            if project_ids is not None:
+                mask &= np.isin(project_column, list(project_ids))
+
+            if not mask.any():
+                continue
+            if meta["month"] != month and selected:
+                yield selected
+                selected = []
+            month = meta["month"]
+            columns = {column: columns[column][mask] for column, _ in COLUMNS}
+            columns["project_id"] = project_column[mask]
+            selected.append((columns, strings))
+        if selected:
+            yield selected
+
+    def project_map(self):
+        """Old project id -> current project id (None if the project's activities were deleted)"""
+        path = os.path.join(self.directory, "projects.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as map_file:
+            return {int(old_id): new_id for old_id, new_id in json.load(map_file).items()}
+
+    def reassign_project(self, project_id, new_project_id):
+        """Move archived activities of a project to another one, or drop them with None"""
+        if not self.segments():
+            return
+
+        project_map = self.project_map()
+        # Earlier moves into this project follow it
+        for old_id, new_id in project_map.items():
+            if new_id == project_id:
+                project_map[old_id] = new_project_id
+        project_map[project_id] = new_project_id
+
+        path = os.path.join(self.directory, "projects.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as map_file:
+            json.dump({str(old_id): new_id for old_id, new_id in project_map.items()}, map_file)
+        os.replace(path + ".tmp", path)
+
+    def _open(self, name, meta):
+        """Memory-map a segment's columns and load its string tables"""
+        segment = self._segments.get(name)
+        if segment is None:
+            import numpy as np
+
+            path = os.path.join(self.directory, name)
+            columns = {column: np.memmap(os.path.join(path, column), dtype=dtype, mode="r", shape=(meta["rows"],))
+                       for column, dtype in COLUMNS}
+            with open(os.path.join(path, "strings.json"), encoding="utf-8") as strings_file:
+                strings = json.load(strings_file)
+            segment = self._segments[name] = (columns, strings)
+        return segment
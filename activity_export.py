@@ -0,0 +1,104 @@
+import csv
+import json
+import importlib.util
+
+# Fields of an exported activity, in order; DatabaseManager.iter_activities yields tuples of these
+EXPORT_COLUMNS = ["start_time", "end_time", "duration_seconds", "project", "type", "name",
+                  "domain_info", "window_title"]
+
+EXPORT_FORMATS = ["csv", "jsonl", "parquet"]
+
+# Rows per Parquet row group
+PARQUET_BATCH_SIZE = 65536
+
+IMPORT_FORMATS = ["csv", "jsonl"]
+
+def parquet_available():
+    """True if pyarrow, which writes Parquet, is installed"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def write_activities(rows, output, export_format="csv", batch_size=PARQUET_BATCH_SIZE):
+    """Write EXPORT_COLUMNS tuples to a path or text file object; returns the row count.
+
+    Rows are written as they arrive, so an iterator of any length is
+    exported in constant memory (Parquet buffers one row group at a time).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    if export_format == "parquet":
+        if not isinstance(output, str):
+            raise ValueError("Parquet is written to a file path, not a stream")
+        return write_parquet(rows, output, batch_size)
+
+    if isinstance(output, str):
+        with open(output, "w", encoding="utf-8", newline="") as out:
+            return write_activities(rows, out, export_format)
+
+    if export_format == "csv":
+        return write_csv(rows, output)
+    return write_jsonl(rows, output)
+
+
+def write_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, out):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
+        count += 1
+    return count
+
+
+def write_parquet(rows, path, batch_size=PARQUET_BATCH_SIZE):
+    """Write rows as Parquet, one row group per batch_size rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.int64() if column == "duration_seconds" else pa.string())
+                        for column in EXPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_arrays([pa.array(values) for values in zip(*batch)], schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            arrays = [pa.array(values) for values in zip(*batch)] if batch else [pa.array([], field.type)
+                                                                               for field in schema]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    return count
+
+
+def read_activities(path, import_format=None):
+    """Yield activity records (dicts keyed like EXPORT_COLUMNS) from a CSV or JSON Lines file.
+
+    The format is taken from the file extension unless given. Files written
+    by write_activities read back unchanged; other files need at least
+    start_time, end_time and name columns.
+    """
+    if import_format is None:
+        import_format = "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {import_format}")
+
+    with open(path, encoding="utf-8", newline="") as source:
+        if import_format == "csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import zlib
+import struct
+import datetime
+import threading
+
+# Journal of the activity in progress, next to the database
+JOURNAL_FILENAME = "timetracker.journal"
+
+# Every record takes exactly this many bytes, so a torn write at the end of
+# the file can only ever damage the last record
+RECORD_SIZE = 512
+
+# Record kinds
+OPEN = 1        # A new activity started; payload holds its window details
+CHECKPOINT = 2  # The open activity is still in front at end_ts
+FINISH = 3      # The activity ended at end_ts and was handed to the writer
+COMMIT = 4      # Every activity up to and including seq is in the database
+PAYLOAD = 5     # Leading part of the payload of seq's OPEN record, which follows
+
+# crc32 of the rest of the record, kind, seq, project id, start, end, payload length
+_HEADER = struct.Struct("<IBQidd H")
+_PAYLOAD_SIZE = RECORD_SIZE - _HEADER.size
+
+class ActivityJournal:
+    """Append-only crash journal for activities not yet in the database.
+
+    WindowTracker appends an OPEN record when a window comes to the front
+    (preceded by PAYLOAD records if its details don't fit in one) and cheap
+    CHECKPOINT records while it stays there; ActivityWriter appends a
+    COMMIT record after each saved batch. Records are written straight to the
+    file, so they survive the process being killed, and fsync'ed at most every
+    sync_interval seconds, which bounds what an OS crash can lose.
+
+    On startup recover_into() saves whatever was open or uncommitted when the
+    previous run died, then truncates the journal.
+    """
+
+    def __init__(self, path=JOURNAL_FILENAME, sync_interval=5.0, checkpoint_interval=1.0,
+                 max_size=1024 * 1024):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.max_size = max_size  # Rewrite the file once it is this big and fully committed
+
+        self._lock = threading.Lock()
+        self._records = self._read_records()
+        self._next_seq = max((record[1] for record in self._records), default=0) + 1
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        self._size = os.fstat(self._fd).st_size
+        self._last_sync = time.monotonic()
+        self._dirty = False
+
+        self._open = None  # [seq, project id, start_ts, end_ts, payload] of the activity in front
+        self._last_checkpoint = 0.0
+        self._unsaved = set()  # Seqs of finished activities the database hasn't saved yet
+        self._committed_through = 0
+
+    def open(self, activity, project_id):
+        """Journal a newly started activity; returns its sequence number"""
+        payload = self._encode_payload(activity)
+        start_ts = activity["start_time"].timestamp()
+
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._open = [seq, project_id, start_ts, start_ts, payload]
+            self._last_checkpoint = time.monotonic()
+            self._append_open(seq, project_id, start_ts, payload)
+        return seq
+
+    def checkpoint(self, seq, end_time):
+        """Record that the open activity is still running; at most once per checkpoint_interval"""
+        with self._lock:
+            if self._open is None or self._open[0] != seq:
+                return
+            if time.monotonic() - self._last_checkpoint < self.checkpoint_interval:
+                return
+
+            self._last_checkpoint = time.monotonic()
+            self._open[3] = end_time.timestamp()
+            if self._size >= self.max_size and not self._unsaved:
+                self._rewrite()  # Hours on one window; start over from its latest state
+            else:
+                self._append(CHECKPOINT, seq, self._open[1], self._open[2], self._open[3])
+
+    def finish(self, seq, end_time):
+        """Record the final end time of an activity that is about to be saved"""
+        with self._lock:
+            if self._open is None or self._open[0] != seq:
+                return
+
+            self._append(FINISH, seq, self._open[1], self._open[2], end_time.timestamp())
+            self._unsaved.add(seq)
+            self._open = None
+
+    def committed(self, activities):
+        """Mark journaled activities of a batch the database has just saved.
+
+        The COMMIT record covers everything up to the oldest activity that is
+        still unsaved, so a batch that failed is recovered even if a later
+        one was saved.
+        """
+        seqs = [activity["journal_seq"] for activity in activities if "journal_seq" in activity]
+        if not seqs:
+            return
+
+        with self._lock:
+            self._unsaved.difference_update(seqs)
+            through = max(seqs)
+            if self._unsaved:
+                through = min(through, min(self._unsaved) - 1)
+            if through <= self._committed_through:
+                return
+            self._committed_through = through
+            self._append(COMMIT, through, 0, 0.0, 0.0)
+
+            # Nothing finished is waiting for the writer, so only the open
+            # activity has to be kept
+            if self._size >= self.max_size and not self._unsaved:
+                self._rewrite()
+
+    def recover(self):
+        """Return the activities the previous run journaled but never committed"""
+        activities = {}
+        committed_through = 0
+        leading = {}  # Seq -> PAYLOAD parts seen before its OPEN record
+
+        for kind, seq, project_id, start_ts, end_ts, payload in self._records:
+            if kind == COMMIT:
+                committed_through = max(committed_through, seq)
+            elif kind == PAYLOAD:
+                leading.setdefault(seq, []).append(payload)
+            elif kind == OPEN:
+                payload = b"".join(leading.pop(seq, [])) + payload
+                try:
+                    activity_type, name, window_title, short_title, domain_info = json.loads(payload)
+                except ValueError:
+                    continue
+                activities[seq] = {
+                    "project_id": project_id,
+                    "type": activity_type,
+                    "name": name,
+                    "window_title": window_title,
+                    "short_title": short_title,
+                    "domain_info": domain_info,
+                    "start_time": datetime.datetime.fromtimestamp(start_ts),
+                    "end_time": datetime.datetime.fromtimestamp(end_ts),
+                }
+            elif seq in activities:
+                activities[seq]["end_time"] = datetime.datetime.fromtimestamp(end_ts)
+
+        return [activities[seq] for seq in sorted(activities)
+                if seq > committed_through and activities[seq]["end_time"] > activities[seq]["start_time"]]
+
+    def recover_into(self, db_manager):
+        """Save recovered activities and truncate the journal. Returns how many were saved.
+
+        A crash between saving a batch and writing its COMMIT record leaves
+        activities the database already has; those are skipped.
+        """
+        activities = self.recover()
+        if activities:
+            activities = db_manager.unsaved_activities(activities)
+        if activities and not db_manager.save_activities(activities):
+            return 0  # Keep the journal for the next attempt
+
+        self.reset()
+        return len(activities)
+
+    def reset(self):
+        """Discard all records"""
+        with self._lock:
+            self._records = []
+            self._open = None
+            self._unsaved = set()
+            self._committed_through = 0
+            os.ftruncate(self._fd, 0)
+            self._size = 0
+            self._sync()
+
+    def close(self):
+        """Sync and close the journal; an empty journal is removed"""
+        with self._lock:
+            if self._fd is None:
+                return
+            self._sync()
+            empty = self._open is None and not self._unsaved
+            os.close(self._fd)
+            self._fd = None
+
+        if empty:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    # Internal helpers
+
+    def _append(self, kind, seq, project_id, start_ts, end_ts, payload=b""):
+        body = _HEADER.pack(0, kind, seq, project_id or 0, start_ts, end_ts, len(payload))[4:] + payload
+        record = struct.pack("<I", zlib.crc32(body)) + body
+        os.write(self._fd, record.ljust(RECORD_SIZE, b"\0"))
+        self._size += RECORD_SIZE
+        self._dirty = True
+
+        # Group fsyncs: the data is already safe from a killed process
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            self._sync()
+
+    def _sync(self):
+        if self._dirty:
+            os.fsync(self._fd)
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _rewrite(self):
+        """Truncate the journal, keeping only the activity still in front"""
+        os.ftruncate(self._fd, 0)
+        self._size = 0
+        if self._open is not None:
+            seq, project_id, start_ts, end_ts, payload = self._open
+            self._append_open(seq, project_id, start_ts, payload)
+            self._append(CHECKPOINT, seq, project_id, start_ts, end_ts)
+        self._sync()
+
+    def _append_open(self, seq, project_id, start_ts, payload):
+        """Append an OPEN record, preceded by PAYLOAD records with whatever doesn't fit in it.
+
+        The OPEN record comes last, so a torn write never leaves an activity
+        with part of its details.
+        """
+        parts = [payload[offset:offset + _PAYLOAD_SIZE] for offset in range(0, len(payload), _PAYLOAD_SIZE)]
+        for part in parts[:-1]:
+            self._append(PAYLOAD, seq, project_id, start_ts, start_ts, part)
+        self._append(OPEN, seq, project_id, start_ts, start_ts, parts[-1] if parts else b"")
+
+    def _encode_payload(self, activity):
+        """JSON window details, however long the window title"""
+        return json.dumps([activity["type"], activity["name"], activity["window_title"],
+                           activity["short_title"], activity.get("domain_info")]).encode("utf-8")
+
+    def _read_records(self):
+        """Parse the journal left by a previous run, stopping at the first damaged record"""
+        records = []
+        try:
+            with open(self.path, "rb") as journal:
+                data = journal.read()
+        except OSError:
+            return records
+
+        for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            record = data[offset:offset + RECORD_SIZE]
+            crc, kind, seq, project_id, start_ts, end_ts, length = _HEADER.unpack_from(record)
+            if length > _PAYLOAD_SIZE or zlib.crc32(record[4:_HEADER.size + length]) != crc:
+                break
+            records.append((kind, seq, project_id, start_ts, end_ts,
+                            record[_HEADER.size:_HEADER.size + length]))
+        return records
@@ -0,0 +1,222 @@
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+from PyQt5.QtGui import QFont, QBrush, QColor
+
+class ActivityNode:
+    """One row of the activity tree: an app, a domain within it, or a window title"""
+    __slots__ = ("key", "parent", "row", "children", "item_type", "label",
+                 "duration_text", "title_count", "fetched")
+
+    def __init__(self, key, parent, item_type, label="", duration_text="", title_count=0):
+        self.key = key
+        self.parent = parent
+        self.row = 0
+        self.children = []
+        self.item_type = item_type
+        self.label = label
+        self.duration_text = duration_text
+        self.title_count = title_count
+        # Domains load their window titles only when first expanded
+        self.fetched = item_type != "domain"
+
+
+class ActivityTreeModel(QAbstractItemModel):
+    """Item model exposing the app > domain > window title hierarchy.
+
+    App and domain rows come from set_summary(); the window titles under a
+    domain are requested from title_source(app_name, domain_info) only when
+    the view expands that domain (canFetchMore/fetchMore). Updates are applied
+    as row inserts, removals, moves and dataChanged, so the view keeps its
+    expansion, selection and scroll position.
+    """
+
+    HEADERS = ["Application", "Duration"]
+
+    def __init__(self, title_source, parent=None):
+        super().__init__(parent)
+        self.title_source = title_source
+        self.root = ActivityNode(None, None, "root")
+
+        # Fonts and brushes shared by all rows: (label font, label brush, duration brush)
+        app_font = QFont()
+        app_font.setBold(True)
+        app_font.setPointSize(10)
+
+        domain_font = QFont()
+        domain_font.setBold(True)
+        domain_font.setPointSize(9)
+
+        app_brush = QBrush(QColor("#4FC3F7"))  # Light blue
+        domain_brush = QBrush(QColor("#FFD54F"))  # Light amber
+        self.styles = {
+            "app": (app_font, app_brush, app_brush),
+            "domain": (domain_font, domain_brush, domain_brush),
+            "website": (None, QBrush(QColor("#FFFFFF")), QBrush(QColor("#AAAAAA")))  # White, light gray
+        }
+
+    def set_summary(self, apps):
+        """Apply a new app > domain summary, refreshing any titles already loaded"""
+        self._sync_children(QModelIndex(), self.root, [
+            ((app["name"],), "app", app["name"], app["duration_formatted"], 0)
+            for app in apps
+        ])
+
+        for app, app_node in zip(apps, self.root.children):
+            app_index = self.createIndex(app_node.row, 0, app_node)
+            self._sync_children(app_index, app_node, [
+                ((app["name"], domain["domain_info"]), "domain", domain["domain_info"],
+                 domain["duration_formatted"], domain["title_count"])
+                for domain in app["children"]
+            ])
+
+            for domain_node in app_node.children:
+                if domain_node.fetched:
+                    self._load_titles(self.createIndex(domain_node.row, 0, domain_node), domain_node)
+
+    def node(self, index):
+        """Return the node behind an index (the root for an invalid index)"""
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    # QAbstractItemModel interface
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self.node(parent).children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+
+        parent_node = index.internalPointer().parent
+        if parent_node is None or parent_node is self.root:
+            return QModelIndex()
+        return self.createIndex(parent_node.row, 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if not node.fetched:
+            return node.title_count > 0  # Show the expand arrow before loading
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        return not self.node(parent).fetched
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node.fetched:
+            return
+
+        node.fetched = True
+        self._load_titles(parent, node)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            return node.label if column == 0 else node.duration_text
+        if role == Qt.FontRole and column == 0:
+            return self.styles[node.item_type][0]
+        if role == Qt.ForegroundRole:
+            return self.styles[node.item_type][1 + column]
+        if role == Qt.ToolTipRole and column == 0 and node.item_type == "website":
+            return node.label  # Long window titles are elided in the view
+        if role == Qt.UserRole:
+            return node.item_type  # Tag as an app/domain/website row
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    # Internal helpers
+
+    def _load_titles(self, domain_index, domain_node):
+        app_name, domain_info = domain_node.key
+        self._sync_children(domain_index, domain_node, [
+            (domain_node.key + (title["window_title"],), "website", title["window_title"],
+             title["duration_formatted"], 0)
+            for title in self.title_source(app_name, domain_info)
+        ])
+
+    def _sync_children(self, parent_index, parent_node, entries):
+        """Make parent_node's children match entries of (key, type, label, duration, title count)"""
+        children = parent_node.children
+
+        # Fast path for the first load of a level: a single insert
+        if not children:
+            if entries:
+                self.beginInsertRows(parent_index, 0, len(entries) - 1)
+                for row, entry in enumerate(entries):
+                    node = self._make_node(parent_node, entry)
+                    node.row = row
+                    children.append(node)
+                self.endInsertRows()
+            return
+
+        # Remove rows that are no longer present, one contiguous run at a time
+        wanted = {entry[0] for entry in entries}
+        row = len(children) - 1
+        while row >= 0:
+            if children[row].key in wanted:
+                row -= 1
+                continue
+            last = row
+            while row > 0 and children[row - 1].key not in wanted:
+                row -= 1
+            self.beginRemoveRows(parent_index, row, last)
+            del children[row:last + 1]
+            self._renumber(children, row)
+            self.endRemoveRows()
+            row -= 1
+
+        # Walk the wanted order, inserting new rows and moving existing ones up
+        existing = {node.key: node for node in children}
+        for row, entry in enumerate(entries):
+            key, item_type, label, duration_text, title_count = entry
+            node = existing.get(key)
+
+            if node is None:
+                self.beginInsertRows(parent_index, row, row)
+                node = self._make_node(parent_node, entry)
+                children.insert(row, node)
+                self._renumber(children, row)
+                self.endInsertRows()
+                continue
+
+            if node.row != row:
+                # Rows before this one are already in place, so node.row > row
+                source_row = node.row
+                self.beginMoveRows(parent_index, source_row, source_row, parent_index, row)
+                del children[source_row]
+                children.insert(row, node)
+                self._renumber(children, row, source_row + 1)
+                self.endMoveRows()
+
+            node.title_count = title_count
+            if node.duration_text != duration_text:
+                node.duration_text = duration_text
+                changed = self.createIndex(row, 1, node)
+                self.dataChanged.emit(changed, changed, [Qt.DisplayRole])
+
+    def _make_node(self, parent_node, entry):
+        key, item_type, label, duration_text, title_count = entry
+        return ActivityNode(key, parent_node, item_type, label, duration_text, title_count)
+
+    def _renumber(self, children, start, end=None):
+        for row in range(start, len(children) if end is None else end):
+            children[row].row = row
@@ -0,0 +1,143 @@
+import time
+import queue
+import threading
+
+# Marker telling the writer thread to commit what it has and exit
+_STOP = object()
+
+class _Flush:
+    """Queued by flush(); done is set once everything queued before it is saved or given up on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.saved = False
+
+class ActivityWriter:
+    """Write-behind queue that saves activities on a background thread.
+
+    Activities are taken off a bounded queue and committed in batches: a batch
+    is closed when it reaches max_batch activities or when max_delay seconds
+    have passed since its first activity, whichever comes first. A burst of
+    window switches therefore ends up in a single transaction. With a journal,
+    committed batches are marked in it so they are not recovered again.
+
+    A batch the database refuses (e.g. locked by a long import) is kept and
+    saved again, together with anything newer, every retry_delay seconds;
+    flush() keeps waiting for it. If it still can't be saved when the writer
+    stops, it stays in the journal for the next start.
+    """
+
+    def __init__(self, db_manager, max_batch=100, max_delay=2.0, max_pending=10000, on_commit=None,
+                 journal=None, retry_delay=5.0):
+        self.db_manager = db_manager
+        self.journal = journal
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.on_commit = on_commit  # Called from the writer thread with the batch size
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._in_flight = 0
+        self._thread = None
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(target=self._run, name="ActivityWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enqueue(self, activity):
+        """Queue an activity for saving. Blocks only if the queue is full."""
+        self._queue.put(dict(activity))
+
+    def backlog(self):
+        """Number of activities accepted but not yet committed"""
+        return self._queue.qsize() + self._in_flight
+
+    def flush(self, timeout=None):
+        """Commit everything queued so far and wait for it. Returns True if it was saved."""
+        if not self._thread or not self._thread.is_alive():
+            return self.backlog() == 0
+
+        request = _Flush()
+        self._queue.put(request)
+        return request.done.wait(timeout) and request.saved
+
+    def stop(self, timeout=5.0):
+        """Flush outstanding activities and stop the writer thread"""
+        if not self._thread or not self._thread.is_alive():
+            return
+
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        retry = []  # Activities of a batch that failed, saved again before anything newer
+        retry_waiters = []  # Flushes waiting for the failed batch
+
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.retry_delay if retry else None)
+            except queue.Empty:
+                item = None  # Time to retry
+            batch = retry
+            retry = []
+            waiters = retry_waiters
+            retry_waiters = []
+            deadline = time.monotonic() + self.max_delay
+
+            # Gather a batch until it is full, old enough, or someone waits on it
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, _Flush):
+                    waiters.append(item)
+                elif item is not None:
+                    batch.append(item)
+                    self._in_flight += 1
+
+                if item is None or stopping or isinstance(item, _Flush) or len(batch) >= self.max_batch:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                saved = self.db_manager.save_activities(batch)
+                if not saved:
+                    retry = batch
+                    retry_waiters = waiters
+                    if stopping:
+                        print(f"Could not save {len(batch)} activities"
+                              + ("; they stay in the journal" if self.journal else ""))
+                        for waiter in waiters:
+                            waiter.done.set()  # Not saved
+                    continue
+                self._in_flight = 0
+
+                if self.journal:
+                    try:
+                        self.journal.committed(batch)
+                    except Exception as e:
+                        print(f"Error updating activity journal: {e}")
+
+                if self.on_commit:
+                    try:
+                        self.on_commit(len(batch))
+                    except Exception as e:
+                        print(f"Error in activity commit callback: {e}")
+
+            for waiter in waiters:
+                waiter.saved = True
+                waiter.done.set()
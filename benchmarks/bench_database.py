@@ -0,0 +1,315 @@
+"""Benchmarks for DatabaseManager on synthetic multi-year databases.
+
+Generates timetracker databases covering 1 month to 5 years of activity
+across 1 to 200 projects, then measures save throughput, today's query
+latency, delete_project time, archiving time and file size. Results are written as JSON so
+runs on different commits can be compared:
+
+    python benchmarks/bench_database.py --output before.json
+    git checkout other-branch
+    python benchmarks/bench_database.py --output after.json
+
+Generated databases are cached in --data-dir (keyed by dataset parameters)
+and copied before anything writes to them, so reruns skip generation.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import datetime
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database_manager import DatabaseManager
+from activity_archive import ActivityArchive
+
+# Dataset sizes by name: (days of history, number of projects)
+DATASETS = {
+    "1m-1p": (30, 1),
+    "1m-20p": (30, 20),
+    "1y-20p": (365, 20),
+    "1y-200p": (365, 200),
+    "5y-20p": (5 * 365, 20),
+    "5y-200p": (5 * 365, 200),
+}
+QUICK_DATASETS = ["1m-1p", "1m-20p"]
+
+SWITCHES_PER_DAY = 2000  # A busy workday: a window switch every ~15 seconds
+WORKDAY_START_HOUR = 8
+
+# (process name, domain_info or None for browsers, weight)
+APPS = [
+    ("chrome", None, 40),
+    ("firefox", None, 5),
+    ("Code", "Code", 20),
+    ("slack", "slack", 10),
+    ("OUTLOOK", "OUTLOOK", 8),
+    ("WINWORD", "WINWORD", 5),
+    ("Teams", "Teams", 7),
+    ("explorer", "explorer", 5),
+]
+SITES = ["GitHub", "YouTube", "Reddit", "Stack Overflow", "Google", "Gmail", "Wikipedia", "Other"]
+TITLES_PER_APP = 20000  # Upper bound of distinct titles per app over the whole history
+
+
+def title_rank(rng):
+    """Zipf-like title popularity: a few titles get most of the time"""
+    return min(int(rng.paretovariate(0.8)), TITLES_PER_APP)
+
+
+def generate_day(rng, day, project_ids, switches=SWITCHES_PER_DAY):
+    """Yield one synthetic workday of activities"""
+    weights = [app[2] for app in APPS]
+    current = datetime.datetime.combine(day, datetime.time(WORKDAY_START_HOUR))
+    project_id = rng.choice(project_ids)
+
+    for i in range(switches):
+        # Switch project roughly every hour
+        if i % 240 == 0:
+            project_id = rng.choice(project_ids)
+
+        name, domain_info, _ = rng.choices(APPS, weights)[0]
+        rank = title_rank(rng)
+        if domain_info is None:
+            domain_info = SITES[rank % len(SITES)]
+            window_title = f"{domain_info} page {rank} about topic {rank * 7 % 1000}"
+        else:
+            window_title = f"{name} document {rank} - {name}"
+
+        duration = datetime.timedelta(seconds=max(1, int(rng.expovariate(1 / 14))))
+        yield {
+            "project_id": project_id,
+            "type": "Application",
+            "name": name,
+            "window_title": window_title,
+            "short_title": window_title[:27] + "..." if len(window_title) > 30 else window_title,
+            "domain_info": domain_info,
+            "start_time": current,
+            "end_time": current + duration,
+        }
+        current += duration
+
+
+def generate_database(path, days, projects, seed=42):
+    """Create a database with `days` of history ending today"""
+    rng = random.Random(seed)
+    db = DatabaseManager(path)
+    try:
+        project_ids = [1] + [db.create_project(f"Project {i}") for i in range(2, projects + 1)]
+
+        today = datetime.date.today()
+        batch = []
+        for offset in range(days - 1, -1, -1):
+            batch.extend(generate_day(rng, today - datetime.timedelta(days=offset), project_ids))
+            if len(batch) >= 50000:
+                db.save_activities(batch)
+                batch = []
+        db.save_activities(batch)
+    finally:
+        db.close()
+
+
+def dataset_path(data_dir, name):
+    days, projects = DATASETS[name]
+    return os.path.join(data_dir, f"bench-{days}d-{projects}p-{SWITCHES_PER_DAY}spd.db")
+
+
+def file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def timed_runs(func, runs):
+    """Run func `runs` times; return latency stats in milliseconds"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+def busiest_project_today(path):
+    conn = sqlite3.connect(path)
+    try:
+        day_start = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        row = conn.execute(
+            "SELECT project_id, COUNT(*) FROM activities WHERE start_ts >= ? "
+            "GROUP BY project_id ORDER BY COUNT(*) DESC LIMIT 1",
+            (int(day_start.timestamp()),)).fetchone()
+        total = conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+        return (row[0] if row else 1), total
+    finally:
+        conn.close()
+
+
+def copy_database(source, work_dir, name):
+    target = os.path.join(work_dir, name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    # The archive of closed months belongs to the previous copy
+    shutil.rmtree(os.path.splitext(target)[0] + "_archive", ignore_errors=True)
+    shutil.copy(source, target)
+    return target
+
+
+def open_database(path):
+    """Open a benchmark copy without background migrations, which would archive while we time"""
+    return DatabaseManager(path, start_migrations=False)
+
+
+def bench_dataset(name, data_dir, work_dir, runs, writes, regenerate=False):
+    days, projects = DATASETS[name]
+    source = dataset_path(data_dir, name)
+
+    generate_seconds = None
+    if regenerate or not os.path.exists(source):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(source + suffix):
+                os.remove(source + suffix)
+        started = time.perf_counter()
+        generate_database(source, days, projects)
+        generate_seconds = time.perf_counter() - started
+
+    project_id, rows = busiest_project_today(source)
+    result = {
+        "dataset": {"name": name, "days": days, "projects": projects, "rows": rows},
+        "generate_seconds": generate_seconds,
+        "file_size_bytes": file_size(source),
+    }
+
+    # Read latency on a pristine copy
+    path = copy_database(source, work_dir, "read.db")
+    db = open_database(path)
+    try:
+        db.get_today_activities_hierarchical(project_id)  # Warm the page cache
+        result["hierarchical_project"] = timed_runs(lambda: db.get_today_activities_hierarchical(project_id), runs)
+        result["hierarchical_all"] = timed_runs(lambda: db.get_today_activities_hierarchical(), runs)
+        result["aggregated_project"] = timed_runs(lambda: db.get_today_activities_aggregated(project_id), runs)
+        result["aggregated_all"] = timed_runs(lambda: db.get_today_activities_aggregated(), runs)
+    finally:
+        db.close()
+
+    # Write throughput, one transaction per activity and in batches
+    path = copy_database(source, work_dir, "write.db")
+    db = open_database(path)
+    try:
+        rng = random.Random(7)
+        activities = list(generate_day(rng, datetime.date.today(), [project_id], writes))
+
+        started = time.perf_counter()
+        for activity in activities:
+            db.save_activity(activity)
+        result["save_activity_per_second"] = writes / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for i in range(0, writes, 100):
+            db.save_activities(activities[i:i + 100])
+        result["save_activities_batch100_per_second"] = writes / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+    # delete_project, transferring and deleting activities
+    if projects > 2:
+        path = copy_database(source, work_dir, "delete.db")
+        db = open_database(path)
+        try:
+            started = time.perf_counter()
+            db.delete_project(2, transfer_to_default=True)
+            result["delete_project_transfer_ms"] = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            db.delete_project(3, transfer_to_default=False)
+            result["delete_project_delete_ms"] = (time.perf_counter() - started) * 1000
+        finally:
+            db.close()
+
+    # Moving closed months to the archive, as the app does on startup
+    if ActivityArchive.available():
+        path = copy_database(source, work_dir, "archive.db")
+        db = open_database(path)
+        try:
+            started = time.perf_counter()
+            result["archived_rows"] = db.archive_closed_months()
+            result["archive_closed_months_ms"] = (time.perf_counter() - started) * 1000
+        finally:
+            db.close()
+        result["file_size_after_archive_bytes"] = file_size(path)
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager on synthetic databases")
+    parser.add_argument("--datasets", default=None,
+                        help=f"Comma separated dataset names (default: all). Available: {', '.join(DATASETS)}")
+    parser.add_argument("--quick", action="store_true", help=f"Only run {', '.join(QUICK_DATASETS)}")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="Where generated databases are cached")
+    parser.add_argument("--runs", type=int, default=20, help="Repetitions per query benchmark")
+    parser.add_argument("--writes", type=int, default=2000, help="Activities written per write benchmark")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Rebuild cached databases (e.g. after a schema change)")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        names = QUICK_DATASETS
+    elif args.datasets:
+        names = [name.strip() for name in args.datasets.split(",")]
+    else:
+        names = list(DATASETS)
+
+    unknown = [name for name in names if name not in DATASETS]
+    if unknown:
+        parser.error(f"Unknown datasets: {', '.join(unknown)}")
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    work_dir = os.path.join(args.data_dir, "work")
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = []
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results.append(bench_dataset(name, args.data_dir, work_dir, args.runs, args.writes, args.regenerate))
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,74 +1,160 @@
 import os
+import time
+import heapq
+import queue
 import sqlite3
 import datetime
-from collections import defaultdict
+import threading
+import itertools
+from operator import itemgetter
+from contextlib import contextmanager
+
+from activity_archive import ActivityArchive, STRING_TABLES
+from activity_export import write_activities
+
+# Connection tuning shared by the writer and the pooled readers
+SQLITE_TIMEOUT = 5.0          # Seconds to wait on a locked database
+CACHED_STATEMENTS = 256       # Prepared statements kept per connection
+CACHE_SIZE_KIB = 16384        # Page cache per connection (negative PRAGMA value = KiB)
+READER_POOL_SIZE = 4          # Idle reader connections kept open
+MIGRATION_BATCH_SIZE = 20000  # Rows converted per transaction by background migrations
+MERGE_GAP_SECONDS = 60        # Resuming the same window within this gap extends its last row
+LOOKUP_CACHE_SIZE = 10000     # Interned strings remembered per lookup table
+EXPORT_BATCH_SIZE = 5000      # Rows fetched at a time by streaming exports
+IMPORT_BATCH_SIZE = 50000     # Rows staged or inserted per transaction by bulk imports
+IMPORT_DEFER_INDEX_ROWS = 100000  # Imports this large drop the activity indexes and rebuild them once
+SEARCH_LIMIT = 200            # Titles returned by a search
 
 class DatabaseManager:
-    def __init__(self):
-        self.db_filename = "timetracker.db"
+    def __init__(self, db_filename="timetracker.db", merge_gap=MERGE_GAP_SECONDS, archive_dir=None,
+                 start_migrations=True):
+        self.db_filename = db_filename
+        # Short-lived tools (the CLI) leave long migrations to the app
+        self.start_migrations = start_migrations
+        
+        # Activities of closed months moved out of the live database
+        self.archive = ActivityArchive(archive_dir or os.path.splitext(db_filename)[0] + "_archive")
+        
+        # Heartbeat merging: an activity that resumes the same (project, app,
+        # title) within merge_gap seconds extends the previous row instead of
+        # adding one. None disables merging.
+        self.merge_gap = merge_gap
+        self._recent_rows = {}  # Merge key -> (row id, end_ts, day)
+        
+        # String -> id of the app, domain and title lookup tables, per table
+        self._lookup_ids = {"apps": {}, "domains": {}, "titles": {}}
+        
+        # Set while a large import has the activity indexes dropped
+        self._import_dropped_indexes = False
+        
+        # True while background migrations of an older database are pending
+        self.upgrading = False
+        
+        # One long-lived writer connection, serialized by a lock so it can be
+        # shared between the GUI thread and background threads
+        self._write_conn = None
+        self._write_lock = threading.RLock()
+        
+        # Reader connections are checked out of a small pool; in WAL mode they
+        # never block the writer and the writer never blocks them
+        self._reader_pool = queue.LifoQueue(maxsize=READER_POOL_SIZE)
+        self._closed = False
+        
         self.initialize_database()
 
+    def _connect(self, readonly=False):
+        """Open a tuned connection to the database file"""
+        conn = sqlite3.connect(
+            self.db_filename,
+            timeout=SQLITE_TIMEOUT,
+            isolation_level=None,  # Transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS
+        )
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _get_write_connection(self):
+        """Return the shared writer connection, opening it on first use"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("DatabaseManager has been closed")
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+            # WAL is persistent in the file, but setting it again is cheap
+            self._write_conn.execute("PRAGMA journal_mode=WAL")
+        return self._write_conn
+
+    @contextmanager
+    def _write_transaction(self):
+        """Run a block inside a single write transaction on the writer connection"""
+        with self._write_lock:
+            conn = self._get_write_connection()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def _read_cursor(self):
+        """Borrow a reader connection from the pool for the duration of a query"""
+        try:
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(readonly=True)
+        
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            if self._closed:
+                conn.close()
+            else:
+                try:
+                    self._reader_pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    def close(self):
+        """Close the writer and all pooled reader connections"""
+        self._closed = True
+        
+        while True:
+            try:
+                self._reader_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        
+        with self._write_lock:
+            if self._write_conn is not None:
+                try:
+                    self._write_conn.execute("PRAGMA optimize")
+                except sqlite3.Error:
+                    pass
+                self._write_conn.close()
+                self._write_conn = None
+
     def initialize_database(self):
         """Create the database file and tables if they don't exist"""
         is_new_db = not os.path.exists(self.db_filename)
         
         if is_new_db:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
-            # Create projects table
-            cursor.execute('''
-                CREATE TABLE projects (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    description TEXT,
-                    created_at TEXT,
-                    last_active TEXT
-                )
-            ''')
-            
-            # Create activities table with project reference and domain_info for grouping
-            cursor.execute('''
-                CREATE TABLE activities (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    project_id INTEGER,
-                    type TEXT,
-                    name TEXT,
-                    window_title TEXT,
-                    short_title TEXT,
-                    domain_info TEXT,
-                    start_time TEXT,
-                    end_time TEXT,
-                    FOREIGN KEY (project_id) REFERENCES projects (id)
-                )
-            ''')
+            # Pages freed by archiving are given back with incremental_vacuum;
+            # this has to be chosen before the first table is created
+            with self._write_lock:
+                self._get_write_connection().execute("PRAGMA auto_vacuum=INCREMENTAL")
             
-            # Create a default project
-            cursor.execute('''
-                INSERT INTO projects (name, description, created_at, last_active)
-                VALUES (?, ?, ?, ?)
-            ''', ("Default Project", "Default project for all activities", 
-                datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-            
-            conn.commit()
-            conn.close()
-        else:
-            # Check if projects table exists, if not add it
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
-            # Check if domain_info column exists in activities table
-            cursor.execute("PRAGMA table_info(activities)")
-            columns = [info[1] for info in cursor.fetchall()]
-            
-            if 'domain_info' not in columns:
-                cursor.execute("ALTER TABLE activities ADD COLUMN domain_info TEXT DEFAULT 'Other'")
-                conn.commit()
-            
-            # Check if projects table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='projects'")
-            if not cursor.fetchone():
+            with self._write_transaction() as cursor:
                 # Create projects table
                 cursor.execute('''
                     CREATE TABLE projects (
@@ -80,9 +166,15 @@ class DatabaseManager:
                     )
                 ''')
                 
-                # Add project_id column to activities if it doesn't exist
-                if 'project_id' not in columns:
-                    cursor.execute("ALTER TABLE activities ADD COLUMN project_id INTEGER")
+                # Create activities table with project reference; app, domain and
+                # window title strings are stored once in lookup tables
+                self._create_lookup_tables(cursor)
+                self._create_activities(cursor)
+                self._create_activity_indexes(cursor)
+                self._create_daily_totals(cursor)
+                self._create_idle_periods(cursor)
+                if self._fts5_available():
+                    self._create_search_index(cursor)
                 
                 # Create a default project
                 cursor.execute('''
@@ -91,80 +183,599 @@ class DatabaseManager:
                 ''', ("Default Project", "Default project for all activities", 
                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        else:
+            with self._write_transaction() as cursor:
+                # Check if domain_info column exists in activities table
+                cursor.execute("PRAGMA table_info(activities)")
+                columns = [info[1] for info in cursor.fetchall()]
+                
+                if 'domain_info' not in columns and 'title_id' not in columns:
+                    cursor.execute("ALTER TABLE activities ADD COLUMN domain_info TEXT DEFAULT 'Other'")
+                
+                # Integer epoch timestamps used for indexed range queries. Adding
+                # the columns is instant; existing rows are converted later.
+                if 'start_ts' not in columns:
+                    cursor.execute("ALTER TABLE activities ADD COLUMN start_ts INTEGER")
+                    cursor.execute("ALTER TABLE activities ADD COLUMN end_ts INTEGER")
+                
+                # Active seconds of a row, which can be less than end - start
+                # once flip-flopping activities are merged. NULL means end - start.
+                if 'duration' not in columns:
+                    cursor.execute("ALTER TABLE activities ADD COLUMN duration INTEGER")
+                
+                # Check if projects table exists
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='projects'")
+                if not cursor.fetchone():
+                    # Create projects table
+                    cursor.execute('''
+                        CREATE TABLE projects (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            name TEXT UNIQUE NOT NULL,
+                            description TEXT,
+                            created_at TEXT,
+                            last_active TEXT
+                        )
+                    ''')
+                    
+                    # Add project_id column to activities if it doesn't exist
+                    if 'project_id' not in columns:
+                        cursor.execute("ALTER TABLE activities ADD COLUMN project_id INTEGER")
+                    
+                    # Create a default project
+                    cursor.execute('''
+                        INSERT INTO projects (name, description, created_at, last_active)
+                        VALUES (?, ?, ?, ?)
+                    ''', ("Default Project", "Default project for all activities", 
+                        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                
+                # Move repeated strings into lookup tables: new rows go straight
+                # into the new layout and the old ones follow in the background
+                if 'title_id' not in columns:
+                    self._start_lookup_migration(cursor)
+                
+                # Long migrations run in the background, in this order
+                migrations = []
+                
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activities_legacy'")
+                if cursor.fetchone():
+                    migrations.append(self._migrate_lookup_tables)
                 
-                conn.commit()
+                # Full-text index of titles and domains, filled from the lookup tables
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='titles_fts'")
+                if cursor.fetchone() is None and self._fts5_available():
+                    migrations.append(self._build_search_index)
+                
+                # The indexes are created last by the timestamp migration, so
+                # their absence means old rows still need converting
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_activities_project_start'")
+                if cursor.fetchone() is None:
+                    migrations.append(self._migrate_epoch_timestamps)
+                
+                # Daily rollup: rows that existed before the table are backfilled
+                # from the newest down; later rows maintain it as they are saved
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='daily_totals'")
+                if not cursor.fetchone():
+                    self._create_daily_totals(cursor)
+                    cursor.execute("SELECT MAX(id) FROM activities")
+                    cursor.execute("INSERT INTO migration_progress (name, position) VALUES ('daily_totals', ?)",
+                                   (cursor.fetchone()[0] or 0,))
+                
+                self._create_idle_periods(cursor)
+                
+                cursor.execute("SELECT position FROM migration_progress WHERE name = 'daily_totals'")
+                row = cursor.fetchone()
+                if row and row[0] > 0:
+                    migrations.append(self._backfill_daily_totals)
+                
+                # Until these finish, reports miss the rows still being converted
+                self.upgrading = any(migrate != self._build_search_index for migrate in migrations)
+                
+                # Once the rows are converted, closed months move to the archive
+                if ActivityArchive.available():
+                    migrations.append(lambda: self.archive_closed_months() is not None)
+            
+            if migrations and self.start_migrations:
+                migration = threading.Thread(target=self._run_migrations, args=(migrations,), name="DatabaseMigration")
+                migration.daemon = True
+                migration.start()
+
+    def _run_migrations(self, migrations):
+        for migrate in migrations:
+            if self._closed or not migrate():
+                return  # Resumed on the next start
+
+    def _create_lookup_tables(self, cursor):
+        """Create the tables interning app names, domains and window titles"""
+        cursor.execute("CREATE TABLE IF NOT EXISTS apps (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS domains (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS titles (id INTEGER PRIMARY KEY, title TEXT UNIQUE NOT NULL)")
+
+    def _create_activities(self, cursor, table="activities"):
+        """Create the activities table; short titles are derived from the title when read"""
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                type TEXT,
+                app_id INTEGER,
+                domain_id INTEGER,
+                title_id INTEGER,
+                start_time TEXT,
+                end_time TEXT,
+                start_ts INTEGER,
+                end_ts INTEGER,
+                duration INTEGER,
+                FOREIGN KEY (project_id) REFERENCES projects (id),
+                FOREIGN KEY (app_id) REFERENCES apps (id),
+                FOREIGN KEY (domain_id) REFERENCES domains (id),
+                FOREIGN KEY (title_id) REFERENCES titles (id)
+            )
+        ''')
+
+    def _create_daily_totals(self, cursor, table="daily_totals"):
+        """Create the per-day rollup of seconds by project, app, domain and title"""
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                day TEXT NOT NULL,
+                project_id INTEGER NOT NULL,
+                app_id INTEGER NOT NULL,
+                domain_id INTEGER NOT NULL,
+                title_id INTEGER NOT NULL,
+                seconds INTEGER NOT NULL,
+                PRIMARY KEY (day, project_id, app_id, domain_id, title_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Position of resumable background migrations
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS migration_progress (
+                name TEXT PRIMARY KEY,
+                position INTEGER
+            )
+        ''')
+
+    def _create_idle_periods(self, cursor):
+        """Create the table of time away from the keyboard, which no activity is credited with"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idle_periods (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_idle_periods_start ON idle_periods (start_ts)")
+
+    def _create_search_index(self, cursor):
+        """Create FTS5 indexes over window titles and domains, kept in sync by triggers.
+
+        They index the lookup tables (external content), so each distinct
+        title is indexed once when save_activities first interns it.
+        """
+        for table, column in (("titles", "title"), ("domains", "name")):
+            cursor.execute(f"CREATE VIRTUAL TABLE {table}_fts USING fts5({column}, content='{table}', content_rowid='id')")
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {table}_fts (rowid, {column}) VALUES (new.id, new.{column});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {table}_fts ({table}_fts, rowid, {column}) VALUES ('delete', old.id, old.{column});
+                END
+            ''')
+            cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+    def _build_search_index(self):
+        """Add the search index to a database created before it existed"""
+        try:
+            with self._write_transaction() as cursor:
+                self._create_search_index(cursor)
+            return True
+        except Exception as e:
+            print(f"Error building search index: {e}")
+            return False
+
+    @staticmethod
+    def _fts5_available():
+        """True if this SQLite build includes FTS5"""
+        try:
+            sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(text)")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _create_activity_indexes(self, cursor):
+        """Create the indexes backing the day and project range queries"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_activities_project_start ON activities (project_id, start_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_activities_start ON activities (start_ts)")
+
+    def _start_lookup_migration(self, cursor):
+        """Switch activities to the lookup table layout, leaving the old rows to move later.
+
+        The old table is renamed to activities_legacy and an empty one is
+        created in its place, so this is instant however large the history.
+        _migrate_lookup_tables() then moves the old rows over. daily_totals
+        of the old layout is dropped and rebuilt by the backfill once they
+        are in.
+        """
+        self._create_lookup_tables(cursor)
+        
+        # Missing indexes mean the timestamp migration still has to run
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_activities_project_start'")
+        indexed = cursor.fetchone() is not None
+        cursor.execute("DROP INDEX IF EXISTS idx_activities_project_start")
+        cursor.execute("DROP INDEX IF EXISTS idx_activities_start")
+        
+        cursor.execute("ALTER TABLE activities RENAME TO activities_legacy")
+        self._create_activities(cursor)
+        if indexed:
+            self._create_activity_indexes(cursor)
+        
+        # New rows are numbered after the old ones, which keep their ids
+        cursor.execute("SELECT MAX(id) FROM activities_legacy")
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('activities', ?)", (last_id,))
+        
+        cursor.execute("DROP TABLE IF EXISTS daily_totals")
+        self._create_daily_totals(cursor)
+        cursor.execute("INSERT OR REPLACE INTO migration_progress (name, position) VALUES ('daily_totals', ?)",
+                       (last_id,))
+
+    def _migrate_lookup_tables(self):
+        """Move rows saved before the lookup tables existed into activities.
+
+        Newest first, a batch per transaction: the batch's strings are
+        interned, its rows are copied with their ids and then deleted from
+        activities_legacy, so an interrupted migration resumes where it
+        stopped. Text start/end times are dropped from rows that already
+        have epoch timestamps. The old table's space is given back at the end.
+        """
+        try:
+            while True:
+                if self._closed:
+                    return False
+                with self._write_transaction() as cursor:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activities_legacy'")
+                    if cursor.fetchone() is None:
+                        return True  # Finished elsewhere, e.g. by an import
+                    
+                    cursor.execute("SELECT MAX(id) FROM activities_legacy")
+                    upper = cursor.fetchone()[0]
+                    if upper is None:
+                        cursor.execute("DROP TABLE activities_legacy")
+                        break
+                    lower = upper - MIGRATION_BATCH_SIZE
+                    
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO apps (name)
+                        SELECT DISTINCT COALESCE(name, '') FROM activities_legacy WHERE id > ?
+                    ''', (lower,))
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO domains (name)
+                        SELECT DISTINCT COALESCE(NULLIF(domain_info, ''), 'Other') FROM activities_legacy WHERE id > ?
+                    ''', (lower,))
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO titles (title)
+                        SELECT DISTINCT COALESCE(window_title, '') FROM activities_legacy WHERE id > ?
+                    ''', (lower,))
+                    
+                    cursor.execute('''
+                        INSERT INTO activities (
+                            id, project_id, type, app_id, domain_id, title_id,
+                            start_time, end_time, start_ts, end_ts, duration
+                        )
+                        SELECT legacy.id, project_id, type, apps.id, domains.id, titles.id,
+                               CASE WHEN start_ts IS NULL THEN start_time END,
+                               CASE WHEN start_ts IS NULL THEN end_time END,
+                               start_ts, end_ts, duration
+                        FROM activities_legacy AS legacy
+                        JOIN apps ON apps.name = COALESCE(legacy.name, '')
+                        JOIN domains ON domains.name = COALESCE(NULLIF(legacy.domain_info, ''), 'Other')
+                        JOIN titles ON titles.title = COALESCE(legacy.window_title, '')
+                        WHERE legacy.id > ?
+                    ''', (lower,))
+                    cursor.execute("DELETE FROM activities_legacy WHERE id > ?", (lower,))
             
-            conn.close()
+            self._reclaim_space()
+            return True
+        except Exception as e:
+            print(f"Error migrating activities to lookup tables: {e}")
+            return False
+
+    def _migrate_epoch_timestamps(self):
+        """Fill start_ts/end_ts for rows written before they existed, then index them.
+
+        Rows are converted newest first in short transactions so today's data is
+        usable right away and the writer is never held for long. The migration
+        is resumable: if the app quits midway it picks up on the next start.
+        """
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT MAX(id) FROM activities")
+                upper = cursor.fetchone()[0] or 0
+            
+            while upper > 0:
+                if self._closed:
+                    return False
+                lower = max(upper - MIGRATION_BATCH_SIZE, 0)
+                with self._write_transaction() as cursor:
+                    # The 'utc' modifier treats the stored text as local time
+                    cursor.execute('''
+                        UPDATE activities
+                        SET start_ts = CAST(strftime('%s', start_time, 'utc') AS INTEGER),
+                            end_ts = CAST(strftime('%s', end_time, 'utc') AS INTEGER)
+                        WHERE id > ? AND id <= ? AND start_ts IS NULL
+                    ''', (lower, upper))
+                upper = lower
+            
+            with self._write_transaction() as cursor:
+                self._create_activity_indexes(cursor)
+            return True
+        except Exception as e:
+            print(f"Error migrating activity timestamps: {e}")
+            return False
+
+    def _backfill_daily_totals(self):
+        """Add activities saved before daily_totals existed to the rollup.
+
+        Works down from the recorded position in batches; each batch and the
+        new position commit together, so an interrupted backfill never counts
+        a row twice.
+        """
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT position FROM migration_progress WHERE name = 'daily_totals'")
+                upper = cursor.fetchone()[0]
+            
+            while upper > 0:
+                if self._closed:
+                    return False
+                lower = max(upper - MIGRATION_BATCH_SIZE, 0)
+                with self._write_transaction() as cursor:
+                    cursor.execute('''
+                        INSERT INTO daily_totals (day, project_id, app_id, domain_id, title_id, seconds)
+                        SELECT date(start_ts, 'unixepoch', 'localtime'), COALESCE(project_id, 0),
+                               app_id, domain_id, title_id, SUM(COALESCE(duration, end_ts - start_ts))
+                        FROM activities
+                        WHERE id > ? AND id <= ? AND start_ts IS NOT NULL
+                        GROUP BY 1, 2, 3, 4, 5
+                        ON CONFLICT (day, project_id, app_id, domain_id, title_id)
+                        DO UPDATE SET seconds = seconds + excluded.seconds
+                    ''', (lower, upper))
+                    cursor.execute("UPDATE migration_progress SET position = ? WHERE name = 'daily_totals'", (lower,))
+                upper = lower
+            return True
+        except Exception as e:
+            print(f"Error backfilling daily totals: {e}")
+            return False
 
     def save_activity(self, activity):
         """Save an activity to the database"""
+        return self.save_activities([activity])
+    
+    def save_activities(self, activities):
+        """Save a batch of activities in a single transaction. Returns True on success."""
+        if not activities:
+            return True
+        
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO activities (
-                    project_id, type, name, window_title, short_title, domain_info, start_time, end_time
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                activity.get("project_id", 1),  # Default to project ID 1 if not specified
-                activity["type"],
-                activity["name"],
-                activity["window_title"],
-                activity["short_title"],
-                activity.get("domain_info", "Other"),  # Default to "Other" if not specified
-                activity["start_time"].strftime("%Y-%m-%d %H:%M:%S"),
-                activity["end_time"].strftime("%Y-%m-%d %H:%M:%S")
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            # Update the last active timestamp of the project
-            if "project_id" in activity:
-                self.update_project_last_active(activity["project_id"])
+            with self._write_transaction() as cursor:
+                daily_rows = []
+                for activity in activities:
+                    row = self._activity_row(cursor, activity)
+                    if not self._merge_activity(cursor, activity, row):
+                        cursor.execute('''
+                            INSERT INTO activities (
+                                project_id, type, app_id, domain_id, title_id,
+                                start_time, end_time, start_ts, end_ts, duration
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', row)
+                        self._remember_row(activity, row, cursor.lastrowid)
+                    daily_rows.append(self._daily_total_row(activity, row))
+                
+                cursor.executemany('''
+                    INSERT INTO daily_totals (day, project_id, app_id, domain_id, title_id, seconds)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (day, project_id, app_id, domain_id, title_id)
+                    DO UPDATE SET seconds = seconds + excluded.seconds
+                ''', daily_rows)
+                
+                # Update the last active timestamp of each project once per batch
+                project_ids = {activity["project_id"] for activity in activities if "project_id" in activity}
+                for project_id in project_ids:
+                    self._touch_project(cursor, project_id)
+            return True
                 
         except Exception as e:
+            # Both may point at rows that were rolled back
+            self._recent_rows = {}
+            self._lookup_ids = {"apps": {}, "domains": {}, "titles": {}}
             print(f"Error saving activity: {e}")
+            return False
+    
+    def unsaved_activities(self, activities):
+        """Return the activities that are not stored yet, e.g. replayed from the crash journal.
+
+        An activity counts as stored if a row of the same window (app, domain
+        and title) covers its start; merging may have extended an earlier row
+        over it, but merged rows never span more than a day. On error all of
+        them are returned, as saving one twice beats losing it.
+        """
+        unsaved = []
+        
+        try:
+            with self._read_cursor() as cursor:
+                for activity in activities:
+                    start_ts = int(activity["start_time"].timestamp())
+                    cursor.execute('''
+                        SELECT 1
+                        FROM activities
+                        JOIN apps ON apps.id = activities.app_id
+                        JOIN domains ON domains.id = activities.domain_id
+                        JOIN titles ON titles.id = activities.title_id
+                        WHERE start_ts > ? AND start_ts <= ? AND end_ts > ?
+                          AND apps.name = ? AND domains.name = ? AND titles.title = ?
+                        LIMIT 1
+                    ''', (start_ts - 86400, start_ts, start_ts, activity["name"] or "",
+                          activity.get("domain_info") or "Other", activity["window_title"] or ""))
+                    if cursor.fetchone() is None:
+                        unsaved.append(activity)
+        except Exception as e:
+            print(f"Error checking for saved activities: {e}")
+            return list(activities)
+        
+        return unsaved
+    
+    def _activity_row(self, cursor, activity):
+        """Convert an activity dict into an activities table row"""
+        return (
+            activity.get("project_id", 1),  # Default to project ID 1 if not specified
+            activity["type"],
+            self._lookup_id(cursor, "apps", "name", activity["name"] or ""),
+            self._lookup_id(cursor, "domains", "name", activity.get("domain_info") or "Other"),
+            self._lookup_id(cursor, "titles", "title", activity["window_title"] or ""),
+            None, None,  # Text times are only kept on legacy rows awaiting conversion
+            int(activity["start_time"].timestamp()),
+            int(activity["end_time"].timestamp()),
+            int(activity["end_time"].timestamp()) - int(activity["start_time"].timestamp())
+        )
+    
+    def _lookup_id(self, cursor, table, column, value):
+        """Return the id of a string in a lookup table, adding it if it is new"""
+        ids = self._lookup_ids[table]
+        lookup_id = ids.get(value)
+        if lookup_id is not None:
+            return lookup_id
+        
+        cursor.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,))
+        row = cursor.fetchone()
+        if row:
+            lookup_id = row[0]
+        else:
+            cursor.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (value,))
+            lookup_id = cursor.lastrowid
+        
+        if len(ids) >= LOOKUP_CACHE_SIZE:
+            ids.clear()  # Window titles keep coming; start over rather than grow forever
+        ids[value] = lookup_id
+        return lookup_id
+    
+    def _merge_key(self, activity):
+        return (activity.get("project_id", 1), activity["name"], activity["window_title"],
+                activity.get("domain_info", "Other"))
+    
+    def _merge_activity(self, cursor, activity, row):
+        """Extend the previous row of the same window if it ended within merge_gap"""
+        if self.merge_gap is None:
+            return False
+        
+        recent = self._recent_rows.get(self._merge_key(activity))
+        if recent is None:
+            return False
+        
+        row_id, last_end_ts, day = recent
+        start_ts, end_ts, duration = row[7], row[8], row[9]
+        
+        # Merged rows stay within one day so they agree with daily_totals
+        if not 0 <= start_ts - last_end_ts <= self.merge_gap or activity["start_time"].date() != day:
+            return False
+        
+        # The right-hand sides see the row's values from before the update
+        cursor.execute('''
+            UPDATE activities
+            SET end_time = ?, end_ts = ?, duration = COALESCE(duration, end_ts - start_ts) + ?
+            WHERE id = ?
+        ''', (row[6], end_ts, duration, row_id))
+        if cursor.rowcount != 1:
+            return False  # The row was compacted or deleted meanwhile
+        
+        self._recent_rows[self._merge_key(activity)] = (row_id, end_ts, day)
+        return True
+    
+    def _remember_row(self, activity, row, row_id):
+        """Keep the newest row per merge key while it can still be extended"""
+        if self.merge_gap is None:
+            return
+        
+        end_ts = row[8]
+        if len(self._recent_rows) > 1000:
+            # Forget rows that ended too long ago to be merged into
+            self._recent_rows = {
+                key: recent for key, recent in self._recent_rows.items()
+                if end_ts - recent[1] <= self.merge_gap
+            }
+        self._recent_rows[self._merge_key(activity)] = (row_id, end_ts, activity["start_time"].date())
+    
+    def _daily_total_row(self, activity, row):
+        """Convert an activity and its activities row into its daily_totals contribution"""
+        project_id, _, app_id, domain_id, title_id = row[:5]
+        return (
+            activity["start_time"].date().isoformat(),  # Counted on the day it started
+            project_id, app_id, domain_id, title_id,
+            row[9]
+        )
     
     def get_today_activities(self, project_id=None):
         """Get all activities for the current day, optionally filtered by project"""
+        today = datetime.date.today()
+        return self.get_activities(today, today, None if project_id is None else [project_id])
+    
+    def get_activities(self, start_date, end_date, project_ids=None):
+        """Get the activities that started between two dates (inclusive), newest first.
+
+        Archived months are read from the archive and live rows from the
+        database, so callers don't need to know where a day is stored.
+        """
         activities = []
         
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
+            range_start = self._day_bounds(self._date(start_date))[0]
+            range_end = self._day_bounds(self._date(end_date))[1]
             
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
+            rows = []
+            for columns, strings in self.archive.scan(range_start, range_end, project_ids):
+                rows.extend(zip(
+                    [strings["types"][i] for i in columns["type_id"].tolist()],
+                    [strings["apps"][i] for i in columns["app_id"].tolist()],
+                    [strings["titles"][i] for i in columns["title_id"].tolist()],
+                    [strings["domains"][i] for i in columns["domain_id"].tolist()],
+                    columns["start_ts"].tolist(), columns["end_ts"].tolist(), columns["duration"].tolist()
+                ))
             
             query = '''
-                SELECT type, name, window_title, short_title, domain_info, start_time, end_time
+                SELECT type, apps.name, titles.title, domains.name, start_ts, end_ts,
+                       COALESCE(duration, end_ts - start_ts)
                 FROM activities
-                WHERE start_time LIKE ?
+                JOIN apps ON apps.id = activities.app_id
+                JOIN domains ON domains.id = activities.domain_id
+                JOIN titles ON titles.id = activities.title_id
+                WHERE start_ts >= ? AND start_ts < ?
             '''
-            params = [f"{today}%"]
+            params = [range_start, range_end]
             
-            if project_id is not None:
-                query += " AND project_id = ?"
-                params.append(project_id)
-                
-            query += " ORDER BY start_time DESC"
+            if project_ids is not None:
+                query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+                params.extend(project_ids)
             
-            cursor.execute(query, params)
+            with self._read_cursor() as cursor:
+                cursor.execute(query, params)
+                rows.extend(cursor.fetchall())
             
-            rows = cursor.fetchall()
+            rows.sort(key=lambda row: row[4], reverse=True)
             
             for row in rows:
-                start_time = datetime.datetime.strptime(row[5], "%Y-%m-%d %H:%M:%S")
-                end_time = datetime.datetime.strptime(row[6], "%Y-%m-%d %H:%M:%S")
-                duration = end_time - start_time
+                start_time = datetime.datetime.fromtimestamp(row[4])
+                end_time = datetime.datetime.fromtimestamp(row[5])
+                duration = datetime.timedelta(seconds=row[6])  # Active time, not the span
                 
                 activity = {
                     "type": row[0],
                     "name": row[1],
                     "window_title": row[2],
-                    "short_title": row[3],
-                    "domain_info": row[4] if row[4] else "Other",
+                    "short_title": self._short_title(row[2]),
+                    "domain_info": row[3],
                     "start_time": start_time,
                     "end_time": end_time,
                     "duration_formatted": self._format_duration(duration),
@@ -172,174 +783,365 @@ class DatabaseManager:
                 }
                 
                 activities.append(activity)
-            
-            conn.close()
         except Exception as e:
             print(f"Error retrieving activities: {e}")
         
         return activities
         
+    def iter_activities(self, start_date=None, end_date=None, project_ids=None, batch_size=EXPORT_BATCH_SIZE):
+        """Yield the activities that started between two dates (inclusive), in start order.
+
+        Rows are activity_export.EXPORT_COLUMNS tuples, read batch_size at a
+        time from the archive and from a database cursor and merged on their
+        start, so memory use stays flat however long the range is (closed
+        months can still have live rows, e.g. from an import). A date of None
+        leaves that end open.
+        """
+        range_start = self._day_bounds(self._date(start_date))[0] if start_date else None
+        range_end = self._day_bounds(self._date(end_date))[1] if end_date else None
+        project_names = {project["id"]: project["name"] for project in self.get_projects()}
+        
+        def iso(ts):
+            return datetime.datetime.fromtimestamp(ts).isoformat()
+        
+        def segment_rows(columns, strings):
+            # Sliced so only a batch of the segment is unpacked at once
+            for offset in range(0, len(columns["id"]), batch_size):
+                batch = {column: columns[column][offset:offset + batch_size].tolist()
+                         for column in ("start_ts", "end_ts", "duration", "project_id", "type_id",
+                                        "app_id", "domain_id", "title_id")}
+                for row in zip(*batch.values()):
+                    start_ts, end_ts, duration, project_id, type_id, app_id, domain_id, title_id = row
+                    yield (start_ts, end_ts, duration, project_names.get(project_id),
+                           strings["types"][type_id], strings["apps"][app_id],
+                           strings["domains"][domain_id], strings["titles"][title_id])
+        
+        # Months don't overlap, but the segments of one month can
+        archived = itertools.chain.from_iterable(
+            heapq.merge(*[segment_rows(columns, strings) for columns, strings in segments], key=itemgetter(0))
+            for segments in self.archive.scan_months(range_start, range_end, project_ids)
+        )
+        
+        query = '''
+            SELECT start_ts, end_ts, COALESCE(duration, end_ts - start_ts), projects.name,
+                   type, apps.name, domains.name, titles.title
+            FROM activities
+            JOIN apps ON apps.id = activities.app_id
+            JOIN domains ON domains.id = activities.domain_id
+            JOIN titles ON titles.id = activities.title_id
+            LEFT JOIN projects ON projects.id = activities.project_id
+            WHERE start_ts IS NOT NULL
+        '''
+        params = []
+        if range_start is not None:
+            query += " AND start_ts >= ?"
+            params.append(range_start)
+        if range_end is not None:
+            query += " AND start_ts < ?"
+            params.append(range_end)
+        if project_ids is not None:
+            query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+            params.extend(project_ids)
+        query += " ORDER BY start_ts"
+        
+        with self._read_cursor() as cursor:
+            cursor.execute(query, params)
+            live = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(batch_size), []))
+            for row in heapq.merge(archived, live, key=itemgetter(0)):
+                yield (iso(row[0]), iso(row[1])) + tuple(row[2:])
+    
+    def export_activities(self, output, export_format="csv", start_date=None, end_date=None, project_ids=None):
+        """Stream activities to a path or text file as CSV, JSON Lines or Parquet.
+
+        Returns the number of rows written, or None on error.
+        """
+        try:
+            return write_activities(self.iter_activities(start_date, end_date, project_ids), output, export_format)
+        except Exception as e:
+            print(f"Error exporting activities: {e}")
+            return None
+    
     def get_today_activities_aggregated(self, project_id=None):
         """Get today's activities aggregated by application and window title"""
-        activities = self.get_today_activities(project_id)
-        
-        # Use a dictionary to aggregate
-        aggregated = defaultdict(lambda: {
-            "name": "",
-            "window_title": "",
-            "short_title": "",
-            "domain_info": "",
-            "start_time": datetime.datetime.now(),
-            "total_seconds": 0
-        })
-        
-        for activity in activities:
-            # Track each window title separately
-            key = (activity["name"], activity["window_title"])
-            
-            if key not in aggregated or activity["start_time"] < aggregated[key]["start_time"]:
-                aggregated[key]["start_time"] = activity["start_time"]
-                aggregated[key]["name"] = activity["name"]
-                aggregated[key]["window_title"] = activity["window_title"]
-                aggregated[key]["domain_info"] = activity["domain_info"]
-            
-            aggregated[key]["total_seconds"] += activity["duration_seconds"]
-        
-        # Convert to list and add formatted durations
         result = []
-        for key, data in aggregated.items():
-            # Convert seconds to timedelta for formatting
-            duration = datetime.timedelta(seconds=int(data["total_seconds"]))
-            
-            result.append({
-                "name": data["name"],
-                "window_title": data["window_title"],
-                "domain_info": data["domain_info"],
-                "start_time": data["start_time"],
-                "duration_formatted": self._format_duration(duration),
-                "duration_seconds": data["total_seconds"]  # Keep this for sorting
-            })
         
-        # Sort by duration (descending)
-        result.sort(key=lambda x: x["duration_seconds"], reverse=True)
+        try:
+            day_start, day_end = self._day_bounds(datetime.date.today())
+            
+            # Group on ids and look the strings up per group. domain_id is a
+            # bare column next to MIN(), so SQLite takes it from the earliest
+            # row of each group.
+            query = '''
+                SELECT app_id, title_id, domain_id,
+                       MIN(start_ts) AS start_ts, SUM(COALESCE(duration, end_ts - start_ts)) AS total_seconds
+                FROM activities
+                WHERE start_ts >= ? AND start_ts < ?
+            '''
+            params = [day_start, day_end]
+            
+            if project_id is not None:
+                query += " AND project_id = ?"
+                params.append(project_id)
+            
+            # Sort by duration (descending)
+            query = f'''
+                SELECT apps.name, titles.title, domains.name, start_ts, total_seconds
+                FROM ({query} GROUP BY app_id, title_id) AS grouped
+                JOIN apps ON apps.id = grouped.app_id
+                JOIN domains ON domains.id = grouped.domain_id
+                JOIN titles ON titles.id = grouped.title_id
+                ORDER BY total_seconds DESC
+            '''
+            
+            with self._read_cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            
+            for name, window_title, domain_info, start_ts, total_seconds in rows:
+                result.append({
+                    "name": name,
+                    "window_title": window_title,
+                    "domain_info": domain_info,
+                    "start_time": datetime.datetime.fromtimestamp(start_ts),
+                    "duration_formatted": self._format_duration(datetime.timedelta(seconds=total_seconds)),
+                    "duration_seconds": total_seconds  # Keep this for sorting
+                })
+        except Exception as e:
+            print(f"Error retrieving aggregated activities: {e}")
         
         return result
 
+    def get_today_activity_totals(self, project_id=None):
+        """Get today's total seconds per (application, domain, window title)"""
+        today = datetime.date.today()
+        return self.get_activity_totals(today, today, None if project_id is None else [project_id])
+
+    def get_activity_totals(self, start_date, end_date, project_ids=None):
+        """Get total seconds per (application, domain, window title) over a date range.
+
+        start_date and end_date are inclusive dates (or 'YYYY-MM-DD' strings);
+        project_ids limits the totals to those projects. Reads the daily_totals
+        rollup, so the cost depends on days x distinct titles, not raw rows.
+        """
+        try:
+            query = '''
+                SELECT app_id, domain_id, title_id, SUM(seconds) AS seconds
+                FROM daily_totals
+                WHERE day >= ? AND day <= ?
+            '''
+            params = [self._day_key(start_date), self._day_key(end_date)]
+            
+            if project_ids is not None:
+                query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+                params.extend(project_ids)
+            
+            # Sum on ids, then look up the strings once per group
+            query = f'''
+                SELECT apps.name, domains.name, titles.title, seconds
+                FROM ({query} GROUP BY app_id, domain_id, title_id) AS grouped
+                JOIN apps ON apps.id = grouped.app_id
+                JOIN domains ON domains.id = grouped.domain_id
+                JOIN titles ON titles.id = grouped.title_id
+            '''
+            
+            with self._read_cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error retrieving activity totals: {e}")
+            return []
+
+    def search_titles(self, term, start_date=None, end_date=None, project_ids=None, limit=SEARCH_LIMIT):
+        """Find window titles, or titles under a domain, matching a search term.
+
+        Every word of term has to match the start of a word in the title or
+        the domain, in any order, so 'ABC-123' finds 'Fix ABC-123: login'.
+        Dates are inclusive and open-ended when None. Returns (app, domain,
+        title, seconds) totals like get_activity_totals, most time first.
+        Without FTS5 (or before the index is built) titles are matched with LIKE.
+        """
+        words = term.split()
+        if not words:
+            return []
+        
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='titles_fts'")
+                indexed = cursor.fetchone() is not None
+                
+                if indexed:
+                    # Each word is quoted so punctuation isn't read as query syntax
+                    match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+                    matching = '''
+                        (title_id IN (SELECT rowid FROM titles_fts WHERE titles_fts MATCH ?)
+                         OR domain_id IN (SELECT rowid FROM domains_fts WHERE domains_fts MATCH ?))
+                    '''
+                    params = [match, match]
+                else:
+                    pattern = "%" + term.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                    matching = '''
+                        (title_id IN (SELECT id FROM titles WHERE title LIKE ? ESCAPE '\\')
+                         OR domain_id IN (SELECT id FROM domains WHERE name LIKE ? ESCAPE '\\'))
+                    '''
+                    params = [pattern, pattern]
+                
+                query = f'''
+                    SELECT app_id, domain_id, title_id, SUM(seconds) AS seconds
+                    FROM daily_totals
+                    WHERE day >= ? AND day <= ? AND {matching}
+                '''
+                params = [self._day_key(start_date) if start_date else "0000-01-01",
+                          self._day_key(end_date) if end_date else "9999-12-31"] + params
+                
+                if project_ids is not None:
+                    query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+                    params.extend(project_ids)
+                
+                query = f'''
+                    SELECT apps.name, domains.name, titles.title, seconds
+                    FROM ({query} GROUP BY app_id, domain_id, title_id ORDER BY seconds DESC LIMIT ?) AS grouped
+                    JOIN apps ON apps.id = grouped.app_id
+                    JOIN domains ON domains.id = grouped.domain_id
+                    JOIN titles ON titles.id = grouped.title_id
+                    ORDER BY seconds DESC
+                '''
+                params.append(limit)
+                
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error searching activities: {e}")
+            return []
+
+    def save_idle_period(self, period):
+        """Save a {"project_id", "start_time", "end_time"} period the user was away"""
+        try:
+            with self._write_transaction() as cursor:
+                cursor.execute(
+                    "INSERT INTO idle_periods (project_id, start_ts, end_ts) VALUES (?, ?, ?)",
+                    (period.get("project_id", 1), int(period["start_time"].timestamp()),
+                     int(period["end_time"].timestamp())))
+            return True
+        except Exception as e:
+            print(f"Error saving idle period: {e}")
+            return False
+
+    def get_idle_seconds(self, start_date, end_date, project_ids=None):
+        """Total seconds spent idle between two dates (inclusive), by the day idling started"""
+        try:
+            query = "SELECT COALESCE(SUM(end_ts - start_ts), 0) FROM idle_periods WHERE start_ts >= ? AND start_ts < ?"
+            params = [self._day_bounds(self._date(start_date))[0], self._day_bounds(self._date(end_date))[1]]
+            
+            if project_ids is not None:
+                query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+                params.extend(project_ids)
+            
+            with self._read_cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Error retrieving idle time: {e}")
+            return 0
+
     def get_today_activities_hierarchical(self, project_id=None):
         """Get today's activities as a hierarchy: app level with website children grouped by domain"""
-        activities = self.get_today_activities(project_id)
-        
-        # First level: aggregate by application
-        app_totals = defaultdict(lambda: {
-            "name": "",
-            "total_seconds": 0,
-            "children": []
-        })
-        
-        # Second level: group by domain within each app
-        domain_totals = defaultdict(lambda: {
-            "name": "",
-            "domain_info": "",
-            "total_seconds": 0,
-            "children": []
-        })
-        
-        # Third level: group by specific window titles within each domain
-        website_totals = defaultdict(lambda: {
-            "name": "",
-            "domain_info": "",
-            "window_title": "",
-            "total_seconds": 0
-        })
-        
-        # Process all activities
-        for activity in activities:
-            app_name = activity['name']
-            domain_info = activity.get('domain_info', 'Other')
-            window_title = activity['window_title']
-            duration = activity['duration_seconds']
-            
-            # Add to application total
-            if not app_totals[app_name]["name"]:
-                app_totals[app_name]["name"] = app_name
-            app_totals[app_name]["total_seconds"] += duration
-            
-            # Add to domain total within this app
-            domain_key = f"{app_name}|{domain_info}"
-            if not domain_totals[domain_key]["name"]:
-                domain_totals[domain_key]["name"] = app_name
-                domain_totals[domain_key]["domain_info"] = domain_info
-            domain_totals[domain_key]["total_seconds"] += duration
-            
-            # Add to website total within this domain
-            website_key = f"{app_name}|{domain_info}|{window_title}"
-            if not website_totals[website_key]["name"]:
-                website_totals[website_key]["name"] = app_name
-                website_totals[website_key]["domain_info"] = domain_info
-                website_totals[website_key]["window_title"] = window_title
-            website_totals[website_key]["total_seconds"] += duration
-        
-        # Build the hierarchy from bottom up
-        # First, add websites to their domains
-        for website_key, website in website_totals.items():
-            domain_key = f"{website['name']}|{website['domain_info']}"
-            domain_totals[domain_key]["children"].append({
-                "window_title": website["window_title"],
-                "total_seconds": website["total_seconds"],
-                "duration_formatted": self._format_duration(datetime.timedelta(seconds=website["total_seconds"]))
-            })
-        
-        # Then, add domains to their apps
-        for domain_key, domain in domain_totals.items():
-            # Sort children by duration
-            domain["children"].sort(key=lambda x: x["total_seconds"], reverse=True)
-            
-            # Format the domain duration
-            domain["duration_formatted"] = self._format_duration(datetime.timedelta(seconds=domain["total_seconds"]))
-            
-            # Add to app
-            app_totals[domain["name"]]["children"].append({
-                "domain_info": domain["domain_info"],
-                "window_title": domain["domain_info"],  # Use domain as display title
-                "total_seconds": domain["total_seconds"],
-                "duration_formatted": domain["duration_formatted"],
-                "children": domain["children"]
-            })
+        return self.build_hierarchy(self.get_today_activity_totals(project_id))
+
+    def get_activities_hierarchical(self, start_date, end_date, project_ids=None):
+        """Get activities between two dates (inclusive) as an app > domain > title hierarchy"""
+        return self.build_hierarchy(self.get_activity_totals(start_date, end_date, project_ids))
+
+    def build_hierarchy(self, totals):
+        """Assemble (app, domain, window title, seconds) totals into the app > domain > title tree"""
+        apps = {}
         
-        # Format the app-level durations and sort children by domain
-        result = []
-        for app_name, app_data in app_totals.items():
-            # Format the duration
-            app_data["duration_formatted"] = self._format_duration(datetime.timedelta(seconds=app_data["total_seconds"]))
+        for app_name, domain_info, window_title, seconds in totals:
+            app = apps.get(app_name)
+            if app is None:
+                app = apps[app_name] = {"name": app_name, "total_seconds": 0, "children": {}}
             
-            # Sort domains by duration (most time first)
-            app_data["children"].sort(key=lambda x: x["total_seconds"], reverse=True)
+            domain = app["children"].get(domain_info)
+            if domain is None:
+                domain = app["children"][domain_info] = {
+                    "domain_info": domain_info,
+                    "window_title": domain_info,  # Use domain as display title
+                    "total_seconds": 0,
+                    "children": []
+                }
             
-            # Add to result
-            result.append(app_data)
+            domain["children"].append({
+                "window_title": window_title,
+                "total_seconds": seconds,
+                "duration_formatted": self._format_duration(datetime.timedelta(seconds=seconds))
+            })
+            domain["total_seconds"] += seconds
+            app["total_seconds"] += seconds
+        
+        # Format durations and sort every level by duration (most time first)
+        result = list(apps.values())
+        for app in result:
+            app["children"] = list(app["children"].values())
+            for domain in app["children"]:
+                domain["children"].sort(key=lambda x: x["total_seconds"], reverse=True)
+                domain["duration_formatted"] = self._format_duration(datetime.timedelta(seconds=domain["total_seconds"]))
+            app["children"].sort(key=lambda x: x["total_seconds"], reverse=True)
+            app["duration_formatted"] = self._format_duration(datetime.timedelta(seconds=app["total_seconds"]))
         
-        # Sort apps by duration (most time first)
         result.sort(key=lambda x: x["total_seconds"], reverse=True)
         
         return result
 
+    def get_statistics(self):
+        """Row counts, covered time span and storage sizes of the database and archive"""
+        stats = {"live_activities": 0, "archived_activities": 0, "archive_segments": 0,
+                 "first_activity": None, "last_activity": None, "projects": 0, "apps": 0, "titles": 0,
+                 "database_bytes": 0, "archive_bytes": 0}
+        
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT COUNT(*), MIN(start_ts), MAX(end_ts) FROM activities")
+                count, first_ts, last_ts = cursor.fetchone()
+                stats["live_activities"] = count
+                for table in ("projects", "apps", "titles"):
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    stats[table] = cursor.fetchone()[0]
+            
+            for name in self.archive.segments():
+                meta = self.archive.meta(name)
+                stats["archived_activities"] += meta["rows"]
+                stats["archive_segments"] += 1
+                if meta["rows"]:
+                    segment_first = self.archive.first_start_ts(name)
+                    segment_last = self.archive.last_end_ts(name)
+                    first_ts = segment_first if first_ts is None else min(first_ts, segment_first)
+                    last_ts = segment_last if last_ts is None else max(last_ts, segment_last)
+                
+                path = os.path.join(self.archive.directory, name)
+                stats["archive_bytes"] += sum(entry.stat().st_size for entry in os.scandir(path))
+            
+            if first_ts is not None:
+                stats["first_activity"] = datetime.datetime.fromtimestamp(first_ts)
+            if last_ts is not None:
+                stats["last_activity"] = datetime.datetime.fromtimestamp(last_ts)
+            stats["database_bytes"] = sum(os.path.getsize(self.db_filename + suffix) for suffix in ("", "-wal")
+                                          if os.path.exists(self.db_filename + suffix))
+        except Exception as e:
+            print(f"Error retrieving statistics: {e}")
+        
+        return stats
+
     def create_project(self, name, description=""):
         """Create a new project"""
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
             now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            cursor.execute('''
-                INSERT INTO projects (name, description, created_at, last_active)
-                VALUES (?, ?, ?, ?)
-            ''', (name, description, now, now))
-            
-            project_id = cursor.lastrowid
-            
-            conn.commit()
-            conn.close()
+            with self._write_transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO projects (name, description, created_at, last_active)
+                    VALUES (?, ?, ?, ?)
+                ''', (name, description, now, now))
+                
+                project_id = cursor.lastrowid
             
             return project_id
         except sqlite3.IntegrityError:
@@ -354,16 +1156,15 @@ class DatabaseManager:
         projects = []
         
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, name, description, created_at, last_active
-                FROM projects
-                ORDER BY last_active DESC
-            ''')
+            with self._read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, name, description, created_at, last_active
+                    FROM projects
+                    ORDER BY last_active DESC
+                ''')
+                rows = cursor.fetchall()
             
-            for row in cursor.fetchall():
+            for row in rows:
                 project = {
                     "id": row[0],
                     "name": row[1],
@@ -372,8 +1173,6 @@ class DatabaseManager:
                     "last_active": row[4]
                 }
                 projects.append(project)
-            
-            conn.close()
         except Exception as e:
             print(f"Error retrieving projects: {e}")
         
@@ -382,17 +1181,12 @@ class DatabaseManager:
     def update_project(self, project_id, name, description):
         """Update a project"""
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE projects
-                SET name = ?, description = ?
-                WHERE id = ?
-            ''', (name, description, project_id))
-            
-            conn.commit()
-            conn.close()
+            with self._write_transaction() as cursor:
+                cursor.execute('''
+                    UPDATE projects
+                    SET name = ?, description = ?
+                    WHERE id = ?
+                ''', (name, description, project_id))
             
             return True
         except Exception as e:
@@ -402,59 +1196,693 @@ class DatabaseManager:
     def delete_project(self, project_id, transfer_to_default=True):
         """Delete a project"""
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
+            with self._write_transaction() as cursor:
+                # Don't allow deleting the default project
+                cursor.execute("SELECT id FROM projects WHERE name='Default Project'")
+                default_id = cursor.fetchone()[0]
+                
+                if project_id == default_id:
+                    return False, "Cannot delete the default project"
+                
+                # Handle activities associated with this project
+                if transfer_to_default:
+                    # Transfer activities to default project
+                    cursor.execute('''
+                        UPDATE activities 
+                        SET project_id = ? 
+                        WHERE project_id = ?
+                    ''', (default_id, project_id))
+                    
+                    # Merge the project's daily totals into the default project's
+                    cursor.execute('''
+                        INSERT INTO daily_totals (day, project_id, app_id, domain_id, title_id, seconds)
+                        SELECT day, ?, app_id, domain_id, title_id, seconds
+                        FROM daily_totals
+                        WHERE project_id = ?
+                        ON CONFLICT (day, project_id, app_id, domain_id, title_id)
+                        DO UPDATE SET seconds = seconds + excluded.seconds
+                    ''', (default_id, project_id))
+                else:
+                    # Delete activities associated with this project
+                    cursor.execute("DELETE FROM activities WHERE project_id = ?", (project_id,))
+                
+                # Rows still waiting for the lookup table migration follow the same choice
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activities_legacy'")
+                if cursor.fetchone():
+                    if transfer_to_default:
+                        cursor.execute("UPDATE activities_legacy SET project_id = ? WHERE project_id = ?",
+                                       (default_id, project_id))
+                    else:
+                        cursor.execute("DELETE FROM activities_legacy WHERE project_id = ?", (project_id,))
+                
+                cursor.execute("DELETE FROM daily_totals WHERE project_id = ?", (project_id,))
+                self._recent_rows = {}
+                
+                # Delete the project
+                cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
             
-            # Don't allow deleting the default project
-            cursor.execute("SELECT id FROM projects WHERE name='Default Project'")
-            default_id = cursor.fetchone()[0]
+            # Archived months follow the same choice
+            self.archive.reassign_project(project_id, default_id if transfer_to_default else None)
+            return True, None
+        except Exception as e:
+            print(f"Error deleting project: {e}")
+            return False, str(e)
+
+    def archive_closed_months(self, before=None):
+        """Move activities of months before `before` (default: this month) to the archive.
+
+        Each month becomes one archive segment, written completely before its
+        rows are deleted from the database; segments left over from an
+        interrupted run are cleaned up first. daily_totals is kept, so totals
+        are unaffected. Returns the number of rows archived, or None if
+        archiving is unavailable or failed.
+        """
+        if not ActivityArchive.available():
+            return None
+        
+        try:
+            # Rows still waiting for a migration can't be archived yet
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_activities_project_start'")
+                indexed = cursor.fetchone() is not None
+                cursor.execute("SELECT position FROM migration_progress WHERE name = 'daily_totals'")
+                row = cursor.fetchone()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activities_legacy'")
+                legacy = cursor.fetchone() is not None
+            if not indexed or (row and row[0] > 0) or legacy:
+                return None
             
-            if project_id == default_id:
-                conn.close()
-                return False, "Cannot delete the default project"
+            before = before or datetime.date.today().replace(day=1)
+            cutoff = self._day_bounds(before)[0]
             
-            # Handle activities associated with this project
-            if transfer_to_default:
-                # Transfer activities to default project
-                cursor.execute('''
-                    UPDATE activities 
-                    SET project_id = ? 
-                    WHERE project_id = ?
-                ''', (default_id, project_id))
+            # Deleting is idempotent, so redo it for every segment in case a
+            # previous run stopped between writing a segment and deleting
+            with self._write_transaction() as cursor:
+                for name in self.archive.segments():
+                    meta = self.archive.meta(name)
+                    cursor.execute(
+                        "DELETE FROM activities WHERE id >= ? AND id <= ? AND start_ts >= ? AND start_ts < ?",
+                        (meta["min_id"], meta["max_id"], meta["start_ts"], meta["end_ts"]))
+            
+            archived = 0
+            while not self._closed:
+                with self._read_cursor() as cursor:
+                    cursor.execute("SELECT MIN(start_ts) FROM activities WHERE start_ts < ?", (cutoff,))
+                    first_ts = cursor.fetchone()[0]
+                    if first_ts is None:
+                        break
+                    
+                    month = datetime.date.fromtimestamp(first_ts).replace(day=1)
+                    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+                    month_start, month_end = self._day_bounds(month)[0], self._day_bounds(next_month)[0]
+                    
+                    cursor.execute('''
+                        SELECT activities.id, start_ts, end_ts, COALESCE(duration, end_ts - start_ts),
+                               COALESCE(project_id, 0), COALESCE(type, ''), apps.name, domains.name, titles.title
+                        FROM activities
+                        JOIN apps ON apps.id = activities.app_id
+                        JOIN domains ON domains.id = activities.domain_id
+                        JOIN titles ON titles.id = activities.title_id
+                        WHERE start_ts >= ? AND start_ts < ?
+                        ORDER BY start_ts
+                    ''', (month_start, month_end))
+                    rows = cursor.fetchall()
+                
+                # Segment-local string tables, indexed by the *_id columns
+                columns = {"id": [], "start_ts": [], "end_ts": [], "duration": [], "project_id": []}
+                strings = {}
+                for column, table in STRING_TABLES.items():
+                    columns[column] = []
+                    strings[table] = {}
+                
+                for row_id, start_ts, end_ts, duration, project_id, *texts in rows:
+                    columns["id"].append(row_id)
+                    columns["start_ts"].append(start_ts)
+                    columns["end_ts"].append(end_ts)
+                    columns["duration"].append(duration)
+                    columns["project_id"].append(project_id)
+                    for (column, table), text in zip(STRING_TABLES.items(), texts):
+                        index = strings[table].setdefault(text, len(strings[table]))
+                        columns[column].append(index)
+                
+                min_id, max_id = min(columns["id"]), max(columns["id"])
+                self.archive.write_segment(month.strftime("%Y-%m"), month_start, month_end, columns,
+                                           {table: list(index) for table, index in strings.items()}, min_id, max_id)
+                
+                with self._write_transaction() as cursor:
+                    cursor.execute(
+                        "DELETE FROM activities WHERE id >= ? AND id <= ? AND start_ts >= ? AND start_ts < ?",
+                        (min_id, max_id, month_start, month_end))
+                    self._recent_rows = {}
+                self._reclaim_space(convert=False)
+                archived += len(rows)
+            
+            # The live database keeps only open months, so shrink the file too
+            if archived:
+                self._reclaim_space()
+            return archived
+        except Exception as e:
+            print(f"Error archiving activities: {e}")
+            return None
+
+    def _reclaim_space(self, convert=True):
+        """Give the pages of deleted rows back to the file system.
+
+        Databases created before incremental auto-vacuum are converted with
+        one full VACUUM (skipped unless convert is set); after that only the
+        free pages are released, which is quick.
+        """
+        with self._write_lock:
+            conn = self._get_write_connection()
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                if not convert:
+                    return
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
             else:
-                # Delete activities associated with this project
-                cursor.execute("DELETE FROM activities WHERE project_id = ?", (project_id,))
+                # executescript steps the pragma until every free page is released
+                conn.executescript("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact_activities(self, merge_gap=None, batch_size=MIGRATION_BATCH_SIZE):
+        """Merge existing rows of the same window that resumed within merge_gap seconds.
+
+        Applies the heartbeat merge policy to history saved before it existed
+        (or with a smaller gap). Totals are unchanged; only the number of rows
+        shrinks. Changes are written in batches so the app can keep saving
+        meanwhile. Returns (rows before, rows after).
+        """
+        merge_gap = self.merge_gap if merge_gap is None else merge_gap
+        if merge_gap is None:
+            return None
+        
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM activities")
+                rows_before = cursor.fetchone()[0]
             
-            # Delete the project
-            cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            updates = []  # (end_time, end_ts, duration, id) of rows that absorb others
+            deletes = []  # (id,) of rows merged away
             
-            conn.commit()
-            conn.close()
+            def flush():
+                with self._write_transaction() as write_cursor:
+                    write_cursor.executemany(
+                        "UPDATE activities SET end_time = ?, end_ts = ?, duration = ? WHERE id = ?", updates)
+                    write_cursor.executemany("DELETE FROM activities WHERE id = ?", deletes)
+                    self._recent_rows = {}  # Saves must not extend rows being rewritten
+                updates.clear()
+                deletes.clear()
             
-            return True, None
+            with self._read_cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, project_id, app_id, title_id, domain_id, start_ts, end_time, end_ts,
+                           COALESCE(duration, end_ts - start_ts)
+                    FROM activities
+                    WHERE start_ts IS NOT NULL
+                    ORDER BY project_id, app_id, title_id, domain_id, start_ts
+                ''')
+                
+                current = None  # [key, day, id, end_time, end_ts, duration, merged]
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    
+                    for row_id, project_id, app_id, title_id, domain_id, start_ts, end_time, end_ts, duration in rows:
+                        key = (project_id, app_id, title_id, domain_id)
+                        day = datetime.date.fromtimestamp(start_ts)
+                        
+                        if (current is not None and current[0] == key and current[1] == day
+                                and 0 <= start_ts - current[4] <= merge_gap):
+                            current[3], current[4] = end_time, end_ts
+                            current[5] += duration
+                            current[6] = True
+                            deletes.append((row_id,))
+                            continue
+                        
+                        if current is not None and current[6]:
+                            updates.append((current[3], current[4], current[5], current[2]))
+                            if len(deletes) >= batch_size:
+                                flush()  # Only between groups, so each batch is self-consistent
+                        current = [key, day, row_id, end_time, end_ts, duration, False]
+                
+                if current is not None and current[6]:
+                    updates.append((current[3], current[4], current[5], current[2]))
+            flush()
+            self._reclaim_space(convert=False)
+            
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM activities")
+                return rows_before, cursor.fetchone()[0]
         except Exception as e:
-            print(f"Error deleting project: {e}")
-            return False, str(e)
+            print(f"Error compacting activities: {e}")
+            return None
 
-    def update_project_last_active(self, project_id):
-        """Update the last active timestamp of a project"""
+    def import_activities(self, records, batch_size=IMPORT_BATCH_SIZE):
+        """Bulk load activities, e.g. history from another tracker or an export of another machine.
+
+        records are dicts keyed like activity_export.EXPORT_COLUMNS; times are
+        datetimes, ISO strings in local time or epoch seconds. They are staged
+        with executemany, then deduplicated and inserted set-based by
+        _finish_import(). Returns a dict of counts and timings, or None on error.
+        """
+        started = time.perf_counter()
+        stats = {"read": 0, "invalid": 0, "duplicates": 0, "imported": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        
         try:
-            conn = sqlite3.connect(self.db_filename)
-            cursor = conn.cursor()
+            self._start_import()
+            
+            # Stage the records as they are read, a batch per transaction
+            batch = []
+            for record in records:
+                stats["read"] += 1
+                row = self._import_row(record)
+                if row is None:
+                    stats["invalid"] += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._stage_import_rows(batch)
+                    batch = []
+            self._stage_import_rows(batch)
+            
+            self._finish_import(stats, batch_size)
+            
+            stats["seconds"] = time.perf_counter() - started
+            stats["rows_per_second"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+            return stats
+        except Exception as e:
+            print(f"Error importing activities: {e}")
+            return None
+        finally:
+            self._end_import()
+    
+    def _start_import(self):
+        """Create the scratch tables of an import or merge; _end_import() removes them.
+
+        They are temporary tables of the writer connection, kept in a
+        temporary file rather than in memory for the length of the import.
+        """
+        self._end_import()  # In case anything was left behind
+        
+        # Stored rows are only matched once they are in the current layout,
+        # so finish upgrading an older database first
+        with self._read_cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='activities_legacy'")
+            legacy = cursor.fetchone() is not None
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_activities_project_start'")
+            converted = cursor.fetchone() is not None
+        if (legacy and not self._migrate_lookup_tables()) or (not converted and not self._migrate_epoch_timestamps()):
+            raise RuntimeError("Could not finish upgrading the database")
+        
+        with self._write_lock:
+            conn = self._get_write_connection()
+            conn.execute("PRAGMA temp_store=FILE")
+            conn.execute(f"PRAGMA temp.cache_size=-{CACHE_SIZE_KIB * 4}")
+        with self._write_transaction() as cursor:
+            cursor.execute('''
+                CREATE TEMP TABLE import_staging (
+                    project TEXT, type TEXT, app TEXT, domain TEXT, title TEXT,
+                    start_ts INTEGER, end_ts INTEGER, duration INTEGER
+                )
+            ''')
+            cursor.execute('''
+                CREATE TEMP TABLE import_existing (
+                    app_id INTEGER, domain_id INTEGER, title_id INTEGER, start_ts INTEGER, end_ts INTEGER
+                )
+            ''')
+
+    def _finish_import(self, stats, batch_size=IMPORT_BATCH_SIZE):
+        """Deduplicate the staged rows and insert them, counting into stats.
+
+        A staged row is skipped if an earlier staged row, an existing activity
+        or an archived one of the same window (app, domain and title) overlaps
+        it, so importing or merging the same data twice adds nothing. Overlaps
+        between different windows are normal, as merged rows span the windows
+        between. Projects are matched by name and created if missing; rows
+        without one go to the oldest project. Large imports drop the activity
+        indexes and rebuild them at the end; _end_import() rebuilds them if
+        the import fails in between.
+        """
+        with self._write_transaction() as cursor:
+            cursor.execute("SELECT COUNT(*), MIN(start_ts), MAX(end_ts) FROM import_staging")
+            staged, first_ts, last_ts = cursor.fetchone()
             
+            # Projects by name and the strings the rows refer to, so the
+            # deduplication below compares ids rather than text
             now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            cursor.execute('''
+                INSERT OR IGNORE INTO projects (name, description, created_at, last_active)
+                SELECT DISTINCT project, 'Imported', ?, ? FROM import_staging WHERE project IS NOT NULL
+            ''', (now, now))
+            cursor.execute("INSERT OR IGNORE INTO apps (name) SELECT DISTINCT app FROM import_staging")
+            cursor.execute("INSERT OR IGNORE INTO domains (name) SELECT DISTINCT domain FROM import_staging")
+            cursor.execute("INSERT OR IGNORE INTO titles (title) SELECT DISTINCT title FROM import_staging")
+            
+            cursor.execute('''
+                CREATE TEMP TABLE import_rows AS
+                SELECT COALESCE(projects.id, (SELECT MIN(id) FROM projects)) AS project_id,
+                       import_staging.type AS type, apps.id AS app_id, domains.id AS domain_id,
+                       titles.id AS title_id, start_ts, end_ts, import_staging.duration AS duration
+                FROM import_staging
+                LEFT JOIN projects ON projects.name = import_staging.project
+                JOIN apps ON apps.name = import_staging.app
+                JOIN domains ON domains.name = import_staging.domain
+                JOIN titles ON titles.title = import_staging.title
+            ''')
+            cursor.execute("DROP TABLE import_staging")
             
+            # Stored activities the import could overlap, live ones first.
+            # Merged rows stay within one day, so a day before is enough.
             cursor.execute('''
-                UPDATE projects
-                SET last_active = ?
-                WHERE id = ?
-            ''', (now, project_id))
+                INSERT INTO import_existing (app_id, domain_id, title_id, start_ts, end_ts)
+                SELECT app_id, domain_id, title_id, start_ts, end_ts
+                FROM activities
+                WHERE start_ts >= ? AND start_ts < ?
+            ''', ((first_ts or 0) - 86400, last_ts or 0))
+        
+        if staged:
+            for columns, strings in self.archive.scan(first_ts - 86400, last_ts):
+                with self._write_transaction() as cursor:
+                    # Segment string tables to ids here; -1 for strings this
+                    # database doesn't have, which no staged row can match
+                    ids = {}
+                    for column, table, name_column in (("app_id", "apps", "name"), ("domain_id", "domains", "name"),
+                                                       ("title_id", "titles", "title")):
+                        ids[column] = []
+                        for value in strings[STRING_TABLES[column]]:
+                            cursor.execute(f"SELECT id FROM {table} WHERE {name_column} = ?", (value,))
+                            row = cursor.fetchone()
+                            ids[column].append(row[0] if row else -1)
+                    
+                    cursor.executemany(
+                        "INSERT INTO import_existing (app_id, domain_id, title_id, start_ts, end_ts) VALUES (?, ?, ?, ?, ?)",
+                        zip([ids["app_id"][i] for i in columns["app_id"].tolist()],
+                            [ids["domain_id"][i] for i in columns["domain_id"].tolist()],
+                            [ids["title_id"][i] for i in columns["title_id"].tolist()],
+                            columns["start_ts"].tolist(), columns["end_ts"].tolist()))
+        
+        with self._write_transaction() as cursor:
+            cursor.execute("CREATE INDEX import_rows_window ON import_rows (app_id, domain_id, title_id, start_ts, end_ts)")
+            cursor.execute("CREATE INDEX import_existing_window ON import_existing (app_id, domain_id, title_id, start_ts, end_ts)")
+            
+            # Overlapping rows of a window within the import: keep the first
+            cursor.execute('''
+                DELETE FROM import_rows WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, start_ts, MAX(end_ts) OVER (
+                            PARTITION BY app_id, domain_id, title_id
+                            ORDER BY start_ts, rowid
+                            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                        ) AS previous_end
+                        FROM import_rows
+                    )
+                    WHERE start_ts < previous_end
+                )
+            ''')
+            
+            # Rows overlapping a stored activity of the same window: one
+            # starting inside the row, or the last one starting before it
+            cursor.execute('''
+                DELETE FROM import_rows
+                WHERE EXISTS (
+                    SELECT 1 FROM import_existing AS stored
+                    WHERE stored.app_id = import_rows.app_id AND stored.domain_id = import_rows.domain_id
+                      AND stored.title_id = import_rows.title_id
+                      AND stored.start_ts >= import_rows.start_ts AND stored.start_ts < import_rows.end_ts
+                )
+                OR (
+                    SELECT stored.end_ts FROM import_existing AS stored
+                    WHERE stored.app_id = import_rows.app_id AND stored.domain_id = import_rows.domain_id
+                      AND stored.title_id = import_rows.title_id AND stored.start_ts < import_rows.start_ts
+                    ORDER BY stored.start_ts DESC LIMIT 1
+                ) > import_rows.start_ts
+            ''')
+            cursor.execute("CREATE INDEX import_rows_start ON import_rows (start_ts)")
             
-            conn.commit()
-            conn.close()
+            cursor.execute("SELECT COUNT(*), MAX(start_ts) FROM import_rows")
+            remaining, last_ts = cursor.fetchone()
+            stats["duplicates"] = staged - remaining
+            
+            # Only indexes that exist are rebuilt; missing ones mean the
+            # timestamp migration still has to run
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_activities_project_start'")
+            if remaining >= IMPORT_DEFER_INDEX_ROWS and cursor.fetchone():
+                cursor.execute("DROP INDEX idx_activities_project_start")
+                cursor.execute("DROP INDEX IF EXISTS idx_activities_start")
+                self._import_dropped_indexes = True
+        
+        # Insert in start order, each batch together with its daily totals.
+        # Rows starting in the same second go into the same batch.
+        lower = (first_ts or 0) - 1
+        while remaining and lower < last_ts:
+            with self._write_transaction() as cursor:
+                cursor.execute("SELECT start_ts FROM import_rows WHERE start_ts > ? ORDER BY start_ts LIMIT 1 OFFSET ?",
+                               (lower, batch_size - 1))
+                row = cursor.fetchone()
+                upper = row[0] if row else last_ts
+                cursor.execute('''
+                    INSERT INTO activities (project_id, type, app_id, domain_id, title_id, start_ts, end_ts, duration)
+                    SELECT project_id, type, app_id, domain_id, title_id, start_ts, end_ts, duration
+                    FROM import_rows
+                    WHERE start_ts > ? AND start_ts <= ?
+                    ORDER BY start_ts
+                ''', (lower, upper))
+                stats["imported"] += cursor.rowcount
+                cursor.execute('''
+                    INSERT INTO daily_totals (day, project_id, app_id, domain_id, title_id, seconds)
+                    SELECT date(start_ts, 'unixepoch', 'localtime'), project_id, app_id, domain_id, title_id,
+                           SUM(duration)
+                    FROM import_rows
+                    WHERE start_ts > ? AND start_ts <= ?
+                    GROUP BY 1, 2, 3, 4, 5
+                    ON CONFLICT (day, project_id, app_id, domain_id, title_id)
+                    DO UPDATE SET seconds = seconds + excluded.seconds
+                ''', (lower, upper))
+            lower = upper
+        
+    
+    def _end_import(self):
+        """Drop the scratch tables of an import or merge and rebuild indexes it dropped.
+
+        Runs whether the import succeeded or not, so a failed import leaves
+        neither scratch tables nor missing indexes behind.
+        """
+        try:
+            with self._write_transaction() as cursor:
+                if self._import_dropped_indexes:
+                    self._create_activity_indexes(cursor)
+                for table in ("import_staging", "import_rows", "import_existing"):
+                    cursor.execute(f"DROP TABLE IF EXISTS temp.{table}")
+            self._import_dropped_indexes = False
+            with self._write_lock:
+                self._get_write_connection().execute("PRAGMA temp_store=MEMORY")
+        except Exception as e:
+            print(f"Error cleaning up after import: {e}")
+    
+    def _import_row(self, record):
+        """Convert an import record into an import_staging row, or None if it is unusable"""
+        try:
+            start_ts = self._import_timestamp(record["start_time"])
+            end_ts = self._import_timestamp(record["end_time"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if end_ts <= start_ts:
+            return None
+        
+        duration = record.get("duration_seconds")
+        try:
+            duration = min(int(float(duration)), end_ts - start_ts) if duration not in (None, "") else None
+        except ValueError:
+            duration = None
+        
+        return (
+            record.get("project") or None,
+            record.get("type") or "Application",
+            record.get("name") or "",
+            record.get("domain_info") or "Other",
+            record.get("window_title") or "",
+            start_ts, end_ts,
+            end_ts - start_ts if duration is None else duration
+        )
+    
+    def _import_timestamp(self, value):
+        """Epoch seconds for a datetime, an ISO string in local time or a number"""
+        if isinstance(value, datetime.datetime):
+            return int(value.timestamp())
+        if isinstance(value, (int, float)):
+            return int(value)
+        if "-" in value[1:]:
+            return int(datetime.datetime.fromisoformat(value).timestamp())
+        return int(float(value))
+    
+    def _stage_import_rows(self, rows):
+        if not rows:
+            return
+        with self._write_transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO import_staging (project, type, app, domain, title, start_ts, end_ts, duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    def merge_database(self, source_path, batch_size=IMPORT_BATCH_SIZE):
+        """Merge the activities of another timetracker database, e.g. from a laptop, into this one.
+
+        The source is ATTACHed and its rows are staged with one INSERT ...
+        SELECT that resolves its projects and lookup ids to names; months it
+        has archived are read from its archive directory next to it. The
+        staged rows then go through the same deduplication as imports
+        (_finish_import), so projects are matched by name and merging the same
+        source again, e.g. nightly, only adds what is new. Older source
+        schemas (text columns, text times) are read as well, including rows
+        a half-upgraded source still keeps in activities_legacy. Returns a dict of
+        counts and timings, or None on error.
+        """
+        started = time.perf_counter()
+        stats = {"read": 0, "invalid": 0, "duplicates": 0, "imported": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        
+        try:
+            if not os.path.exists(source_path):
+                raise ValueError(f"No database at {source_path}")
+            if os.path.samefile(source_path, self.db_filename):
+                raise ValueError("Cannot merge a database into itself")
+            
+            self._start_import()
+            
+            with self._write_lock:
+                conn = self._get_write_connection()
+                conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+                try:
+                    with self._write_transaction() as cursor:
+                        cursor.execute("SELECT name FROM source.sqlite_master WHERE type='table' AND name='projects'")
+                        has_projects = cursor.fetchone() is not None
+                        project_names = {}
+                        if has_projects:
+                            cursor.execute("SELECT id, name FROM source.projects")
+                            project_names = dict(cursor.fetchall())
+                        
+                        # A source that was never opened after upgrading still has
+                        # part of its rows in activities_legacy
+                        cursor.execute("SELECT name FROM source.sqlite_master WHERE type='table' "
+                                       "AND name IN ('activities', 'activities_legacy')")
+                        for (table,) in cursor.fetchall():
+                            query = self._merge_source_query(cursor, has_projects, table)
+                            cursor.execute(f"INSERT INTO import_staging {query}")
+                            staged = cursor.rowcount
+                            cursor.execute(f"SELECT COUNT(*) FROM source.{table}")
+                            stats["read"] += staged
+                            stats["invalid"] += cursor.fetchone()[0] - staged  # Unconverted or empty rows
+                finally:
+                    conn.execute("DETACH DATABASE source")
+            
+            # Closed months the source moved to its archive
+            source_archive = ActivityArchive(os.path.splitext(source_path)[0] + "_archive")
+            for columns, strings in source_archive.scan():
+                for offset in range(0, len(columns["id"]), batch_size):
+                    chunk = {column: columns[column][offset:offset + batch_size].tolist()
+                             for column in ("project_id", "type_id", "app_id", "domain_id", "title_id",
+                                            "start_ts", "end_ts", "duration")}
+                    self._stage_import_rows(list(zip(
+                        [project_names.get(project_id) for project_id in chunk["project_id"]],
+                        [strings["types"][i] for i in chunk["type_id"]],
+                        [strings["apps"][i] for i in chunk["app_id"]],
+                        [strings["domains"][i] for i in chunk["domain_id"]],
+                        [strings["titles"][i] for i in chunk["title_id"]],
+                        chunk["start_ts"], chunk["end_ts"], chunk["duration"]
+                    )))
+                    stats["read"] += len(chunk["start_ts"])
+            
+            self._finish_import(stats, batch_size)
+            
+            stats["seconds"] = time.perf_counter() - started
+            stats["rows_per_second"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+            return stats
+        except Exception as e:
+            print(f"Error merging {source_path}: {e}")
+            return None
+        finally:
+            self._end_import()
+    
+    def _merge_source_query(self, cursor, has_projects, table="activities"):
+        """SELECT of import_staging rows from an activity table of the attached source, for any schema version"""
+        cursor.execute(f"PRAGMA source.table_info({table})")
+        columns = [info[1] for info in cursor.fetchall()]
+        
+        joins = []
+        if "title_id" in columns:
+            app, domain, title = "apps.name", "domains.name", "titles.title"
+            joins += ["JOIN source.apps AS apps ON apps.id = activities.app_id",
+                      "JOIN source.domains AS domains ON domains.id = activities.domain_id",
+                      "JOIN source.titles AS titles ON titles.id = activities.title_id"]
+        else:
+            app, title = "COALESCE(activities.name, '')", "COALESCE(activities.window_title, '')"
+            domain = ("COALESCE(NULLIF(activities.domain_info, ''), 'Other')" if "domain_info" in columns
+                      else "'Other'")
+        
+        project = "NULL"
+        if has_projects and "project_id" in columns:
+            project = "projects.name"
+            joins.append("LEFT JOIN source.projects AS projects ON projects.id = activities.project_id")
+        
+        # The 'utc' modifier treats the stored text as local time
+        start = "CAST(strftime('%s', activities.start_time, 'utc') AS INTEGER)"
+        end = "CAST(strftime('%s', activities.end_time, 'utc') AS INTEGER)"
+        if "start_ts" in columns:
+            start = f"COALESCE(activities.start_ts, {start})"
+            end = f"COALESCE(activities.end_ts, {end})"
+        duration = f"COALESCE(activities.duration, {end} - {start})" if "duration" in columns else f"{end} - {start}"
+        
+        return f'''
+            SELECT * FROM (
+                SELECT {project} AS project, COALESCE(activities.type, 'Application') AS type,
+                       {app} AS app, {domain} AS domain, {title} AS title,
+                       {start} AS start_ts, {end} AS end_ts, {duration} AS duration
+                FROM source.{table} AS activities
+                {" ".join(joins)}
+            )
+            WHERE end_ts > start_ts
+        '''
+    
+    def update_project_last_active(self, project_id):
+        """Update the last active timestamp of a project"""
+        try:
+            with self._write_transaction() as cursor:
+                self._touch_project(cursor, project_id)
         except Exception as e:
             print(f"Error updating project last active: {e}")
     
+    def _touch_project(self, cursor, project_id):
+        """Set a project's last_active to now inside an open transaction"""
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        cursor.execute('''
+            UPDATE projects
+            SET last_active = ?
+            WHERE id = ?
+        ''', (now, project_id))
+    
+    def _day_key(self, day):
+        """Return the daily_totals key ('YYYY-MM-DD') for a date or date string"""
+        if isinstance(day, str):
+            return day
+        return day.isoformat()
+    
+    def _date(self, day):
+        """Return a date for a date or 'YYYY-MM-DD' string"""
+        if isinstance(day, str):
+            return datetime.date.fromisoformat(day)
+        return day
+    
+    def _day_bounds(self, day):
+        """Return the [start, end) epoch range covering a local calendar day"""
+        start = datetime.datetime.combine(day, datetime.time.min)
+        end = start + datetime.timedelta(days=1)
+        return int(start.timestamp()), int(end.timestamp())
+    
+    def _short_title(self, window_title):
+        """Shortened window title for compact display"""
+        return window_title[:27] + "..." if len(window_title) > 30 else window_title
+    
     def _format_duration(self, duration):
         """Format a datetime.timedelta into a user-friendly string"""
         total_seconds = int(duration.total_seconds())
@@ -0,0 +1,143 @@
+import datetime
+
+class DayAggregate:
+    """Running app > domain > title totals for one project over the current day.
+
+    The totals are loaded from the database once and then kept up to date from
+    activity_changed events, so refreshing the view never re-reads the day's
+    activities. They are reloaded when the project or the day changes, or
+    after invalidate() when activities were moved or deleted in the database.
+    fetch() and apply() split a load so the query can run off the GUI thread.
+    """
+
+    def __init__(self, db_manager, writer=None):
+        self.db_manager = db_manager
+        self.writer = writer  # Flushed before loading so queued activities are counted once
+
+        self.project_id = None
+        self.day = None
+        self.loaded = False
+        self._titles = {}         # (app, domain) -> {window title: seconds}
+        self._domain_totals = {}  # (app, domain) -> seconds
+        self._summary = None
+
+    def invalidate(self):
+        """Drop the in-memory totals; they are reloaded on next use"""
+        self.loaded = False
+        self._titles = {}
+        self._domain_totals = {}
+        self._summary = None
+
+    def load(self, project_id):
+        """Load today's totals for a project from the database"""
+        self.apply(self.fetch(project_id))
+
+    def fetch(self, project_id):
+        """Read today's totals for a project without touching the loaded ones.
+
+        Safe to call off the GUI thread; pass the result to apply() there.
+        """
+        if self.writer:
+            self.writer.flush(timeout=5.0)
+
+        day = datetime.date.today()
+        return project_id, day, self.db_manager.get_today_activity_totals(project_id)
+
+    def apply(self, loaded):
+        """Replace the totals with ones returned by fetch()"""
+        project_id, day, totals = loaded
+        self.invalidate()
+        self.project_id = project_id
+        self.day = day
+        for app_name, domain_info, window_title, seconds in totals:
+            self._add_seconds(app_name, domain_info, window_title, seconds)
+        self.loaded = True
+
+    def add(self, activity):
+        """Add a finished activity to the running totals"""
+        if not self.is_current(activity.get("project_id")):
+            return  # Loaded fresh from the database when next needed
+
+        # Activities count towards the day they started on, as in the database
+        if activity["start_time"].date() != self.day:
+            return
+
+        seconds = int(activity["end_time"].timestamp()) - int(activity["start_time"].timestamp())
+        self._add_seconds(activity["name"], activity.get("domain_info") or "Other", activity["window_title"], seconds)
+        self._summary = None
+
+    def summary(self, project_id):
+        """Return today's app > domain tree for a project, without the window titles"""
+        self._ensure_current(project_id)
+
+        if self._summary is None:
+            apps = {}
+            for (app_name, domain_info), seconds in self._domain_totals.items():
+                app = apps.get(app_name)
+                if app is None:
+                    app = apps[app_name] = {"name": app_name, "total_seconds": 0, "children": []}
+
+                app["children"].append({
+                    "domain_info": domain_info,
+                    "window_title": domain_info,  # Use domain as display title
+                    "total_seconds": seconds,
+                    "duration_formatted": self._format_seconds(seconds),
+                    "title_count": len(self._titles[(app_name, domain_info)])
+                })
+                app["total_seconds"] += seconds
+
+            # Sort every level by duration (most time first)
+            result = list(apps.values())
+            for app in result:
+                app["children"].sort(key=lambda x: x["total_seconds"], reverse=True)
+                app["duration_formatted"] = self._format_seconds(app["total_seconds"])
+            result.sort(key=lambda x: x["total_seconds"], reverse=True)
+
+            self._summary = result
+
+        return self._summary
+
+    def titles(self, project_id, app_name, domain_info):
+        """Return the window titles under one app and domain, most time first"""
+        self._ensure_current(project_id)
+
+        titles = [
+            {
+                "window_title": window_title,
+                "total_seconds": seconds,
+                "duration_formatted": self._format_seconds(seconds)
+            }
+            for window_title, seconds in self._titles.get((app_name, domain_info), {}).items()
+        ]
+        titles.sort(key=lambda x: x["total_seconds"], reverse=True)
+        return titles
+
+    def hierarchy(self, project_id):
+        """Return today's full app > domain > title tree for a project"""
+        self._ensure_current(project_id)
+
+        totals = [
+            (app_name, domain_info, window_title, seconds)
+            for (app_name, domain_info), titles in self._titles.items()
+            for window_title, seconds in titles.items()
+        ]
+        return self.db_manager.build_hierarchy(totals)
+
+    def _add_seconds(self, app_name, domain_info, window_title, seconds):
+        key = (app_name, domain_info)
+        titles = self._titles.get(key)
+        if titles is None:
+            titles = self._titles[key] = {}
+        titles[window_title] = titles.get(window_title, 0) + seconds
+        self._domain_totals[key] = self._domain_totals.get(key, 0) + seconds
+
+    def _format_seconds(self, seconds):
+        return self.db_manager._format_duration(datetime.timedelta(seconds=seconds))
+
+    def _ensure_current(self, project_id):
+        if not self.is_current(project_id):
+            self.load(project_id)
+
+    def is_current(self, project_id):
+        """Whether the loaded totals are for this project and for today (midnight rollover)"""
+        return self.loaded and self.project_id == project_id and self.day == datetime.date.today()
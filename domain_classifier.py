@@ -0,0 +1,124 @@
+import os
+import json
+from collections import deque
+from functools import lru_cache
+
+# Optional user rules, looked up next to the database
+SITE_RULES_FILENAME = "site_rules.json"
+
+# Common sites and their identifiers, checked in order (first site wins)
+DEFAULT_SITE_RULES = [
+    ('Reddit', [' : r/', 'r/']),
+    ('YouTube', ['- YouTube', 'YouTube']),
+    ('LinkedIn', ['| LinkedIn', 'LinkedIn']),
+    ('Twitter', ['/ X', '| X', 'Twitter']),
+    ('Facebook', ['| Facebook', 'Facebook']),
+    ('GitHub', ['GitHub']),
+    ('Google', ['Google']),
+    ('Gmail', ['Gmail']),
+    ('Amazon', ['Amazon']),
+    ('Stack Overflow', ['Stack Overflow']),
+    ('Medium', ['Medium']),
+    ('Wikipedia', ['Wikipedia']),
+    ('Netflix', ['Netflix']),
+    ('Twitch', ['Twitch'])
+]
+
+class DomainClassifier:
+    """Map window titles to site names using a rule table compiled once.
+
+    All patterns are compiled into a single Aho-Corasick automaton, so a
+    title is classified in one pass over its characters no matter how many
+    rules there are. As with a linear scan, the first rule (in table order)
+    with any pattern contained in the title wins; titles matching nothing
+    are "Other". Results are memoized per title.
+    """
+
+    def __init__(self, rules=None, cache_size=4096):
+        rules = DEFAULT_SITE_RULES if rules is None else rules
+        self.sites = [site for site, _ in rules]
+        self._compile(rules)
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _compile(self, rules):
+        # goto[state] maps a character to the next state; best[state] is the
+        # lowest rule index whose pattern ends here, including via fail links
+        goto = [{}]
+        fail = [0]
+        best = [None]
+
+        for priority, (_, patterns) in enumerate(rules):
+            for pattern in patterns:
+                if not pattern:
+                    continue
+                state = 0
+                for char in pattern:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        goto.append({})
+                        fail.append(0)
+                        best.append(None)
+                        next_state = goto[state][char] = len(goto) - 1
+                    state = next_state
+                if best[state] is None or priority < best[state]:
+                    best[state] = priority
+
+        # Breadth-first so a state's fail target is finished before the state
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in goto[state].items():
+                pending.append(next_state)
+
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+
+                inherited = best[fail[next_state]]
+                if inherited is not None and (best[next_state] is None or inherited < best[next_state]):
+                    best[next_state] = inherited
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def _classify(self, window_title):
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        match = None
+
+        for char in window_title:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            priority = best[state]
+            if priority is not None and (match is None or priority < match):
+                match = priority
+                if match == 0:
+                    break  # Nothing can beat the first rule
+
+        # If no match found, default to "Other"
+        return self.sites[match] if match is not None else "Other"
+
+
+def load_site_rules(path=SITE_RULES_FILENAME):
+    """Return the user's rules from a JSON file followed by the default rules.
+
+    The file maps site names to lists of title substrings, e.g.
+    {"Jira": ["- Jira", "jira.corp.example"]}. User rules are checked
+    before the built-in ones.
+    """
+    rules = []
+
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as rules_file:
+                user_rules = json.load(rules_file)
+            rules.extend((site, list(patterns)) for site, patterns in user_rules.items())
+        except Exception as e:
+            print(f"Error loading site rules from {path}: {e}")
+
+    rules.extend(DEFAULT_SITE_RULES)
+    return rules
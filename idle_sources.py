@@ -0,0 +1,83 @@
+import sys
+import os
+import time
+
+class IdleSource:
+    """Reports how long the user has gone without keyboard or mouse input.
+
+    The base class never reports idle time, which is what WindowTracker uses
+    when the platform offers no way to ask (and for replays).
+    """
+
+    def idle_seconds(self):
+        return 0.0
+
+    def close(self):
+        pass
+
+
+class FakeIdleSource(IdleSource):
+    """Idle source driven by hand, for tests and replays on a VirtualClock"""
+
+    def __init__(self, clock=None):
+        self.clock = clock
+        self._last_input = self._now()
+
+    def touch(self):
+        """Pretend the user just pressed a key"""
+        self._last_input = self._now()
+
+    def set_idle(self, seconds):
+        """Pretend the last input was `seconds` ago"""
+        self._last_input = self._now() - seconds
+
+    def idle_seconds(self):
+        return max(0.0, self._now() - self._last_input)
+
+    def _now(self):
+        return self.clock.time() if self.clock else time.time()
+
+
+class Win32IdleSource(IdleSource):
+    """Time since the last input event, from GetLastInputInfo"""
+
+    def __init__(self):
+        import win32api
+
+        self.win32api = win32api
+
+    def idle_seconds(self):
+        # Both are millisecond tick counts that wrap after 49.7 days
+        elapsed = (self.win32api.GetTickCount() - self.win32api.GetLastInputInfo()) & 0xFFFFFFFF
+        return elapsed / 1000.0
+
+
+class X11IdleSource(IdleSource):
+    """Time since the last input event, from the MIT-SCREEN-SAVER extension"""
+
+    def __init__(self, display_name=None):
+        from Xlib import display
+
+        self.display = display.Display(display_name)
+        if not self.display.has_extension("MIT-SCREEN-SAVER"):
+            self.display.close()
+            raise RuntimeError("The X server does not support MIT-SCREEN-SAVER")
+        self.root = self.display.screen().root
+
+    def idle_seconds(self):
+        return self.root.screensaver_query_info().idle / 1000.0
+
+    def close(self):
+        self.display.close()
+
+
+def create_idle_source():
+    """Pick the idle source for the current platform, or one that is never idle"""
+    try:
+        if sys.platform == "win32":
+            return Win32IdleSource()
+        if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+            return X11IdleSource()
+    except Exception as e:
+        print(f"Idle detection unavailable: {e}")
+    return IdleSource()
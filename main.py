@@ -1,9 +1,12 @@
+import time
+started = time.perf_counter()  # Startup time is measured from here, before PyQt is imported
+
 import sys
 from PyQt5.QtWidgets import QApplication
 from time_tracker_app import TimeTrackerApp
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = TimeTrackerApp()
+    window = TimeTrackerApp(started)
     window.show()
     sys.exit(app.exec_())
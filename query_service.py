@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+class QueryService(QObject):
+    """Runs database queries on a worker thread and hands results back on the GUI thread.
+
+    Requests are keyed: a new request replaces a pending one with the same key,
+    so a burst of refreshes runs a single query, and makes the result of one
+    already running stale, so its callback is never called. Switching projects
+    quickly therefore only ever renders the last project. Requests with key
+    None are neither coalesced nor cancelled.
+    """
+
+    # Emitted from the worker thread with (key, generation, callback, result)
+    _finished = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()  # Key -> (generation, func, args, callback), oldest first
+        self._generations = {}         # Key -> generation of its latest request
+        self._running = None           # Key of the request on the worker thread
+        self._next_anonymous = 0
+        self._stopping = False
+
+        self._finished.connect(self._deliver)
+        self._thread = threading.Thread(target=self._run, name="QueryService")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, key, func, callback=None, *args):
+        """Run func(*args) on the worker thread and call callback(result) on the GUI thread"""
+        with self._condition:
+            if key is None:
+                self._next_anonymous += 1
+                key = ("anonymous", self._next_anonymous)
+
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            self._pending.pop(key, None)  # Superseded before it started
+            self._pending[key] = (generation, func, args, callback)
+            self._condition.notify()
+
+    def cancel(self, key):
+        """Drop a pending request and ignore the result of a running one"""
+        with self._condition:
+            self._pending.pop(key, None)
+            if key in self._generations:
+                self._generations[key] += 1
+
+    def busy(self, key):
+        """Whether a request with this key is pending or running"""
+        with self._condition:
+            return key in self._pending or self._running == key
+
+    def stop(self, timeout=5.0):
+        """Run what is still pending and stop the worker thread"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return  # Stopping
+                key, (generation, func, args, callback) = self._pending.popitem(last=False)
+                self._running = key
+
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"Error running query {key}: {e}")
+                result = None
+                callback = None
+
+            with self._condition:
+                self._running = None
+                if isinstance(key, tuple) and key[0] == "anonymous":
+                    del self._generations[key]
+
+            if callback:
+                self._finished.emit((key, generation, callback, result))
+
+    def _deliver(self, finished):
+        key, generation, callback, result = finished
+        with self._condition:
+            stale = key in self._generations and self._generations[key] != generation
+        if stale:
+            return  # Superseded while it was running
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"Error handling query result {key}: {e}")
@@ -0,0 +1,232 @@
+"""Record and replay the raw window stream seen by WindowTracker.
+
+Recording wraps the real window backend and appends every observed
+(timestamp, app_name, window_title) change to a JSON Lines file. Replaying
+feeds such a file through the real pipeline (WindowTracker._track_windows ->
+activity_changed -> ActivityWriter -> DatabaseManager) on a virtual clock,
+so a week of switching runs in seconds with no display and no win32.
+
+    python replay.py recording.jsonl --db replay.db [--speed 1000]
+"""
+import sys
+import json
+import time
+import argparse
+import datetime
+
+from window_backends import WindowBackend
+from idle_sources import IdleSource
+
+class VirtualClock:
+    """Clock that only moves when advanced.
+
+    With a speed factor, advancing also sleeps for the scaled real time
+    (speed=1000 plays an hour in 3.6 seconds); without one it never sleeps.
+    """
+
+    def __init__(self, start=0.0, speed=None):
+        self._time = start
+        self.speed = speed
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self._time)
+
+    def time(self):
+        return self._time
+
+    def advance(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self._time += seconds
+
+
+class RecordingBackend(WindowBackend):
+    """Window backend wrapper that records what the tracker observes"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self._file = open(path, "a", encoding="utf-8")
+        self._last = None
+
+    def get_foreground_window(self):
+        window = self.backend.get_foreground_window()
+
+        app_name, window_title = "", ""
+        if window is not None:
+            _, pid, window_title = window
+            try:
+                app_name = self.backend.process_name(pid) if pid > 0 else "Unknown"
+            except Exception:
+                app_name = "Unknown"
+
+        # Only changes matter to the tracker, so unchanged polls are not stored
+        if (app_name, window_title) != self._last:
+            self._last = (app_name, window_title)
+            self._file.write(json.dumps({"t": time.time(), "app": app_name, "title": window_title}) + "\n")
+            self._file.flush()
+
+        return window
+
+    @property
+    def event_driven(self):
+        return self.backend.event_driven
+
+    def process_name(self, pid):
+        return self.backend.process_name(pid)
+
+    def process_start_time(self, pid):
+        return self.backend.process_start_time(pid)
+
+    def wait_for_change(self, timeout=None):
+        return self.backend.wait_for_change(timeout)
+
+    def wakeup(self):
+        self.backend.wakeup()
+
+    def close(self):
+        self._file.close()
+        self.backend.close()
+
+
+class ReplayBackend(WindowBackend):
+    """Window backend that plays back a recording on a VirtualClock"""
+
+    def __init__(self, events, clock, on_finished=None):
+        self.events = events
+        self.clock = clock
+        self.on_finished = on_finished
+        self.finished = False
+
+        self._pids = {}  # App names get stable fake pids
+        self._names = {}
+        self._next = 1
+        self._current = events[0] if events else None
+
+    def get_foreground_window(self):
+        if self._current is None:
+            return None
+
+        _, app_name, window_title = self._current
+        if not app_name:
+            return None
+
+        pid = self._pids.get(app_name)
+        if pid is None:
+            pid = self._pids[app_name] = len(self._pids) + 1
+            self._names[pid] = app_name
+        return pid, pid, window_title
+
+    def process_name(self, pid):
+        return self._names[pid]
+
+    def process_start_time(self, pid):
+        return 0
+
+    def wait_for_change(self, timeout=None):
+        if self._next >= len(self.events):
+            if not self.finished:
+                self.finished = True
+                if self.on_finished:
+                    self.on_finished()
+            return False
+
+        next_time = self.events[self._next][0]
+        if timeout is not None and self.clock.time() + timeout < next_time:
+            self.clock.advance(timeout)
+            return False
+
+        self.clock.advance(next_time - self.clock.time())
+        self._current = self.events[self._next]
+        self._next += 1
+        return True
+
+    def wakeup(self):
+        pass
+
+
+def load_recording(path):
+    """Read a recording into a list of (timestamp, app_name, window_title)"""
+    events = []
+    with open(path, encoding="utf-8") as recording:
+        for line in recording:
+            if line.strip():
+                event = json.loads(line)
+                events.append((event["t"], event["app"], event["title"]))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def replay_recording(events, db_manager, speed=None, project_id=1, domain_classifier=None):
+    """Run events through WindowTracker and ActivityWriter into db_manager; return stats"""
+    # Imported here so recording-only users don't pay for PyQt
+    from window_tracker import WindowTracker
+    from activity_writer import ActivityWriter
+
+    if not events:
+        return {"events": 0, "activities": 0, "virtual_seconds": 0, "real_seconds": 0.0}
+
+    clock = VirtualClock(events[0][0], speed)
+    backend = ReplayBackend(events, clock)
+    # Recordings hold window switches only, so the replayed user is never idle
+    tracker = WindowTracker(backend=backend, domain_classifier=domain_classifier, clock=clock,
+                            idle_source=IdleSource())
+    backend.on_finished = tracker.stop_event.set  # End the tracking loop with the recording
+
+    writer = ActivityWriter(db_manager)
+    activity_count = 0
+
+    def on_activity_changed(activity):
+        # Same as TimeTrackerApp.on_activity_changed, minus the UI
+        nonlocal activity_count
+        activity["project_id"] = project_id
+        writer.enqueue(activity)
+        activity_count += 1
+
+    tracker.activity_changed.connect(on_activity_changed)
+    tracker.current_project_id = project_id
+
+    started = time.perf_counter()
+    writer.start()
+
+    # Drive the tracking loop on this thread, then close the last activity
+    tracker.is_tracking = True
+    tracker.stop_event.clear()
+    tracker._track_windows()
+    tracker.stop_tracking()
+
+    writer.stop()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "events": len(events),
+        "activities": activity_count,
+        "virtual_seconds": clock.time() - events[0][0],
+        "real_seconds": elapsed
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded window stream into a database")
+    parser.add_argument("recording", help="JSON Lines file written by RecordingBackend")
+    parser.add_argument("--db", default="replay.db", help="Database file to write (default: replay.db)")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Virtual seconds per real second (default: as fast as possible)")
+    parser.add_argument("--project-id", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from database_manager import DatabaseManager
+
+    db_manager = DatabaseManager(args.db)
+    try:
+        stats = replay_recording(load_recording(args.recording), db_manager, args.speed, args.project_id)
+    finally:
+        db_manager.close()
+
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Crash journal and write-behind queue: nothing journaled is lost while the database refuses writes"""
+import datetime
+
+import pytest
+
+from activity_journal import ActivityJournal
+from activity_writer import ActivityWriter
+
+START = datetime.datetime(2024, 5, 6, 9)
+
+
+class FlakyDatabase:
+    """save_activities that fails a given number of times, like a database locked by an import"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.saved = []
+
+    def save_activities(self, activities):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.saved.extend(activities)
+        return True
+
+
+def activity(i, title=None):
+    return {
+        "type": "Application",
+        "name": "Code",
+        "window_title": title or f"file{i}.py - Visual Studio Code",
+        "short_title": f"file{i}.py",
+        "domain_info": "Code",
+        "start_time": START + datetime.timedelta(minutes=i),
+        "end_time": START + datetime.timedelta(minutes=i, seconds=30),
+    }
+
+
+def journaled(journal, i, **kwargs):
+    """Open and finish an activity in the journal, as WindowTracker does"""
+    item = activity(i, **kwargs)
+    item["journal_seq"] = journal.open(item, 1)
+    journal.finish(item["journal_seq"], item["end_time"])
+    return item
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "timetracker.journal")
+
+
+def test_failed_batch_is_retried(journal_path):
+    journal = ActivityJournal(journal_path)
+    db = FlakyDatabase(failures=1)
+    writer = ActivityWriter(db, max_batch=1, max_delay=0.01, journal=journal, retry_delay=0.01)
+    writer.start()
+
+    writer.enqueue(journaled(journal, 1))
+    writer.enqueue(journaled(journal, 2))
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    assert [item["start_time"].minute for item in db.saved] == [1, 2]
+    journal.close()
+    assert ActivityJournal(journal_path).recover() == []
+
+
+def test_flush_reports_a_batch_that_was_not_saved():
+    writer = ActivityWriter(FlakyDatabase(failures=100), max_delay=0.01, retry_delay=0.01)
+    writer.start()
+    writer.enqueue(activity(1))
+    assert not writer.flush(timeout=0.2)
+    writer.stop()
+
+
+def test_flush_waits_for_the_retry():
+    db = FlakyDatabase(failures=3)
+    writer = ActivityWriter(db, max_delay=0.01, retry_delay=0.01)
+    writer.start()
+    writer.enqueue(activity(1))
+    assert writer.flush(timeout=5)
+    assert len(db.saved) == 1
+    writer.stop()
+
+
+def test_commit_watermark_stops_at_oldest_unsaved(journal_path):
+    journal = ActivityJournal(journal_path)
+    first = journaled(journal, 1)
+    second = journaled(journal, 2)
+
+    # The second batch is saved while the first one is still pending
+    journal.committed([second])
+    journal.close()
+
+    recovered = ActivityJournal(journal_path).recover()
+    assert [item["window_title"] for item in recovered] == [first["window_title"], second["window_title"]]
+
+
+def test_unsaved_batch_survives_stop(journal_path):
+    journal = ActivityJournal(journal_path)
+    db = FlakyDatabase(failures=100)
+    writer = ActivityWriter(db, max_delay=0.01, journal=journal, retry_delay=0.01)
+    writer.start()
+    writer.enqueue(journaled(journal, 1))
+    writer.stop()
+    journal.close()
+
+    recovered = ActivityJournal(journal_path).recover()
+    assert len(recovered) == 1
+    assert recovered[0]["end_time"] == START + datetime.timedelta(minutes=1, seconds=30)
+
+
+def test_long_window_title_is_recovered_whole(journal_path):
+    title = "Ünïcode " + "very long document name " * 400
+    journal = ActivityJournal(journal_path)
+    journaled(journal, 1, title=title)
+    journal.close()
+
+    recovered = ActivityJournal(journal_path).recover()
+    assert [entry["window_title"] for entry in recovered] == [title]
+
+
+def test_torn_long_record_loses_only_that_activity(journal_path):
+    journal = ActivityJournal(journal_path)
+    first = journaled(journal, 1)
+    journaled(journal, 2, title="t" * 5000)
+    journal.close()
+    assert len(ActivityJournal(journal_path).recover()) == 2
+
+    # The process died halfway through writing the second activity's records
+    with open(journal_path, "r+b") as journal_file:
+        journal_file.truncate(4 * 512 + 100)
+
+    recovered = ActivityJournal(journal_path).recover()
+    assert [entry["window_title"] for entry in recovered] == [first["window_title"]]
+
+
+def test_replay_skips_activities_saved_before_the_crash(journal_path, tmp_path):
+    from database_manager import DatabaseManager
+
+    journal = ActivityJournal(journal_path)
+    saved = [journaled(journal, 1), journaled(journal, 2, title="file1.py - Visual Studio Code")]
+    journaled(journal, 5)
+    journal.close()  # Died after saving the first batch, before its COMMIT record
+
+    db = DatabaseManager(str(tmp_path / "timetracker.db"), start_migrations=False)
+    try:
+        assert db.save_activities(saved)  # The second one extends the first row
+        journal = ActivityJournal(journal_path)
+        assert journal.recover_into(db) == 1
+        journal.close()
+
+        with db._read_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), SUM(duration) FROM activities")
+            assert cursor.fetchone() == (2, 30 + 30 + 30)
+    finally:
+        db.close()
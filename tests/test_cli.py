@@ -0,0 +1,54 @@
+"""The headless command line"""
+import datetime
+
+import pytest
+
+import timetracker
+from database_manager import DatabaseManager
+
+START = datetime.datetime(2024, 5, 6, 9)
+
+
+def test_compact_reports_row_counts(tmp_path, capsys):
+    path = str(tmp_path / "timetracker.db")
+    db = DatabaseManager(path, merge_gap=None, start_migrations=False)
+    # Ten heartbeats of one window 30 s apart, saved before rows were merged
+    for i in range(10):
+        start = START + datetime.timedelta(seconds=30 * i)
+        db.save_activity({"project_id": 1, "type": "Application", "name": "Code", "window_title": "main.py",
+                          "domain_info": "Code", "start_time": start,
+                          "end_time": start + datetime.timedelta(seconds=20)})
+    db.close()
+
+    assert timetracker.main(["--db", path, "compact", "--gap", "5"]) == 0
+    assert "Compacted 10 rows to 10 (0 merged)" in capsys.readouterr().out
+
+    assert timetracker.main(["--db", path, "compact", "--gap", "60"]) == 0
+    assert "Compacted 10 rows to 1 (9 merged)" in capsys.readouterr().out
+
+    db = DatabaseManager(path, start_migrations=False)
+    try:
+        totals = db.get_activity_totals(START.date(), START.date())
+        assert [row[-1] for row in totals] == [200]
+    finally:
+        db.close()
+
+
+def test_stats_cover_archived_months(tmp_path, capsys):
+    pytest.importorskip("numpy")
+    path = str(tmp_path / "timetracker.db")
+    db = DatabaseManager(path, start_migrations=False)
+    # The first activity ends last
+    for minutes, seconds in ((0, 3600), (5, 60)):
+        start = START + datetime.timedelta(minutes=minutes)
+        db.save_activity({"project_id": 1, "type": "Application", "name": "Code", "window_title": f"{minutes}.py",
+                          "domain_info": "Code", "start_time": start,
+                          "end_time": start + datetime.timedelta(seconds=seconds)})
+    assert db.archive_closed_months() == 2
+    db.close()
+
+    assert timetracker.main(["--db", path, "stats"]) == 0
+    out = capsys.readouterr().out
+    assert "live activities      0" in out
+    assert f"first activity       {START}" in out
+    assert f"last activity        {START + datetime.timedelta(hours=1)}" in out
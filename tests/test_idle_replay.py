@@ -0,0 +1,137 @@
+"""Adaptive sampling and idle handling, replayed on a virtual clock"""
+import datetime
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from idle_sources import FakeIdleSource, IdleSource
+from replay import ReplayBackend, VirtualClock
+from window_tracker import SamplingScheduler, WindowTracker
+
+T0 = datetime.datetime(2024, 5, 6, 9).timestamp()
+
+
+class ScriptedInput(FakeIdleSource):
+    """The user types at the given virtual times and nowhere else"""
+
+    def __init__(self, clock, input_times):
+        super().__init__(clock)
+        self.input_times = sorted(input_times)
+
+    def idle_seconds(self):
+        now = self.clock.time()
+        self._last_input = max((t for t in self.input_times if t <= now), default=self.input_times[0])
+        return super().idle_seconds()
+
+
+class CountingBackend(ReplayBackend):
+    def __init__(self, events, clock):
+        super().__init__(events, clock)
+        self.samples = 0
+
+    def get_foreground_window(self):
+        self.samples += 1
+        return super().get_foreground_window()
+
+
+class EventBackend(CountingBackend):
+    """Jumps straight to the next change when waiting without a timeout, like X11Backend"""
+
+    event_driven = True
+
+
+def replay(events, input_times, backend_class=ReplayBackend, **tracker_args):
+    """Run events (offset seconds, app, title) through WindowTracker; returns (activities, idle periods)"""
+    clock = VirtualClock(T0)
+    backend = backend_class([(T0 + offset, app, title) for offset, app, title in events], clock)
+    idle_source = ScriptedInput(clock, [T0 + offset for offset in input_times])
+    tracker = WindowTracker(backend=backend, clock=clock, idle_source=idle_source, **tracker_args)
+    backend.on_finished = tracker.stop_event.set
+
+    activities, idle_periods = [], []
+    tracker.activity_changed.connect(activities.append)
+    tracker.idle_period.connect(idle_periods.append)
+
+    tracker.is_tracking = True
+    tracker._track_windows()
+    tracker.stop_tracking()
+    return activities, idle_periods
+
+
+def offsets(item):
+    return item["start_time"].timestamp() - T0, item["end_time"].timestamp() - T0
+
+
+def test_scheduler_backs_off_while_stable_and_resets_on_change():
+    scheduler = SamplingScheduler(min_interval=1.0, max_interval=5.0, backoff=2.0, stable_samples=3)
+    assert [scheduler.next_interval() for _ in range(6)] == [1.0, 1.0, 2.0, 4.0, 5.0, 5.0]
+    assert scheduler.next_interval(changed=True) == 1.0
+    assert scheduler.next_interval(idle=True) == scheduler.idle_interval
+
+
+def test_stable_window_is_sampled_less_often():
+    clock = VirtualClock(T0)
+    backend = CountingBackend([(T0, "Code", "main.py"), (T0 + 3600, "Code", "main.py")], clock)
+    tracker = WindowTracker(backend=backend, clock=clock, idle_source=IdleSource())
+    backend.on_finished = tracker.stop_event.set
+    tracker.is_tracking = True
+    tracker._track_windows()
+
+    # An hour at the 1 s minimum would be 3600 samples; backing off to 5 s is about 720
+    assert backend.samples < 800
+
+
+def test_event_driven_backend_only_wakes_up_for_deadlines():
+    clock = VirtualClock(T0)
+    backend = EventBackend([(T0, "Code", "main.py"), (T0 + 3600, "Code", "main.py")], clock)
+    tracker = WindowTracker(backend=backend, clock=clock, idle_source=IdleSource())
+    backend.on_finished = tracker.stop_event.set
+    tracker.is_tracking = True
+    tracker._track_windows()
+
+    # Without a journal only the idle deadline (300 s) wakes it up
+    assert backend.samples <= 13
+
+
+@pytest.mark.parametrize("backend_class", [ReplayBackend, EventBackend])
+def test_idle_time_is_not_credited_to_the_window(backend_class):
+    # Typing until 400 s, away until 2000 s, then back in another window
+    events = [(0, "Code", "main.py"), (100, "firefox", "Docs - Mozilla Firefox"), (2000, "slack", "general")]
+    input_times = list(range(0, 401, 10)) + [2000, 2010]
+    activities, idle_periods = replay(events, input_times, backend_class=backend_class, idle_threshold=300)
+
+    assert [(item["name"], offsets(item)) for item in activities[:2]] == [
+        ("Code", (0, 100)),
+        ("firefox", (100, 400)),  # Ends where input stopped, not when idleness was noticed
+    ]
+    assert activities[2]["name"] == "slack"
+    assert offsets(activities[2])[0] == 2000
+    assert [offsets(period) for period in idle_periods] == [(400, 2000)]
+
+
+def test_short_pauses_are_not_idle():
+    events = [(0, "Code", "main.py"), (600, "slack", "general")]
+    input_times = list(range(0, 601, 200))  # Input every 200 s, below the threshold
+    activities, idle_periods = replay(events, input_times, idle_threshold=300)
+
+    assert idle_periods == []
+    assert [offsets(item) for item in activities][0] == (0, 600)
+
+
+def test_replayed_recording_lands_in_the_database(tmp_path):
+    from database_manager import DatabaseManager
+    from replay import replay_recording
+
+    events = [(T0, "Code", "main.py"), (T0 + 120, "slack", "general"), (T0 + 150, "Code", "main.py"),
+              (T0 + 400, "Code", "main.py")]
+    db = DatabaseManager(str(tmp_path / "replay.db"), start_migrations=False)
+    try:
+        stats = replay_recording(events, db)
+        assert stats["virtual_seconds"] == 400
+
+        day = datetime.date.fromtimestamp(T0)
+        totals = {(app, title): seconds for app, _, title, seconds in db.get_activity_totals(day, day)}
+        assert totals == {("Code", "main.py"): 370, ("slack", "general"): 30}
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+"""Bulk import: deduplication against stored activities and cleanup after failures"""
+import datetime
+
+import pytest
+
+import database_manager
+from database_manager import DatabaseManager
+
+START = datetime.datetime(2024, 5, 6, 9)
+
+
+def records(count, title="Report.docx - Word", start=START, step=10, length=5):
+    for i in range(count):
+        yield {
+            "start_time": start + datetime.timedelta(seconds=step * i),
+            "end_time": start + datetime.timedelta(seconds=step * i + length),
+            "project": "Imported",
+            "name": "WINWORD",
+            "domain_info": "WINWORD",
+            "window_title": title,
+        }
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "timetracker.db"), start_migrations=False)
+    yield manager
+    manager.close()
+
+
+def count_activities(db):
+    with db._read_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(duration), 0) FROM activities")
+        return cursor.fetchone()
+
+
+def test_reimport_adds_nothing(db):
+    assert db.import_activities(records(50))["imported"] == 50
+    stats = db.import_activities(records(50))
+    assert stats["imported"] == 0
+    assert stats["duplicates"] == 50
+    assert count_activities(db) == (50, 250)
+
+
+def test_overlapping_rows_within_an_import_are_kept_once(db):
+    rows = list(records(3)) + list(records(3, start=START + datetime.timedelta(seconds=2)))
+    stats = db.import_activities(rows)
+    assert stats["imported"] == 3
+    assert stats["duplicates"] == 3
+
+
+def test_overlaps_between_different_windows_are_kept(db):
+    # A heartbeat-merged row spans the windows visited in between
+    db.import_activities(records(1, title="Inbox - Outlook", length=600))
+    stats = db.import_activities(records(10))
+    assert stats["imported"] == 10
+
+
+def test_invalid_records_are_counted(db):
+    rows = list(records(2)) + [{"start_time": "not a time", "end_time": START, "name": "x"},
+                               {"start_time": START, "end_time": START, "name": "x"}]
+    stats = db.import_activities(rows)
+    assert (stats["imported"], stats["invalid"]) == (2, 2)
+
+
+def test_failed_import_leaves_nothing_behind(db):
+    def failing():
+        yield from records(10)
+        raise RuntimeError("source went away")
+
+    assert db.import_activities(failing()) is None
+    with db._write_lock:
+        conn = db._get_write_connection()
+        assert conn.execute("SELECT name FROM temp.sqlite_master").fetchall() == []
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+    # The next import works and sees nothing of the failed one
+    assert db.import_activities(records(10))["imported"] == 10
+
+
+def test_failed_large_import_restores_indexes(db, monkeypatch):
+    monkeypatch.setattr(database_manager, "IMPORT_DEFER_INDEX_ROWS", 5)
+    with db._write_transaction() as cursor:
+        cursor.execute("ALTER TABLE daily_totals RENAME TO daily_totals_away")
+
+    assert db.import_activities(records(20)) is None
+
+    with db._read_cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_activities_%'")
+        assert {row[0] for row in cursor.fetchall()} == {"idx_activities_project_start", "idx_activities_start"}
+
+
+def test_export_interleaves_archived_and_live_rows(db):
+    pytest.importorskip("numpy")
+    db.import_activities(records(10, step=60))
+    assert db.archive_closed_months() == 10
+    # Imported into the closed month afterwards: a second segment, then live rows
+    db.import_activities(records(10, title="Inbox", start=START + datetime.timedelta(seconds=20), step=60))
+    assert db.archive_closed_months() == 10
+    db.import_activities(records(10, title="Notes", start=START + datetime.timedelta(seconds=40), step=60))
+
+    rows = list(db.iter_activities(batch_size=3))
+    assert len(rows) == 30
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+    assert [row[-1] for row in rows[:3]] == ["Report.docx - Word", "Inbox", "Notes"]
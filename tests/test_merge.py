@@ -0,0 +1,118 @@
+"""Merging other timetracker databases: projects by name, idempotent, any source layout"""
+import datetime
+import sqlite3
+
+import pytest
+
+from database_manager import DatabaseManager
+
+DAY = datetime.date(2024, 5, 6)
+
+
+def activity(minute, title, project_id=1, name="Code", seconds=30):
+    start = datetime.datetime.combine(DAY, datetime.time(9)) + datetime.timedelta(minutes=minute)
+    return {"project_id": project_id, "type": "Application", "name": name, "window_title": title,
+            "domain_info": name, "start_time": start, "end_time": start + datetime.timedelta(seconds=seconds)}
+
+
+def totals(db, day=DAY):
+    return {(app, title): seconds for app, _, title, seconds in db.get_activity_totals(day, day)}
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    opened = []
+
+    def open_db(name):
+        db = DatabaseManager(str(tmp_path / f"{name}.db"), start_migrations=False)
+        opened.append(db)
+        return db
+
+    yield open_db
+    for db in opened:
+        db.close()
+
+
+def test_merge_adds_other_machine_and_is_idempotent(open_db):
+    desktop, laptop = open_db("desktop"), open_db("laptop")
+    desktop.save_activities([activity(0, "main.py"), activity(2, "main.py")])
+    client = laptop.create_project("Client")
+    laptop.save_activities([activity(1, "report.docx", client, name="WINWORD"), activity(3, "main.py")])
+
+    stats = desktop.merge_database(laptop.db_filename)
+    assert (stats["read"], stats["imported"], stats["duplicates"]) == (2, 2, 0)
+    assert totals(desktop) == {("Code", "main.py"): 90, ("WINWORD", "report.docx"): 30}
+    assert [project["name"] for project in desktop.get_projects() if project["name"] == "Client"] == ["Client"]
+
+    stats = desktop.merge_database(laptop.db_filename)
+    assert (stats["imported"], stats["duplicates"]) == (0, 2)
+    assert totals(desktop)[("Code", "main.py")] == 90
+
+
+def test_merge_skips_only_overlaps_of_the_same_window(open_db):
+    desktop, laptop = open_db("desktop"), open_db("laptop")
+    desktop.save_activity(activity(0, "main.py", seconds=600))
+    laptop.save_activities([activity(1, "main.py"), activity(2, "Inbox")])
+
+    stats = desktop.merge_database(laptop.db_filename)
+    assert (stats["imported"], stats["duplicates"]) == (1, 1)
+    assert totals(desktop) == {("Code", "main.py"): 600, ("Code", "Inbox"): 30}
+
+
+def test_merge_reads_archived_months(open_db):
+    pytest.importorskip("numpy")
+    desktop, laptop = open_db("desktop"), open_db("laptop")
+    laptop.save_activities([activity(0, "main.py"), activity(1, "Inbox")])
+    assert laptop.archive_closed_months() == 2
+
+    stats = desktop.merge_database(laptop.db_filename)
+    assert stats["imported"] == 2
+    assert totals(desktop) == {("Code", "main.py"): 30, ("Code", "Inbox"): 30}
+
+
+def create_first_release_database(path):
+    """Two activities in the layout of the first release: text columns and text times"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                               description TEXT, created_at TEXT, last_active TEXT);
+        CREATE TABLE activities (id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER, type TEXT,
+                                 name TEXT, window_title TEXT, short_title TEXT, domain_info TEXT,
+                                 start_time TEXT, end_time TEXT);
+        INSERT INTO projects (name) VALUES ('Default Project');
+        INSERT INTO activities (project_id, type, name, window_title, short_title, domain_info, start_time, end_time)
+        VALUES (1, 'Application', 'Code', 'main.py', 'main.py', 'Code', '2024-05-06 09:00:00', '2024-05-06 09:00:30'),
+               (1, 'Application', 'Code', 'main.py', 'main.py', NULL, '2024-05-06 09:01:00', '2024-05-06 09:01:45');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_merge_reads_first_release_databases(open_db, tmp_path):
+    path = str(tmp_path / "old.db")
+    create_first_release_database(path)
+
+    desktop = open_db("desktop")
+    stats = desktop.merge_database(path)
+    assert stats["imported"] == 2
+    assert sum(row[-1] for row in desktop.get_activity_totals(DAY, DAY)) == 75
+
+
+def test_merge_reads_rows_a_half_upgraded_source_has_not_moved(open_db, tmp_path):
+    path = str(tmp_path / "old.db")
+    create_first_release_database(path)
+    laptop = DatabaseManager(path, start_migrations=False)  # Upgraded on open, rows moved in the background
+    assert laptop.upgrading
+    laptop.save_activity(activity(5, "Inbox"))
+    laptop.close()
+
+    desktop = open_db("desktop")
+    stats = desktop.merge_database(path)
+    assert (stats["read"], stats["invalid"], stats["imported"]) == (3, 0, 3)
+    assert sum(row[-1] for row in desktop.get_activity_totals(DAY, DAY)) == 105
+
+
+def test_merging_a_database_into_itself_fails(open_db):
+    desktop = open_db("desktop")
+    assert desktop.merge_database(desktop.db_filename) is None
+    assert desktop.merge_database(desktop.db_filename + ".missing") is None
@@ -0,0 +1,110 @@
+"""Upgrading databases written by older versions without blocking startup"""
+import datetime
+import sqlite3
+
+import pytest
+
+from database_manager import DatabaseManager
+
+DAY = datetime.date(2024, 5, 6)
+
+
+def create_legacy_database(path, rows=100):
+    """A database in the layout of the first release: text columns and text times"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                               description TEXT, created_at TEXT, last_active TEXT);
+        CREATE TABLE activities (id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER, type TEXT,
+                                 name TEXT, window_title TEXT, short_title TEXT, domain_info TEXT,
+                                 start_time TEXT, end_time TEXT);
+        INSERT INTO projects (name) VALUES ('Default Project'), ('Client');
+    ''')
+    start = datetime.datetime.combine(DAY, datetime.time(9))
+    for i in range(rows):
+        begin = start + datetime.timedelta(minutes=i)
+        conn.execute('''
+            INSERT INTO activities (project_id, type, name, window_title, short_title, domain_info, start_time, end_time)
+            VALUES (?, 'Application', ?, ?, '', ?, ?, ?)
+        ''', (1 + i % 2, "chrome" if i % 3 else "Code", f"Page {i % 7}", "GitHub" if i % 3 else "Code",
+              begin.strftime("%Y-%m-%d %H:%M:%S"), (begin + datetime.timedelta(seconds=30)).strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    conn.close()
+
+
+def run_migrations(db):
+    assert db._migrate_lookup_tables()
+    assert db._migrate_epoch_timestamps()
+    assert db._backfill_daily_totals()
+
+
+@pytest.fixture
+def legacy_path(tmp_path, monkeypatch):
+    monkeypatch.setattr("database_manager.MIGRATION_BATCH_SIZE", 7)
+    path = str(tmp_path / "timetracker.db")
+    create_legacy_database(path)
+    return path
+
+
+def test_opening_leaves_the_old_rows_for_the_background(legacy_path):
+    db = DatabaseManager(legacy_path, start_migrations=False)
+    try:
+        assert db.upgrading
+        with db._read_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM activities_legacy")
+            assert cursor.fetchone()[0] == 100
+    finally:
+        db.close()
+
+
+def test_migrated_rows_keep_ids_and_totals(legacy_path):
+    db = DatabaseManager(legacy_path, start_migrations=False)
+    try:
+        # Saved while the migration is pending: numbered after the old rows
+        start = datetime.datetime.combine(DAY, datetime.time(12))
+        assert db.save_activity({"project_id": 1, "type": "Application", "name": "Code", "window_title": "Page 1",
+                                 "domain_info": "Code", "start_time": start,
+                                 "end_time": start + datetime.timedelta(seconds=60)})
+        run_migrations(db)
+
+        with db._read_cursor() as cursor:
+            cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM activities")
+            assert cursor.fetchone() == (1, 101, 101)
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'activities_legacy'")
+            assert cursor.fetchone() is None
+
+        totals = db.get_activity_totals(DAY, DAY)
+        assert sum(row[-1] for row in totals) == 100 * 30 + 60
+        assert sum(row[-1] for row in totals if row[2] == "Page 1") == 15 * 30 + 60
+    finally:
+        db.close()
+
+
+def test_deleting_a_project_reaches_rows_not_yet_migrated(legacy_path):
+    db = DatabaseManager(legacy_path, start_migrations=False)
+    try:
+        assert db.delete_project(2, transfer_to_default=False) == (True, None)
+        run_migrations(db)
+        with db._read_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), COUNT(DISTINCT project_id) FROM activities")
+            assert cursor.fetchone() == (50, 1)
+    finally:
+        db.close()
+
+
+def test_import_finishes_the_migration_first(legacy_path):
+    db = DatabaseManager(legacy_path, start_migrations=False)
+    try:
+        # The same rows again, as an export of the old database would have them
+        with db._read_cursor() as cursor:
+            cursor.execute('''
+                SELECT name, window_title, domain_info, start_time, end_time,
+                       (SELECT name FROM projects WHERE id = project_id)
+                FROM activities_legacy
+            ''')
+            records = [{"name": name, "window_title": title, "domain_info": domain, "start_time": start,
+                        "end_time": end, "project": project} for name, title, domain, start, end, project in cursor]
+        stats = db.import_activities(records)
+        assert (stats["imported"], stats["duplicates"]) == (0, 100)
+    finally:
+        db.close()
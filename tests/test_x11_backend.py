@@ -0,0 +1,121 @@
+"""X11Backend against a real X server: runs under Xvfb, skipped where Xvfb or python-xlib is missing"""
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+pytest.importorskip("Xlib")
+if shutil.which("Xvfb") is None:
+    pytest.skip("Xvfb is not installed", allow_module_level=True)
+
+from Xlib import X, Xatom, display
+
+from window_backends import X11Backend
+
+
+@pytest.fixture(scope="module")
+def xvfb():
+    """Start Xvfb on a free display; yields its name"""
+    read_fd, write_fd = os.pipe()
+    server = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-nolisten", "tcp", "-screen", "0", "640x480x24"],
+                              pass_fds=[write_fd], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as displayfd:
+        number = displayfd.readline().strip()
+    if not number:
+        server.kill()
+        pytest.skip("Xvfb did not start")
+    yield f":{number}"
+    server.terminate()
+    server.wait()
+
+
+class WindowManager:
+    """Just enough of an EWMH window manager: sets _NET_ACTIVE_WINDOW and window titles"""
+
+    def __init__(self, display_name):
+        self.display = display.Display(display_name)
+        self.root = self.display.screen().root
+        self.NET_ACTIVE_WINDOW = self.display.intern_atom("_NET_ACTIVE_WINDOW")
+        self.NET_WM_NAME = self.display.intern_atom("_NET_WM_NAME")
+        self.NET_WM_PID = self.display.intern_atom("_NET_WM_PID")
+        self.UTF8_STRING = self.display.intern_atom("UTF8_STRING")
+
+    def create_window(self, title):
+        window = self.root.create_window(0, 0, 100, 100, 0, X.CopyFromParent)
+        window.change_property(self.NET_WM_PID, Xatom.CARDINAL, 32, [os.getpid()])
+        self.set_title(window, title)
+        return window
+
+    def set_title(self, window, title):
+        window.change_property(self.NET_WM_NAME, self.UTF8_STRING, 8, title.encode("utf-8"))
+        self.display.flush()
+
+    def activate(self, window):
+        self.root.change_property(self.NET_ACTIVE_WINDOW, Xatom.WINDOW, 32, [window.id])
+        self.display.flush()
+
+    def close(self):
+        self.display.close()
+
+
+@pytest.fixture
+def session(xvfb):
+    manager = WindowManager(xvfb)
+    backend = X11Backend(xvfb)
+    yield manager, backend
+    backend.close()
+    manager.close()
+
+
+def test_reads_the_active_window(session):
+    manager, backend = session
+    editor = manager.create_window("notes.txt - Editor")
+    manager.activate(editor)
+
+    window_id, pid, title = backend.get_foreground_window()
+    assert (window_id, pid, title) == (editor.id, os.getpid(), "notes.txt - Editor")
+    assert backend.process_name(pid)
+    assert backend.process_start_time(pid) > 0
+
+
+def test_switching_windows_wakes_the_wait(session):
+    manager, backend = session
+    editor = manager.create_window("notes.txt - Editor")
+    browser = manager.create_window("Inbox - Mozilla Firefox")
+    manager.activate(editor)
+    backend.get_foreground_window()
+    backend.wait_for_change(0.1)  # Consume the events so far
+
+    manager.activate(browser)
+    started = time.monotonic()
+    assert backend.wait_for_change(5.0)
+    assert time.monotonic() - started < 2.0
+    assert backend.get_foreground_window()[2] == "Inbox - Mozilla Firefox"
+
+
+def test_title_change_of_the_active_window_wakes_the_wait(session):
+    manager, backend = session
+    browser = manager.create_window("Inbox - Mozilla Firefox")
+    manager.activate(browser)
+    backend.get_foreground_window()  # Starts watching the window's title
+    backend.wait_for_change(0.1)
+
+    manager.set_title(browser, "GitHub - Mozilla Firefox")
+    assert backend.wait_for_change(5.0)
+    assert backend.get_foreground_window()[2] == "GitHub - Mozilla Firefox"
+
+
+def test_wait_times_out_or_wakes_up_without_changes(session):
+    manager, backend = session
+    manager.activate(manager.create_window("notes.txt - Editor"))
+    backend.get_foreground_window()
+    backend.wait_for_change(0.1)
+
+    assert backend.wait_for_change(0.2) is False
+    backend.wakeup()
+    started = time.monotonic()
+    assert backend.wait_for_change(5.0) is False
+    assert time.monotonic() - started < 2.0
@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import (QMainWindow, QTreeWidget, QTreeWidgetItem, QPushButton, 
+from PyQt5.QtWidgets import (QMainWindow, QTreeView, QPushButton, 
                              QLabel, QVBoxLayout, QHBoxLayout, QWidget, QTableWidgetItem,
                              QSystemTrayIcon, QMenu, QAction, QDialog, QLineEdit,
                              QTextEdit, QComboBox, QMessageBox, QInputDialog, QApplication,
@@ -10,47 +10,163 @@ from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal, QPropertyAnimation, QE
 
 from database_manager import DatabaseManager
 from window_tracker import WindowTracker
+from activity_writer import ActivityWriter
+from activity_journal import ActivityJournal
+from day_aggregate import DayAggregate
+from activity_tree_model import ActivityTreeModel
+from query_service import QueryService
 
 import datetime
 from collections import defaultdict
 import sys
 import os
+import time
+import threading
+
+# Refresh triggers within this many milliseconds are rendered once
+DISPLAY_UPDATE_DELAY_MS = 250
 
 class TimeTrackerApp(QMainWindow):
-    def __init__(self):
+    # Emitted from the writer thread after a batch of activities is committed
+    activities_committed = pyqtSignal(int)
+    # Emitted from the StorageLoader thread with the opened storage, or None on failure
+    storage_loaded = pyqtSignal(object)
+    
+    def __init__(self, started=None):
         super().__init__()
         
+        # Startup is timed from process start when main.py passes it in
+        self.started = started if started is not None else time.perf_counter()
+        self.startup_ms = {}
+        
         # Set the application style and theme
         self.setup_theme()
         
-        # Initialize components
-        self.db_manager = DatabaseManager()
-        self.window_tracker = WindowTracker()
-        self.window_tracker.activity_changed.connect(self.on_activity_changed)
+        # Storage is opened on a worker thread (schema checks, journal recovery
+        # and today's totals can take a while); on_storage_loaded fills these in
+        self.db_manager = None
+        self.activity_journal = None
+        self.window_tracker = None
+        self.activity_writer = None
+        self.day_aggregate = None
         
         self.is_tracking = False
+        self.projects = []
+        self.current_project_id = None
         
-        # Load projects and set current project
-        self.projects = self.db_manager.get_projects()
-        
-        # Set default project ID - if no projects, will be set in update_project_combo
-        if self.projects:
-            self.current_project_id = self.projects[0]["id"]
-        else:
-            self.current_project_id = None
+        # While a search term is set the tree shows only matching titles
+        self.search_term = ""
+        self.search_titles = {}  # (app, domain) -> matching titles
         
         self.init_ui()
         self.setup_system_tray()
+        self.set_controls_enabled(False)
+        self.tracking_status.setText("Loading...")
         
-        # Update the project combo to ensure we have a valid project
-        self.update_project_combo()
+        # Report queries run here, never on the GUI thread
+        self.query_service = QueryService(self)
+        self.activities_during_load = 0  # Activities the day totals may have missed while loading
+        
+        self.activities_committed.connect(self.on_activities_committed)
+        self.storage_loaded.connect(self.on_storage_loaded)
+        threading.Thread(target=self.load_storage, name="StorageLoader", daemon=True).start()
+        
+        # Runs once the event loop has shown the window
+        QTimer.singleShot(0, self.on_window_shown)
         
         # Set up timer to refresh data periodically
         self.refresh_timer = QTimer(self)
-        self.refresh_timer.timeout.connect(self.update_activity_display)
-        self.refresh_timer.start(60000)  # Refresh every minute
+        self.refresh_timer.timeout.connect(self.schedule_display_update)
+        
+        # Collapses bursts of refresh triggers into one update
+        self.display_timer = QTimer(self)
+        self.display_timer.setSingleShot(True)
+        self.display_timer.timeout.connect(self.update_activity_display)
+    
+    def load_storage(self):
+        """Open the database and load today's totals; runs on the StorageLoader thread"""
+        try:
+            db_manager = DatabaseManager()
+            
+            # Save what the previous run was tracking when it died, then start a fresh journal
+            journal = ActivityJournal()
+            recovered = journal.recover_into(db_manager)
+            if recovered:
+                print(f"Recovered {recovered} unsaved activities from the journal")
+            
+            # Ensure there's at least one project (the default project)
+            projects = db_manager.get_projects()
+            if not projects:
+                db_manager.create_project("Default Project", "Default project for all activities")
+                projects = db_manager.get_projects()
+            
+            # Today's totals are kept in memory and updated as activities arrive
+            day_aggregate = DayAggregate(db_manager)
+            day_aggregate.load(projects[0]["id"])
+        except Exception as e:
+            print(f"Error opening the database: {e}")
+            self.storage_loaded.emit(None)
+            return
+        
+        self.storage_loaded.emit({
+            "db_manager": db_manager,
+            "journal": journal,
+            "projects": projects,
+            "day_aggregate": day_aggregate,
+        })
+    
+    def on_storage_loaded(self, storage):
+        """Start tracking components and fill in the window once storage is open"""
+        if storage is None:
+            self.tracking_status.setText("Could not open the database")
+            return
+        
+        self.db_manager = storage["db_manager"]
+        self.activity_journal = storage["journal"]
         
+        self.window_tracker = WindowTracker(self.create_window_backend(), journal=self.activity_journal)
+        self.window_tracker.activity_changed.connect(self.on_activity_changed)
+        self.window_tracker.idle_period.connect(self.on_idle_period)
+        
+        # Save activities off the GUI thread and refresh once they are committed
+        self.activity_writer = ActivityWriter(self.db_manager, on_commit=self.activities_committed.emit,
+                                              journal=self.activity_journal)
+        self.activity_writer.start()
+        
+        self.day_aggregate = storage["day_aggregate"]
+        self.day_aggregate.writer = self.activity_writer
+        
+        # Select the first project, whose totals were loaded with the database
+        self.current_project_id = storage["projects"][0]["id"]
+        self.update_project_combo(storage["projects"])
+        
+        self.set_controls_enabled(True)
+        self.tracking_status.setText("Tracking stopped")
+        self.refresh_timer.start(60000)  # Refresh every minute
         self.update_activity_display()
+        
+        self.startup_ms["data_loaded"] = (time.perf_counter() - self.started) * 1000
+        print(f"Startup: window shown in {self.startup_ms.get('window_shown', 0):.0f} ms, "
+              f"data loaded in {self.startup_ms['data_loaded']:.0f} ms")
+    
+    def on_window_shown(self):
+        self.startup_ms["window_shown"] = (time.perf_counter() - self.started) * 1000
+    
+    def set_controls_enabled(self, enabled):
+        """Enable the controls that need the database"""
+        for widget in (self.project_combo, self.new_project_btn, self.edit_project_btn,
+                       self.delete_project_btn, self.tracking_btn, self.search_box):
+            widget.setEnabled(enabled)
+    
+    def create_window_backend(self):
+        """Return the window backend, wrapped in a recorder if TIMETRACKER_RECORD is set"""
+        record_path = os.environ.get("TIMETRACKER_RECORD")
+        if not record_path:
+            return None  # WindowTracker picks the platform backend
+        
+        from replay import RecordingBackend
+        from window_backends import create_backend
+        return RecordingBackend(create_backend(), record_path)
     
     def setup_theme(self):
         """Setup the application theme and styling"""
@@ -202,14 +318,38 @@ class TimeTrackerApp(QMainWindow):
         activity_label = QLabel("Today's Activities")
         activity_label.setStyleSheet("color: #4FC3F7; font-weight: bold; font-size: 14px; margin-top: 10px;")
         activity_label.setAlignment(Qt.AlignLeft)
-        main_layout.addWidget(activity_label)
         
-        self.activity_table = QTreeWidget()
-        self.activity_table.setColumnCount(2)
-        self.activity_table.setHeaderLabels(["Application", "Duration"])
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search window titles...")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setMaximumWidth(300)
+        self.search_box.setStyleSheet("""
+            QLineEdit {
+                border: 1px solid #555;
+                border-radius: 3px;
+                padding: 5px;
+                background-color: #3C3C3C;
+                color: white;
+                margin-top: 10px;
+            }
+        """)
+        self.search_box.textChanged.connect(self.on_search_changed)
+        
+        activity_header = QHBoxLayout()
+        activity_header.addWidget(activity_label)
+        activity_header.addStretch()
+        activity_header.addWidget(self.search_box)
+        main_layout.addLayout(activity_header)
+        
+        # Window titles are loaded into the model only when a domain is expanded
+        self.activity_model = ActivityTreeModel(self.titles_for_domain)
+        
+        self.activity_table = QTreeView()
+        self.activity_table.setModel(self.activity_model)
         self.activity_table.setAlternatingRowColors(True)
+        self.activity_table.setUniformRowHeights(True)
         self.activity_table.setStyleSheet("""
-            QTreeWidget {
+            QTreeView {
                 background-color: #2D2D2D;
                 alternate-background-color: #353535;
                 border: 1px solid #555;
@@ -217,11 +357,11 @@ class TimeTrackerApp(QMainWindow):
                 padding: 5px;
                 color: white;
             }
-            QTreeWidget::item {
+            QTreeView::item {
                 padding: 5px;
                 border-bottom: 1px solid #444;
             }
-            QTreeWidget::item:selected {
+            QTreeView::item:selected {
                 background-color: #2196F3;
             }
             QHeaderView::section {
@@ -234,7 +374,7 @@ class TimeTrackerApp(QMainWindow):
         """)
         self.activity_table.header().setStretchLastSection(True)
         self.activity_table.setColumnWidth(0, 300)
-        self.activity_table.itemClicked.connect(self.on_item_clicked)
+        self.activity_table.clicked.connect(self.on_item_clicked)
         self.activity_table.setAnimated(True)
         self.activity_table.setIndentation(20)
         self.activity_table.header().setSectionResizeMode(QHeaderView.Interactive)
@@ -250,17 +390,15 @@ class TimeTrackerApp(QMainWindow):
         self.setWindowTitle("TimeTracker - Productivity Analyzer")
         self.setGeometry(100, 100, 900, 700)
     
-    def update_project_combo(self):
-        """Update the project selection dropdown"""
-        self.project_combo.clear()
-        self.projects = self.db_manager.get_projects()
+    def update_project_combo(self, projects=None):
+        """Update the project selection dropdown; reloads the projects on the query thread if none are given"""
+        if projects is None:
+            self.query_service.request("projects", self.load_projects, self.update_project_combo)
+            return
         
-        # Ensure there's at least one project (the default project)
-        if not self.projects:
-            # Create the default project if it doesn't exist
-            default_id = self.db_manager.create_project("Default Project", "Default project for all activities")
-            self.current_project_id = default_id
-            self.projects = self.db_manager.get_projects()
+        self.project_combo.blockSignals(True)  # Don't reload the display once per added item
+        self.project_combo.clear()
+        self.projects = projects
         
         selected_index = 0
         for i, project in enumerate(self.projects):
@@ -276,11 +414,26 @@ class TimeTrackerApp(QMainWindow):
             # If current_project_id isn't found, default to the first project
             self.project_combo.setCurrentIndex(0)
             self.current_project_id = self.projects[0]["id"]
+        self.project_combo.blockSignals(False)
+        
+        if self.window_tracker:
+            self.window_tracker.current_project_id = self.current_project_id
+    
+    def load_projects(self):
+        """Fetch the projects, creating the default project if there are none; runs on the query thread"""
+        projects = self.db_manager.get_projects()
+        if not projects:
+            self.db_manager.create_project("Default Project", "Default project for all activities")
+            projects = self.db_manager.get_projects()
+        return projects
     
     def on_project_changed(self, index):
         """Handle project selection change"""
         if index >= 0 and index < len(self.projects):
             self.current_project_id = self.projects[index]["id"]
+            if self.window_tracker:
+                self.window_tracker.current_project_id = self.current_project_id
+            self.activity_model.set_summary([])  # Don't show the previous project while loading
             self.update_activity_display()
     
     def create_project_dialog(self):
@@ -388,9 +541,14 @@ class TimeTrackerApp(QMainWindow):
         if not name.strip():
             QMessageBox.warning(self, "Validation Error", "Project name cannot be empty.")
             return
-            
-        project_id = self.db_manager.create_project(name, description)
         
+        dialog.setEnabled(False)  # Until the query thread has created it
+        self.query_service.request(None, self.db_manager.create_project,
+                                   lambda project_id: self.on_project_created(project_id, dialog),
+                                   name, description)
+    
+    def on_project_created(self, project_id, dialog):
+        dialog.setEnabled(True)
         if project_id is None:
             QMessageBox.warning(self, "Error", "A project with this name already exists.")
             return
@@ -451,9 +609,14 @@ class TimeTrackerApp(QMainWindow):
         if not name.strip():
             QMessageBox.warning(self, "Validation Error", "Project name cannot be empty.")
             return
-            
-        success = self.db_manager.update_project(project_id, name, description)
         
+        dialog.setEnabled(False)
+        self.query_service.request(None, self.db_manager.update_project,
+                                   lambda success: self.on_project_updated(success, dialog),
+                                   project_id, name, description)
+    
+    def on_project_updated(self, success, dialog):
+        dialog.setEnabled(True)
         if not success:
             QMessageBox.warning(self, "Error", "Failed to update project. The name may already be in use.")
             return
@@ -482,12 +645,8 @@ class TimeTrackerApp(QMainWindow):
         
         if reply == QMessageBox.Yes:
             # Transfer activities
-            success, error = self.db_manager.delete_project(self.current_project_id, True)
-            if not success:
-                QMessageBox.warning(self, "Error", error or "Failed to delete project.")
-            self.current_project_id = 1  # Reset to default project
-            self.update_project_combo()
-            self.update_activity_display()
+            self.query_service.request(None, self.db_manager.delete_project, self.on_project_deleted,
+                                       self.current_project_id, True)
         elif reply == QMessageBox.No:
             # Delete activities
             confirm = QMessageBox.question(
@@ -498,15 +657,23 @@ class TimeTrackerApp(QMainWindow):
             )
             
             if confirm == QMessageBox.Yes:
-                success, error = self.db_manager.delete_project(self.current_project_id, False)
-                if not success:
-                    QMessageBox.warning(self, "Error", error or "Failed to delete project.")
-                self.current_project_id = 1  # Reset to default project
-                self.update_project_combo()
-                self.update_activity_display()
+                self.query_service.request(None, self.db_manager.delete_project, self.on_project_deleted,
+                                           self.current_project_id, False)
+    
+    def on_project_deleted(self, result):
+        success, error = result if result is not None else (False, None)
+        if not success:
+            QMessageBox.warning(self, "Error", error or "Failed to delete project.")
+        self.day_aggregate.invalidate()  # The default project may have gained activities
+        self.current_project_id = 1  # Reset to default project
+        self.update_project_combo()
+        self.update_activity_display()
     
     def toggle_tracking(self):
         """Start or stop activity tracking"""
+        if not self.window_tracker:
+            return  # Storage is still loading
+        
         self.is_tracking = not self.is_tracking
         
         if self.is_tracking:
@@ -536,6 +703,8 @@ class TimeTrackerApp(QMainWindow):
             self.tracking_status.setStyleSheet("color: #4CAF50; font-style: italic;")
         else:
             self.window_tracker.stop_tracking()
+            # Make sure the final activity reaches the database
+            self.activity_writer.flush(timeout=5.0)
             self.tracking_btn.setText("Start Tracking")
             self.tracking_btn.setStyleSheet("""
                 QPushButton {
@@ -561,8 +730,11 @@ class TimeTrackerApp(QMainWindow):
         """Handle activity change event from tracker"""
         # Add project_id to activity before saving
         activity["project_id"] = self.current_project_id
-        # Save the activity to the database
-        self.db_manager.save_activity(activity)
+        if not self.day_aggregate.is_current(self.current_project_id):
+            self.activities_during_load += 1
+        # Queue the activity; the writer thread commits it in the next batch
+        self.activity_writer.enqueue(activity)
+        self.day_aggregate.add(activity)
         
         # Update status with styled text and refresh view
         status_text = f"Tracking: {activity['name']} - {activity['short_title']}"
@@ -574,112 +746,124 @@ class TimeTrackerApp(QMainWindow):
             border-radius: 3px;
             padding: 3px;
         """)
-        self.update_activity_display()
+        self.update_backlog_status()
+        self.schedule_display_update()
+    
+    def on_idle_period(self, period):
+        """Record time away from the keyboard; it is not credited to any window"""
+        period["project_id"] = self.current_project_id
+        self.query_service.request(None, self.db_manager.save_idle_period, None, period)
+        
+        away = self.db_manager._format_duration(period["end_time"] - period["start_time"])
+        self.tracking_status.setText(f"Welcome back - away for {away}")
+    
+    def on_activities_committed(self, count):
+        """Update the backlog indicator once the writer thread has committed a batch"""
+        self.update_backlog_status()
+    
+    def update_backlog_status(self):
+        """Show how many activities are still waiting to be written"""
+        backlog = self.activity_writer.backlog()
+        if backlog:
+            self.tracking_status.setToolTip(f"{backlog} activities waiting to be saved")
+        else:
+            self.tracking_status.setToolTip("All activities saved")
+    
+    def schedule_display_update(self):
+        """Update the activity display shortly, once for any number of calls"""
+        if not self.display_timer.isActive():
+            self.display_timer.start(DISPLAY_UPDATE_DELAY_MS)
     
     def update_activity_display(self):
         """Update the activity display with hierarchical data"""
-        # Store the expanded state before clearing
-        expanded_apps = {}
-        expanded_domains = {}
-        
-        # Save expanded state
-        root = self.activity_table.invisibleRootItem()
-        for i in range(root.childCount()):
-            app_item = root.child(i)
-            app_name = app_item.text(0)
-            if app_item.isExpanded():
-                expanded_apps[app_name] = True
-                
-                # Save expanded state of domains
-                for j in range(app_item.childCount()):
-                    domain_item = app_item.child(j)
-                    domain_name = domain_item.text(0)
-                    key = f"{app_name}|{domain_name}"
-                    if domain_item.isExpanded():
-                        expanded_domains[key] = True
-        
-        # Clear and rebuild the tree
-        self.activity_table.clear()
-        
         if not self.db_manager:
             return
+        if not self.isVisible():
+            return  # Hidden in the tray; showEvent renders again
+        
+        # Matching titles come from the search index on the query thread
+        if self.search_term:
+            today = datetime.date.today()
+            self.query_service.request("search", self.db_manager.search_titles, self.on_search_results,
+                                       self.search_term, today, today, [self.current_project_id])
+            return
         
-        # Get hierarchical activity data
-        activities = self.db_manager.get_today_activities_hierarchical(self.current_project_id)
-        
-        # Font settings
-        app_font = QFont()
-        app_font.setBold(True)
-        app_font.setPointSize(10)
-        
-        domain_font = QFont()
-        domain_font.setBold(True)
-        domain_font.setPointSize(9)
-        
-        for app_data in activities:
-            # Create app-level item
-            app_item = QTreeWidgetItem(self.activity_table)
-            app_name = app_data["name"]
-            app_item.setText(0, app_name)
-            app_item.setText(1, app_data["duration_formatted"])
-            app_item.setData(0, Qt.UserRole, "app")  # Tag as an app item
-            
-            # Style the app item
-            app_item.setFont(0, app_font)
-            app_item.setForeground(0, QBrush(QColor("#4FC3F7")))  # Light blue
-            app_item.setForeground(1, QBrush(QColor("#4FC3F7")))
-            
-            # Restore app expansion state
-            if app_name in expanded_apps:
-                app_item.setExpanded(True)
-            
-            # Show child items for all applications
-            if app_data["children"]:
-                for domain in app_data["children"]:
-                    # Create domain-level item
-                    domain_item = QTreeWidgetItem(app_item)
-                    domain_name = domain["domain_info"]
-                    domain_item.setText(0, domain_name)
-                    domain_item.setText(1, domain["duration_formatted"])
-                    domain_item.setData(0, Qt.UserRole, "domain")  # Tag as a domain item
-                    
-                    # Style the domain item
-                    domain_item.setFont(0, domain_font)
-                    domain_item.setForeground(0, QBrush(QColor("#FFD54F")))  # Light amber
-                    domain_item.setForeground(1, QBrush(QColor("#FFD54F")))
-                    
-                    # Restore domain expansion state
-                    key = f"{app_name}|{domain_name}"
-                    if key in expanded_domains:
-                        domain_item.setExpanded(True)
-                    
-                    # Add individual websites/window titles under domain
-                    if "children" in domain:
-                        for website in domain["children"]:
-                            # Create website-level item
-                            site_item = QTreeWidgetItem(domain_item)
-                            site_item.setText(0, website["window_title"])
-                            site_item.setText(1, website["duration_formatted"])
-                            site_item.setData(0, Qt.UserRole, "website")  # Tag as a website item
-                            
-                            # Style the website item
-                            site_item.setForeground(0, QBrush(QColor("#FFFFFF")))  # White
-                            site_item.setForeground(1, QBrush(QColor("#AAAAAA")))  # Light gray
+        # Another project or a new day: load its totals on the query thread.
+        # A newer request, e.g. after another project switch, supersedes this one.
+        if not self.day_aggregate.is_current(self.current_project_id):
+            self.activities_during_load = 0
+            self.query_service.request("day_totals", self.day_aggregate.fetch, self.on_day_totals_loaded,
+                                       self.current_project_id)
+            return
+        
+        # Apps and domains come from the running in-memory totals; the model
+        # diffs them against what it shows and refreshes only loaded titles
+        self.activity_model.set_summary(self.day_aggregate.summary(self.current_project_id))
         
         # Set column widths
         self.activity_table.setColumnWidth(0, 400)
 
-    def on_item_clicked(self, item, column):
+    def on_day_totals_loaded(self, loaded):
+        """Show day totals read on the query thread"""
+        if loaded[0] != self.current_project_id:
+            return
+        
+        self.day_aggregate.apply(loaded)
+        self.update_activity_display()
+        
+        # Activities saved while the query ran may or may not be in it; read again
+        if self.activities_during_load:
+            self.day_aggregate.invalidate()
+            self.update_activity_display()
+    
+    def on_search_changed(self, text):
+        """Filter the activity tree as the search term is typed"""
+        self.search_term = text.strip()
+        if not self.search_term:
+            self.query_service.cancel("search")
+            self.search_titles = {}
+        self.schedule_display_update()
+    
+    def on_search_results(self, totals):
+        """Show the titles matching the search term under their apps and domains"""
+        if not self.search_term:
+            return
+        
+        apps = self.db_manager.build_hierarchy(totals)
+        self.search_titles = {}
+        for app in apps:
+            for domain in app["children"]:
+                domain["title_count"] = len(domain["children"])
+                self.search_titles[(app["name"], domain["domain_info"])] = domain["children"]
+        
+        self.activity_model.set_summary(apps)
+        self.activity_table.expandToDepth(0)
+    
+    def titles_for_domain(self, app_name, domain_info):
+        """Window titles under a domain, for the tree model"""
+        if self.search_term:
+            return self.search_titles.get((app_name, domain_info), [])
+        if not self.day_aggregate or not self.day_aggregate.is_current(self.current_project_id):
+            return []  # Loading; the model asks again once the totals are in
+        return self.day_aggregate.titles(self.current_project_id, app_name, domain_info)
+    
+    def showEvent(self, event):
+        """Render what changed while the window was hidden"""
+        super().showEvent(event)
+        self.update_activity_display()
+    
+    def on_item_clicked(self, index):
         """Handle clicks on tree items to expand/collapse"""
-        item_type = item.data(0, Qt.UserRole)
+        item_type = index.sibling(index.row(), 0).data(Qt.UserRole)
         
         # Handle any expandable items (app and domain)
         if item_type in ["app", "domain"]:
+            index = index.sibling(index.row(), 0)
             # Toggle expansion
-            if item.isExpanded():
-                item.setExpanded(False)
+            if self.activity_table.isExpanded(index):
+                self.activity_table.setExpanded(index, False)
             else:
-                item.setExpanded(True)
+                self.activity_table.setExpanded(index, True)
     
     def setup_system_tray(self):
         """Set up system tray icon and menu"""
@@ -731,6 +915,11 @@ class TimeTrackerApp(QMainWindow):
         """Properly close the application"""
         if self.is_tracking:
             self.toggle_tracking()  # Stop tracking
+        self.query_service.stop()
+        if self.db_manager:
+            self.activity_writer.stop()  # Flush queued activities
+            self.activity_journal.close()  # Everything is saved, so this removes the journal
+            self.db_manager.close()  # Release the pooled SQLite connections
         self.close()
         QApplication.quit()
 
@@ -0,0 +1,267 @@
+"""Command line access to the TimeTracker database, without the GUI.
+
+    python -m timetracker report [--from 2024-01-01] [--to today] [--project NAME]
+    python -m timetracker export --format csv --output week.csv --from 2024-01-01
+    python -m timetracker export --format parquet --output history.parquet --from 2020-01-01
+    python -m timetracker import old-laptop.csv
+    python -m timetracker search "ABC-123" --from 2024-01-01
+    python -m timetracker merge laptop/timetracker.db
+    python -m timetracker compact --gap 60
+    python -m timetracker projects
+    python -m timetracker stats
+
+Only the storage layer is imported (no PyQt, no window tracking), and each
+command imports what it needs when it runs, so this works on servers and in
+cron jobs and starts quickly.
+"""
+import sys
+import argparse
+import datetime
+
+def parse_date(value):
+    """Parse YYYY-MM-DD, 'today', 'yesterday' or a day offset such as -7"""
+    today = datetime.date.today()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - datetime.timedelta(days=1)
+    if value.lstrip("-").isdigit():
+        return today + datetime.timedelta(days=int(value))
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date: {value} (use YYYY-MM-DD, today, yesterday or -N)")
+
+
+def open_database(args):
+    import os
+    if not os.path.exists(args.db) and args.command not in ("import", "merge"):
+        raise SystemExit(f"No database at {args.db}")
+
+    from database_manager import DatabaseManager
+    db_manager = DatabaseManager(args.db, start_migrations=False)
+    if db_manager.upgrading and args.command not in ("import", "merge"):
+        print("Note: this database is still being upgraded by the TimeTracker app; "
+              "older activities may be missing until it finishes", file=sys.stderr)
+    return db_manager
+
+
+def resolve_projects(db_manager, names):
+    """Map --project names or ids to project ids; None selects all projects"""
+    if not names:
+        return None
+
+    projects = db_manager.get_projects()
+    project_ids = []
+    for name in names:
+        matches = [project["id"] for project in projects
+                   if project["name"].lower() == name.lower() or str(project["id"]) == name]
+        if not matches:
+            raise SystemExit(f"Unknown project: {name}")
+        project_ids.extend(matches)
+    return project_ids
+
+
+def format_seconds(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours > 0:
+        return f"{hours}h {minutes}m"
+    elif minutes > 0:
+        return f"{minutes}m {seconds}s"
+    else:
+        return f"{seconds}s"
+
+
+def command_report(db_manager, args, out):
+    """Time per application > domain > window title over a date range"""
+    project_ids = resolve_projects(db_manager, args.project)
+    hierarchy = db_manager.get_activities_hierarchical(args.start, args.end, project_ids)
+
+    if args.format == "json":
+        import json
+        json.dump(hierarchy, out, indent=2)
+        out.write("\n")
+        return 0
+
+    depth = {"app": 1, "domain": 2, "title": 3}[args.depth]
+    total = sum(app["total_seconds"] for app in hierarchy)
+    out.write(f"{args.start} to {args.end}: {format_seconds(total)}\n")
+    for app in hierarchy:
+        out.write(f"{format_seconds(app['total_seconds']):>10}  {app['name']}\n")
+        if depth < 2:
+            continue
+        for domain in app["children"]:
+            out.write(f"{format_seconds(domain['total_seconds']):>10}    {domain['domain_info']}\n")
+            if depth < 3:
+                continue
+            for title in domain["children"]:
+                out.write(f"{format_seconds(title['total_seconds']):>10}      {title['window_title']}\n")
+    return 0
+
+
+def command_export(db_manager, args, out):
+    """Raw activities over a date range as CSV, JSON Lines or Parquet"""
+    project_ids = resolve_projects(db_manager, args.project)
+    if args.format == "parquet":
+        from activity_export import parquet_available
+        if not args.output:
+            raise SystemExit("Parquet export needs --output")
+        if not parquet_available():
+            raise SystemExit("Parquet export needs pyarrow (pip install pyarrow)")
+        out = args.output
+
+    # Streamed straight from the database, so any range fits in memory
+    count = db_manager.export_activities(out, args.format, args.start, args.end, project_ids)
+    if count is None:
+        return 1
+    if args.output:
+        print(f"Exported {count} activities to {args.output}", file=sys.stderr)
+    return 0
+
+
+def command_import(db_manager, args, out):
+    """Load activities from a CSV or JSON Lines file, skipping ones already recorded"""
+    import os
+    from activity_export import read_activities
+    if not os.path.exists(args.file):
+        raise SystemExit(f"No file at {args.file}")
+
+    stats = db_manager.import_activities(read_activities(args.file, args.format))
+    if stats is None:
+        return 1
+    out.write(f"Read {stats['read']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s): "
+              f"imported {stats['imported']}, skipped {stats['duplicates']} overlapping "
+              f"and {stats['invalid']} invalid\n")
+    return 0
+
+
+def command_merge(db_manager, args, out):
+    """Merge the activities of other timetracker databases into this one; safe to repeat"""
+    status = 0
+    for source in args.sources:
+        stats = db_manager.merge_database(source)
+        if stats is None:
+            status = 1
+            continue
+        out.write(f"{source}: read {stats['read']} rows in {stats['seconds']:.1f}s "
+                  f"({stats['rows_per_second']:.0f} rows/s), merged {stats['imported']}, "
+                  f"skipped {stats['duplicates']} already present\n")
+    return status
+
+
+def command_compact(db_manager, args, out):
+    """Merge stored rows of a window resumed within --gap seconds, as new activities are saved"""
+    import time
+    started = time.perf_counter()
+    rows = db_manager.compact_activities(args.gap)
+    if rows is None:
+        return 1
+    before, after = rows
+    out.write(f"Compacted {before} rows to {after} ({before - after} merged) "
+              f"in {time.perf_counter() - started:.1f}s\n")
+    return 0
+
+
+def command_search(db_manager, args, out):
+    """Window titles matching a search term, with the time spent on each"""
+    project_ids = resolve_projects(db_manager, args.project)
+    totals = db_manager.search_titles(" ".join(args.term), args.start, args.end, project_ids, args.limit)
+
+    out.write(f"{args.start} to {args.end}: {format_seconds(sum(row[3] for row in totals))} "
+              f"in {len(totals)} titles\n")
+    for app_name, domain_info, window_title, seconds in totals:
+        out.write(f"{format_seconds(seconds):>10}  {app_name} / {domain_info}: {window_title}\n")
+    return 0
+
+
+def command_projects(db_manager, args, out):
+    """List projects, most recently active first"""
+    for project in db_manager.get_projects():
+        out.write(f"{project['id']:>4}  {project['name']}  (last active {project['last_active']})\n")
+    return 0
+
+
+def command_stats(db_manager, args, out):
+    """Row counts, covered span and storage sizes"""
+    stats = db_manager.get_statistics()
+    for key, value in stats.items():
+        if key.endswith("_bytes"):
+            value = f"{value / (1024 * 1024):.1f} MiB"
+        out.write(f"{key.replace('_', ' '):<20} {value}\n")
+    return 0
+
+
+COMMANDS = {
+    "report": command_report,
+    "export": command_export,
+    "import": command_import,
+    "merge": command_merge,
+    "compact": command_compact,
+    "search": command_search,
+    "projects": command_projects,
+    "stats": command_stats,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m timetracker", description=__doc__.split("\n")[0])
+    parser.add_argument("--db", default="timetracker.db", help="Database file (default: timetracker.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_range(command):
+        command.add_argument("--from", dest="start", type=parse_date, default=datetime.date.today(),
+                             help="First day, inclusive (default: today)")
+        command.add_argument("--to", dest="end", type=parse_date, default=datetime.date.today(),
+                             help="Last day, inclusive (default: today)")
+        command.add_argument("--project", action="append", help="Project name or id; repeat for several")
+
+    report = commands.add_parser("report", help=command_report.__doc__)
+    add_range(report)
+    report.add_argument("--format", choices=["text", "json"], default="text")
+    report.add_argument("--depth", choices=["app", "domain", "title"], default="domain",
+                        help="How deep to print the text report (default: domain)")
+
+    export = commands.add_parser("export", help=command_export.__doc__)
+    add_range(export)
+    export.add_argument("--format", choices=["csv", "jsonl", "parquet"], default="csv")
+    export.add_argument("--output", help="Output file (default: stdout)")
+
+    import_command = commands.add_parser("import", help=command_import.__doc__)
+    import_command.add_argument("file", help="CSV or JSON Lines file, e.g. from the export command")
+    import_command.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                                help="File format (default: from the file extension)")
+
+    merge = commands.add_parser("merge", help=command_merge.__doc__)
+    merge.add_argument("sources", nargs="+", help="Databases to merge in, e.g. from another machine")
+
+    compact = commands.add_parser("compact", help=command_compact.__doc__)
+    compact.add_argument("--gap", type=int, default=None,
+                         help="Most seconds between two rows of a window to merge them (default: 60)")
+
+    search = commands.add_parser("search", help=command_search.__doc__)
+    search.add_argument("term", nargs="+", help="Words to find in window titles or domains")
+    add_range(search)
+    search.add_argument("--limit", type=int, default=200, help="Most titles to list (default: 200)")
+
+    commands.add_parser("projects", help=command_projects.__doc__)
+    commands.add_parser("stats", help=command_stats.__doc__)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    db_manager = open_database(args)
+    try:
+        output = getattr(args, "output", None)
+        if output and getattr(args, "format", None) != "parquet":
+            with open(output, "w", encoding="utf-8", newline="") as out:
+                return COMMANDS[args.command](db_manager, args, out)
+        return COMMANDS[args.command](db_manager, args, sys.stdout)
+    finally:
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import os
+import sys
+import select
+import threading
+
+class WindowBackend:
+    """Platform source of foreground window information for WindowTracker.
+
+    get_foreground_window() returns (window_id, pid, window_title) for the
+    focused window, or None if there is none. wait_for_change() blocks until
+    the foreground window or its title may have changed, the timeout expires
+    (None waits as long as the backend needs) or wakeup() is called.
+    event_driven backends return from it on changes by themselves; the
+    others have to be polled.
+    """
+
+    event_driven = False
+
+    def get_foreground_window(self):
+        raise NotImplementedError
+
+    def process_name(self, pid):
+        raise NotImplementedError
+
+    def process_start_time(self, pid):
+        """Start time of a process; together with the pid it identifies the process"""
+        raise NotImplementedError
+
+    def wait_for_change(self, timeout=None):
+        raise NotImplementedError
+
+    def wakeup(self):
+        """Interrupt a wait_for_change() running on another thread"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class Win32Backend(WindowBackend):
+    """Windows backend. Win32 has no focus-change events without a hook, so poll."""
+
+    def __init__(self, poll_interval=1.0):
+        import win32gui
+        import win32process
+        import psutil
+
+        self.win32gui = win32gui
+        self.win32process = win32process
+        self.psutil = psutil
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+
+    def get_foreground_window(self):
+        hwnd = self.win32gui.GetForegroundWindow()
+        if not hwnd:
+            return None
+
+        window_title = self.win32gui.GetWindowText(hwnd)
+        _, pid = self.win32process.GetWindowThreadProcessId(hwnd)
+        return hwnd, pid, window_title
+
+    def process_name(self, pid):
+        return self.psutil.Process(pid).name().replace('.exe', '')
+
+    def process_start_time(self, pid):
+        return self.psutil.Process(pid).create_time()
+
+    def wait_for_change(self, timeout=None):
+        # A change can only be noticed by polling again; WindowTracker's
+        # scheduler passes a longer timeout when the window has been stable
+        interval = self.poll_interval if timeout is None else timeout
+        woken = self._wake.wait(interval)
+        self._wake.clear()
+        return not woken
+
+    def wakeup(self):
+        self._wake.set()
+
+
+class X11Backend(WindowBackend):
+    """Event-driven X11 backend.
+
+    Listens for PropertyNotify on the root window's _NET_ACTIVE_WINDOW and on
+    the active window's _NET_WM_NAME/WM_NAME, so switches are seen as they
+    happen and the tracking thread sleeps in select() between them. Process
+    names are read from /proc. Works against any EWMH window manager,
+    including one running under Xvfb.
+    """
+
+    event_driven = True
+
+    def __init__(self, display_name=None):
+        from Xlib import X, Xatom, display, error
+
+        self.X = X
+        self.XError = error.XError
+        self.display = display.Display(display_name)
+        self.root = self.display.screen().root
+
+        self.NET_ACTIVE_WINDOW = self.display.intern_atom('_NET_ACTIVE_WINDOW')
+        self.NET_WM_NAME = self.display.intern_atom('_NET_WM_NAME')
+        self.NET_WM_PID = self.display.intern_atom('_NET_WM_PID')
+        self.UTF8_STRING = self.display.intern_atom('UTF8_STRING')
+        self.title_atoms = {self.NET_WM_NAME, Xatom.WM_NAME}
+
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self.display.flush()
+        self.watched_window = None
+
+        # Self-pipe so stop_tracking can interrupt select()
+        self._wake_read, self._wake_write = os.pipe()
+
+    def get_foreground_window(self):
+        try:
+            active = self.root.get_full_property(self.NET_ACTIVE_WINDOW, self.X.AnyPropertyType)
+            window_id = active.value[0] if active and len(active.value) else 0
+            if not window_id:
+                return None
+
+            window = self.display.create_resource_object('window', window_id)
+            self._watch(window)
+            return window_id, self._window_pid(window), self._window_title(window)
+        except self.XError:
+            # The window went away between the lookups; the next event retries
+            return None
+
+    def process_name(self, pid):
+        # The executable name is not truncated like comm (15 characters)
+        try:
+            return os.path.basename(os.readlink(f"/proc/{pid}/exe"))
+        except OSError:
+            with open(f"/proc/{pid}/comm") as comm:
+                return comm.read().strip()
+
+    def process_start_time(self, pid):
+        # Field 22 of /proc/<pid>/stat, in clock ticks since boot. Split after
+        # the command name, which may itself contain spaces or parentheses.
+        with open(f"/proc/{pid}/stat", "rb") as stat:
+            fields = stat.read().rsplit(b")", 1)[1].split()
+        return int(fields[19])
+
+    def wait_for_change(self, timeout=None):
+        while True:
+            if self._drain_events():
+                return True
+
+            ready, _, _ = select.select([self.display.fileno(), self._wake_read], [], [], timeout)
+            if not ready:
+                return False
+            if self._wake_read in ready:
+                os.read(self._wake_read, 64)
+                return False
+
+    def wakeup(self):
+        os.write(self._wake_write, b"\0")
+
+    def close(self):
+        self.display.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _drain_events(self):
+        """Consume queued X events; True if any of them concern the active window"""
+        changed = False
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type != self.X.PropertyNotify:
+                continue
+            if event.atom == self.NET_ACTIVE_WINDOW or event.atom in self.title_atoms:
+                changed = True
+        return changed
+
+    def _watch(self, window):
+        """Subscribe to title changes of the newly active window"""
+        if self.watched_window is not None and self.watched_window.id == window.id:
+            return
+
+        if self.watched_window is not None:
+            try:
+                self.watched_window.change_attributes(event_mask=self.X.NoEventMask)
+            except self.XError:
+                pass  # Already destroyed
+
+        window.change_attributes(event_mask=self.X.PropertyChangeMask)
+        self.display.flush()
+        self.watched_window = window
+
+    def _window_title(self, window):
+        prop = window.get_full_property(self.NET_WM_NAME, self.UTF8_STRING)
+        if prop and prop.value:
+            value = prop.value
+        else:
+            value = window.get_wm_name() or ""
+
+        if isinstance(value, bytes):
+            return value.decode("utf-8", "replace")
+        return value
+
+    def _window_pid(self, window):
+        prop = window.get_full_property(self.NET_WM_PID, self.X.AnyPropertyType)
+        if prop and len(prop.value):
+            return int(prop.value[0])
+        return 0
+
+
+def create_backend():
+    """Pick the window backend for the current platform"""
+    if sys.platform == "win32":
+        return Win32Backend()
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        return X11Backend()
+    raise RuntimeError(f"No window tracking backend available for {sys.platform} "
+                       "(Windows or an X11 session is required)")
@@ -1,24 +1,146 @@
 import time
 import datetime
+from collections import OrderedDict
 from threading import Thread, Event
 from PyQt5.QtCore import QObject, pyqtSignal
-import win32gui
-import win32process
-import psutil
 
-# Add to window_tracker.py
+from window_backends import create_backend
+from idle_sources import create_idle_source
+from domain_classifier import DomainClassifier, load_site_rules
+
+# Map of browser process names to their window title suffixes
+BROWSER_TITLE_SUFFIXES = {
+    'chrome': ['- Google Chrome', '- Chrome'],
+    'msedge': ['- Microsoft Edge', '- Edge'],
+    'firefox': ['- Mozilla Firefox', '- Firefox'],
+    'opera': ['- Opera']
+}
+
+# Process names whose window titles are cleaned up and grouped by site
+BROWSER_PROCESSES = set(BROWSER_TITLE_SUFFIXES)
+
+# Without keyboard or mouse input for this long, the user counts as away
+IDLE_THRESHOLD_SECONDS = 300
+
+# How often an event-driven backend is woken up to checkpoint the window in
+# front to the journal; bounds how much of it a crash loses
+EVENT_CHECKPOINT_SECONDS = 60
+
+class ProcessInfoCache:
+    """Bounded LRU of (app name, is browser) keyed by (pid, process start time).
+
+    Including the start time means a recycled pid is a cache miss instead of
+    returning the name of the process that used to have it.
+    """
+    
+    def __init__(self, backend, max_size=256):
+        self.backend = backend
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    
+    def lookup(self, pid):
+        key = (pid, self.backend.process_start_time(pid))
+        
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        
+        self.misses += 1
+        app_name = self.backend.process_name(pid)
+        entry = (app_name, app_name.lower() in BROWSER_PROCESSES)
+        
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        
+        return entry
+    
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+class SamplingScheduler:
+    """Decides how long the tracking loop waits before sampling the window again.
+
+    Right after a change samples come every min_interval seconds. Once the
+    window has stayed the same for stable_samples samples, the interval grows
+    by backoff per sample up to max_interval, and goes straight back to
+    min_interval on the next change. While the user is idle it is
+    idle_interval, which only bounds how late their return is noticed.
+    Event-driven backends wake up on changes by themselves and only use
+    idle_interval; see WindowTracker._wait_for_change().
+    """
+    
+    def __init__(self, min_interval=1.0, max_interval=5.0, idle_interval=10.0, backoff=1.5, stable_samples=10):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.backoff = backoff
+        self.stable_samples = stable_samples
+        self.reset()
+    
+    def reset(self):
+        self.interval = self.min_interval
+        self._stable = 0
+    
+    def next_interval(self, changed=False, idle=False):
+        if idle:
+            return self.idle_interval
+        if changed:
+            self.reset()
+            return self.interval
+        
+        self._stable += 1
+        if self._stable >= self.stable_samples:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
+
+class SystemClock:
+    """Wall clock used by WindowTracker; replay swaps in a virtual one"""
+    
+    def now(self):
+        return datetime.datetime.now()
+    
+    def time(self):
+        return time.time()
 
 class WindowTracker(QObject):
     activity_changed = pyqtSignal(dict)
+    # Emitted with {"project_id", "start_time", "end_time"} when the user returns from being idle
+    idle_period = pyqtSignal(dict)
     
-    def __init__(self):
+    def __init__(self, backend=None, domain_classifier=None, clock=None, journal=None,
+                 idle_source=None, scheduler=None, idle_threshold=IDLE_THRESHOLD_SECONDS,
+                 checkpoint_interval=EVENT_CHECKPOINT_SECONDS):
         super().__init__()
         self.is_tracking = False
         self.stop_event = Event()
         self.tracking_thread = None
         self.current_activity = None
         self.current_project_id = 1  # Default project ID
-
+        
+        # Platform specific source of the foreground window (win32, X11, ...)
+        self.backend = backend or create_backend()
+        self.clock = clock or SystemClock()
+        self.process_cache = ProcessInfoCache(self.backend)
+        # Optional crash journal checkpointing the activity in front
+        self.journal = journal
+        
+        # Input idle time decides when the user is away; the scheduler how often to sample
+        self.idle_source = idle_source or create_idle_source()
+        self.idle_threshold = idle_threshold
+        self.scheduler = scheduler or SamplingScheduler()
+        self.checkpoint_interval = checkpoint_interval
+        self._idle_since = None
+        
+        # Site rules (built-in plus site_rules.json) compiled into one matcher
+        self.domain_classifier = domain_classifier or DomainClassifier(load_site_rules())
+        # Process info of the last foreground window, reused while it stays in front
+        self._last_window = None
+        self._last_process_info = None
         
     def start_tracking(self):
         if self.is_tracking:
@@ -36,14 +158,12 @@ class WindowTracker(QObject):
             
         self.is_tracking = False
         self.stop_event.set()
+        self.backend.wakeup()  # Interrupt a backend waiting for window events
         
-        # Close the final activity if it exists
-        if self.current_activity:
-            self.current_activity["end_time"] = datetime.datetime.now()
-            duration = self.current_activity["end_time"] - self.current_activity["start_time"]
-            self.current_activity["duration_formatted"] = self._format_duration(duration)
-            self.activity_changed.emit(self.current_activity)
-            self.current_activity = None
+        # Close the final activity (or idle period) if there is one
+        if self._idle_since is not None:
+            self._end_idle_period(self.clock.now())
+        self._close_current_activity(self.clock.now())
         
         if self.tracking_thread:
             self.tracking_thread.join(timeout=1.0)
@@ -55,26 +175,41 @@ class WindowTracker(QObject):
         
         try:
             while not self.stop_event.is_set():
-                current_window_handle = win32gui.GetForegroundWindow()
-                app_name, window_title, domain_info = self._get_window_info(current_window_handle)
+                # Away from the keyboard: end the activity where input stopped
+                idle_seconds = self.idle_source.idle_seconds()
+                if idle_seconds >= self.idle_threshold:
+                    if self._idle_since is None:
+                        self._idle_since = self.clock.now() - datetime.timedelta(seconds=idle_seconds)
+                        self._close_current_activity(self._idle_since)
+                        last_window_title = None  # Start a new activity on return
+                    # Input is not a window event, so even an event-driven backend polls for the return
+                    self.backend.wait_for_change(self.scheduler.next_interval(idle=True))
+                    continue
+                
+                if self._idle_since is not None:
+                    self._end_idle_period(self.clock.now() - datetime.timedelta(seconds=idle_seconds))
+                
+                window = self.backend.get_foreground_window()
+                if window is None:
+                    app_name, window_title, domain_info = "Unknown", "", None
+                else:
+                    window_id, pid, window_title = window
+                    app_name, window_title, domain_info = self._get_window_info(window_id, pid, window_title)
                 
                 # Skip empty window titles (typically system windows)
                 if not window_title.strip():
-                    time.sleep(1)
+                    self._wait_for_change(self.scheduler.next_interval(changed=True), idle_seconds)
                     continue
                 
                 # Key change: Check for both app and full title to detect tab changes
                 current_identifier = f"{app_name}::{window_title}"
                 last_identifier = f"{last_app_name}::{last_window_title}" if last_window_title else None
+                changed = current_identifier != last_identifier
                 
                 # If the window/tab has changed
-                if current_identifier != last_identifier:
+                if changed:
                     # Close previous activity if there is one
-                    if self.current_activity:
-                        self.current_activity["end_time"] = datetime.datetime.now()
-                        duration = self.current_activity["end_time"] - self.current_activity["start_time"]
-                        self.current_activity["duration_formatted"] = self._format_duration(duration)
-                        self.activity_changed.emit(self.current_activity)
+                    self._close_current_activity(self.clock.now())
                     
                     # Create a new activity
                     short_title = window_title[:27] + "..." if len(window_title) > 30 else window_title
@@ -85,37 +220,92 @@ class WindowTracker(QObject):
                         "window_title": window_title,
                         "short_title": short_title,
                         "domain_info": domain_info,  # Add domain info for grouping
-                        "start_time": datetime.datetime.now(),
-                        "end_time": datetime.datetime.now(),  # Will be updated when window changes
+                        "start_time": self.clock.now(),
+                        "end_time": self.clock.now(),  # Will be updated when window changes
                         "duration_formatted": "0s"
                     }
+                    if self.journal:
+                        self.current_activity["journal_seq"] = self.journal.open(
+                            self.current_activity, self.current_project_id)
                     
                     last_window_title = window_title
                     last_app_name = app_name
                     last_domain_info = domain_info
                 elif self.current_activity:
                     # Update end time for current activity
-                    self.current_activity["end_time"] = datetime.datetime.now()
+                    self.current_activity["end_time"] = self.clock.now()
+                    if self.journal:
+                        self.journal.checkpoint(self.current_activity.get("journal_seq"),
+                                                self.current_activity["end_time"])
                 
-                # Check every second
-                time.sleep(1)
+                # Sleep until the backend sees a change (event driven) or the
+                # scheduler's next sample is due; the longer the window has
+                # stayed the same, the longer the wait
+                self._wait_for_change(self.scheduler.next_interval(changed=changed), idle_seconds)
                 
         except Exception as e:
             print(f"Error in window tracking: {e}")
     
-    def _get_window_info(self, hwnd):
-        window_title = win32gui.GetWindowText(hwnd)
+    def _wait_for_change(self, interval, idle_seconds):
+        """Wait for the next sample: interval when polling, otherwise until a change or a deadline.
+
+        An event-driven backend needs no periodic samples while the window
+        stays the same. It is only woken up when the user would turn idle
+        without further input and, with a journal, every checkpoint_interval.
+        """
+        if self.backend.event_driven:
+            interval = max(self.idle_threshold - idle_seconds, self.scheduler.min_interval)
+            if self.journal and self.current_activity:
+                interval = min(interval, self.checkpoint_interval)
+        self.backend.wait_for_change(interval)
+    
+    def _close_current_activity(self, end_time):
+        """End the current activity at end_time and hand it over for saving"""
+        if not self.current_activity:
+            return
         
+        self.current_activity["end_time"] = max(end_time, self.current_activity["start_time"])
+        duration = self.current_activity["end_time"] - self.current_activity["start_time"]
+        self.current_activity["duration_formatted"] = self._format_duration(duration)
+        self._journal_finish(self.current_activity)
+        self.activity_changed.emit(self.current_activity)
+        self.current_activity = None
+    
+    def _end_idle_period(self, end_time):
+        """Report the time away from the keyboard, which no window is credited with"""
+        start_time, self._idle_since = self._idle_since, None
+        self.scheduler.reset()
+        if end_time > start_time:
+            self.idle_period.emit({
+                "project_id": self.current_project_id,
+                "start_time": start_time,
+                "end_time": end_time
+            })
+    
+    def _journal_finish(self, activity):
+        """Journal the final end time before the activity is handed over for saving"""
+        if self.journal and "journal_seq" in activity:
+            try:
+                self.journal.finish(activity["journal_seq"], activity["end_time"])
+            except Exception as e:
+                print(f"Error updating activity journal: {e}")
+    
+    def _get_window_info(self, window_id, pid, window_title):
         app_name = "Unknown"
         domain_info = None
         try:
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
             if pid > 0:
-                process = psutil.Process(pid)
-                app_name = process.name().replace('.exe', '')
+                # A window never changes owner, so while the same window stays
+                # in front its process can't have been replaced
+                if self._last_window == (window_id, pid):
+                    app_name, is_browser = self._last_process_info
+                else:
+                    app_name, is_browser = self.process_cache.lookup(pid)
+                    self._last_window = (window_id, pid)
+                    self._last_process_info = (app_name, is_browser)
                 
                 # Clean browser titles and get domain info for better grouping
-                if app_name.lower() in ['chrome', 'msedge', 'firefox', 'opera']:
+                if is_browser:
                     cleaned_title, domain_info = self._clean_browser_title(app_name, window_title)
                     window_title = cleaned_title
                 else:
@@ -130,24 +320,13 @@ class WindowTracker(QObject):
 
     def _clean_browser_title(self, app_name, window_title):
         """Clean and standardize browser tab titles"""
-        # Map of browser process names to their window title suffixes
-        browser_suffixes = {
-            'chrome': ['- Google Chrome', '- Chrome'],
-            'msedge': ['- Microsoft Edge', '- Edge'],
-            'firefox': ['- Mozilla Firefox', '- Firefox'],
-            'opera': ['- Opera']
-        }
-        
-        # Check if this is a known browser
-        app_lower = app_name.lower()
         cleaned_title = window_title
         
-        for browser, suffixes in browser_suffixes.items():
-            if app_lower == browser:
-                # Remove the browser name suffix from the title
-                for suffix in suffixes:
-                    if window_title.endswith(suffix):
-                        cleaned_title = window_title[:-len(suffix)].strip()
+        # Remove the browser name suffix from the title
+        for suffix in BROWSER_TITLE_SUFFIXES.get(app_name.lower(), ()):
+            if window_title.endswith(suffix):
+                cleaned_title = window_title[:-len(suffix)].strip()
+                break
         
         # Extract the domain info and original title
         domain_info = self._extract_domain_info(cleaned_title)
@@ -156,32 +335,7 @@ class WindowTracker(QObject):
     
     def _extract_domain_info(self, window_title):
         """Extract domain information from window title for grouping similar sites"""
-        # Common sites and their identifiers
-        site_patterns = {
-            'Reddit': [' : r/', 'r/'],
-            'YouTube': ['- YouTube', 'YouTube'],
-            'LinkedIn': ['| LinkedIn', 'LinkedIn'],
-            'Twitter': ['/ X', '| X', 'Twitter'],
-            'Facebook': ['| Facebook', 'Facebook'],
-            'GitHub': ['GitHub'],
-            'Google': ['Google'],
-            'Gmail': ['Gmail'],
-            'Amazon': ['Amazon'],
-            'Stack Overflow': ['Stack Overflow'],
-            'Medium': ['Medium'],
-            'Wikipedia': ['Wikipedia'],
-            'Netflix': ['Netflix'],
-            'Twitch': ['Twitch']
-        }
-        
-        # Check for each site pattern
-        for site_name, patterns in site_patterns.items():
-            for pattern in patterns:
-                if pattern in window_title:
-                    return site_name
-        
-        # If no match found, default to "Other"
-        return "Other"
+        return self.domain_classifier.classify(window_title)
 
     def _format_duration(self, duration):
         total_seconds = int(duration.total_seconds())